@@ -1,10 +1,15 @@
 """
 Cabinet API Endpoints
 """
-from fastapi import APIRouter, HTTPException
-from typing import List
+import json
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Iterator, List, Tuple
 
 from app.services.calculator import FurnitureCalculatorService
+from app.services.executor import get_executor
+from app.services.response_cache import cached_response
+from app.core.observability import profile_requested, profiled_response
 from app.schemas.cabinet import (
     CabinetRequest, CabinetCalculationResponse,
     ProjectRequest, ProjectCalculationResponse,
@@ -14,9 +19,12 @@ from app.schemas.cabinet import (
 router = APIRouter()
 calculator_service = FurnitureCalculatorService()
 
+# Колко шкафа от пакетна заявка се смятат с едно извикване на пула
+BATCH_CHUNK_SIZE = 64
+
 
 @router.post("/calculate", response_model=CabinetCalculationResponse)
-async def calculate_cabinet(request: CabinetRequest):
+async def calculate_cabinet(request: CabinetRequest, http_request: Request):
     """
     Изчислява един шкаф
     
@@ -28,16 +36,92 @@ async def calculate_cabinet(request: CabinetRequest):
     - **door_count**: Брой врати (по подразбиране автоматично)
     - **drawer_count**: Брой чекмеджета (по подразбиране 0)
     - **has_back**: Има ли гръб (по подразбиране True)
+
+    Отговорът има ETag; повторна заявка с If-None-Match получава 304.
+    С хедър X-Debug-Profile: 1 отговорът носи профил по етапи (без кеша).
     """
+    async def compute():
+        return await get_executor().run_small(calculator_service.calculate_single_cabinet_json, request)
+
     try:
-        result = calculator_service.calculate_single_cabinet(request)
-        if not result.success:
-            raise HTTPException(status_code=400, detail=result.error)
-        return result
+        if profile_requested(http_request):
+            return await profiled_response(http_request, compute)
+        return await cached_response(http_request, "cabinet", request, compute)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Грешка при калкулация: {str(e)}")
 
 
+def _iter_batch_items(body: bytes, content_type: str) -> Iterator[Tuple[int, object]]:
+    """
+    Елементите на пакетна заявка като (индекс, dict или грешка при разчитане).
+    JSON масив се разчита наведнъж, NDJSON – ред по ред при обхождането.
+    """
+    is_ndjson = "ndjson" in content_type or "jsonlines" in content_type
+    if not is_ndjson and body.lstrip().startswith(b"["):
+        try:
+            items = json.loads(body)
+        except ValueError as e:
+            yield 0, e
+            return
+        yield from enumerate(items)
+        return
+
+    index = 0
+    start = 0
+    while start < len(body):
+        end = body.find(b"\n", start)
+        if end < 0:
+            end = len(body)
+        line = body[start:end]
+        start = end + 1
+        if not line.strip():
+            continue
+        try:
+            yield index, json.loads(line)
+        except ValueError as e:
+            yield index, e
+        index += 1
+
+
+@router.post("/calculate-batch")
+async def calculate_cabinets_batch(request: Request):
+    """
+    Изчислява много шкафове с една заявка
+
+    Тялото е JSON масив или NDJSON (по един CabinetRequest на ред).
+    Отговорът е NDJSON поток – по един CabinetCalculationResponse на ред, в
+    реда на заявката. Невалидни елементи дават ред
+    {"index": N, "success": false, "error": ...} без да спират пакета.
+    """
+    # Тялото се чете преди отговора: StreamingResponse слуша за disconnect
+    # през същия receive канал и би „изял“ неизчетеното тяло
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+
+    async def lines():
+        chunk = []
+        for index, item in _iter_batch_items(body, content_type):
+            chunk.append((index, item))
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                yield b"".join(await _calculate_chunk(chunk))
+                chunk = []
+        if chunk:
+            yield b"".join(await _calculate_chunk(chunk))
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def _calculate_chunk(chunk: List[Tuple[int, object]]) -> List[bytes]:
+    try:
+        return await get_executor().run_small(calculator_service.calculate_batch_lines, chunk)
+    except HTTPException as e:
+        # Статусът вече е изпратен – претоварването се отбелязва на всеки ред
+        return [json.dumps({"index": index, "success": False, "error": e.detail},
+                           ensure_ascii=False).encode() + b"\n" for index, _ in chunk]
+
+
 @router.get("/types", response_model=List[CabinetTypeInfo])
 async def get_cabinet_types():
     """
@@ -0,0 +1,113 @@
+"""
+Job API Endpoints – фонови калкулации на големи проекти
+"""
+from fastapi import APIRouter, HTTPException, Response
+from typing import Optional
+
+from app.services.executor import get_executor
+from app.services.jobs import get_job_manager, DONE, FAILED, CANCELLED
+from app.schemas.cabinet import ProjectRequest, ProjectCalculationResponse, JobResponse, JobStatusEnum
+
+router = APIRouter()
+
+
+def job_response(job: dict) -> JobResponse:
+    total = job["total"]
+    return JobResponse(
+        job_id=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        project_name=job["project_name"],
+        total=total,
+        done=job["done"],
+        # 100% само след разкроя и записа на резултата
+        progress=100.0 if job["status"] == DONE else min(99.0, round(job["done"] * 100.0 / total, 1) if total else 0.0),
+        cancel_requested=bool(job["cancel_requested"]),
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+        error=job["error"]
+    )
+
+
+async def submit_project_job(request: ProjectRequest) -> dict:
+    """Записва и пуска задачата в пула с нишки – SQLite и пулът с процеси не блокират event loop-а"""
+    return await get_executor().run_small(lambda: get_job_manager().submit(request))
+
+
+async def _get_job(job_id: str) -> dict:
+    job = await get_executor().run_small(lambda: get_job_manager().store.get(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задачата не е намерена")
+    return job
+
+
+@router.post("/", response_model=JobResponse, status_code=202)
+async def submit_job(request: ProjectRequest, response: Response):
+    """
+    Пуска изчисление на проект като фонова задача
+
+    Статусът и прогресът се следят с GET /jobs/{job_id},
+    резултатът – с GET /jobs/{job_id}/result.
+    """
+    if not request.cabinets:
+        raise HTTPException(status_code=400, detail="Проектът трябва да съдържа поне един шкаф")
+    try:
+        job = await submit_project_job(request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Грешка при създаване на задача: {str(e)}")
+    response.headers["Location"] = f"/api/v1/jobs/{job['id']}"
+    return job_response(job)
+
+
+@router.get("/")
+async def list_jobs(status: Optional[JobStatusEnum] = None, limit: int = 50):
+    """
+    Връща последните задачи (по избор само с даден статус)
+    """
+    def load():
+        manager = get_job_manager()
+        return manager.store.list(max(1, min(limit, 500)), status.value if status else None), manager.stats()
+
+    jobs, counts = await get_executor().run_small(load)
+    return {
+        "jobs": [job_response(job) for job in jobs],
+        "counts": counts
+    }
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """
+    Статус и прогрес на задача
+    """
+    return job_response(await _get_job(job_id))
+
+
+@router.get("/{job_id}/result", response_model=ProjectCalculationResponse)
+async def get_job_result(job_id: str):
+    """
+    Резултатът на завършена задача. Незавършена задача връща 409.
+    """
+    job = await _get_job(job_id)
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=409, detail=f"Задачата е неуспешна: {job['error']}")
+    if job["status"] == CANCELLED:
+        raise HTTPException(status_code=409, detail="Задачата е отказана")
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Задачата още не е завършена ({job['status']})",
+                            headers={"Retry-After": "1"})
+    result = await get_executor().run_small(lambda: get_job_manager().store.result(job_id))
+    return Response(content=result, media_type="application/json")
+
+
+@router.post("/{job_id}/cancel", response_model=JobResponse)
+async def cancel_job(job_id: str):
+    """
+    Отказва задача. Чакащата се отказва веднага, работещата – при следващото
+    обновяване на прогреса. Завършените задачи не се променят.
+    """
+    await _get_job(job_id)
+    return job_response(await get_executor().run_small(lambda: get_job_manager().cancel(job_id)))
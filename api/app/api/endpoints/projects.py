@@ -1,49 +1,142 @@
 """
 Project API Endpoints
 """
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from datetime import date, datetime, time, timedelta, timezone
+from typing import List, Dict, Any, Optional, Union
 from uuid import uuid4
 
-from app.services.calculator import FurnitureCalculatorService
+from app.core.config import settings
+from app.core.observability import profile_requested, profiled_response
+from app.services.calculator import (
+    FurnitureCalculatorService, calculate_project_in_process, calculate_project_json_in_process
+)
+from app.services.executor import get_executor
+from app.services.project_store import get_project_store
+from app.services.response_cache import cached_response, request_key
+from app.api.endpoints.jobs import job_response, submit_project_job
 from app.schemas.cabinet import (
     ProjectRequest, ProjectCalculationResponse,
-    CabinetRequest
+    ProjectDeltaRequest, IncrementalProjectResponse,
+    CabinetRequest, CabinetTypeEnum
 )
 
 router = APIRouter()
 calculator_service = FurnitureCalculatorService()
 
-# In-memory storage за проекти (за demonstration)
-projects_storage: Dict[str, ProjectCalculationResponse] = {}
+
+async def _calculate(request: ProjectRequest) -> ProjectCalculationResponse:
+    """
+    Малките проекти – в пула с нишки, големите – в отделен процес.
+    Еднакви едновременни заявки споделят едно изчисление.
+    """
+    executor = get_executor()
+    if len(request.cabinets) >= settings.LARGE_PROJECT_CABINETS:
+        # Обединяването става тук – процесите не виждат заявките на другите
+        return await calculator_service.singleflight.do_async(
+            request_key("project", request),
+            lambda: executor.run_large(calculate_project_in_process, request))
+    return await executor.run_small(calculator_service.calculate_project, request)
+
+
+async def _calculate_json(request: ProjectRequest) -> bytes:
+    """Като _calculate, но връща готов JSON (бързият път, без pydantic модели)"""
+    executor = get_executor()
+    if len(request.cabinets) >= settings.LARGE_PROJECT_CABINETS:
+        return await calculator_service.singleflight.do_async(
+            request_key("project-json", request),
+            lambda: executor.run_large(calculate_project_json_in_process, request))
+    return await executor.run_small(calculator_service.calculate_project_json, request)
+
+
+async def _job_redirect(request: ProjectRequest) -> JSONResponse:
+    """202 с фонова задача за проект над MAX_SYNC_PROJECT_CABINETS шкафа"""
+    job = await submit_project_job(request)
+    return JSONResponse(status_code=202, content=job_response(job).model_dump(mode="json"),
+                        headers={"Location": f"/api/v1/jobs/{job['id']}"})
 
 
 @router.post("/calculate", response_model=ProjectCalculationResponse)
-async def calculate_project(request: ProjectRequest):
+async def calculate_project(request: ProjectRequest, http_request: Request):
     """
     Изчислява цял проект (много шкафове)
     
     - **project_name**: Име на проекта
     - **cabinets**: Списък с шкафове за изчисление
+
+    Проекти с повече от MAX_SYNC_PROJECT_CABINETS шкафа не се изчисляват
+    синхронно – връща се 202 с фонова задача (виж /api/v1/jobs).
+    Синхронният отговор има ETag; If-None-Match с него връща 304.
+    С хедър X-Debug-Profile: 1 отговорът носи профил по етапи (без кеша).
     """
     try:
         if not request.cabinets:
             raise ValueError("Проектът трябва да съдържа поне един шкаф")
         
-        if len(request.cabinets) > 50:
-            raise ValueError("Проектът не може да съдържа повече от 50 шкафове")
+        if len(request.cabinets) > settings.MAX_SYNC_PROJECT_CABINETS:
+            return await _job_redirect(request)
         
-        result = calculator_service.calculate_project(request)
-        if not result.success:
-            raise HTTPException(status_code=400, detail=result.error)
-        return result
+        if profile_requested(http_request):
+            # Винаги в пула с нишки – профилерът не минава в процесите
+            return await profiled_response(http_request, lambda: get_executor().run_small(
+                calculator_service.calculate_project_json, request))
+        return await cached_response(http_request, "project", request, lambda: _calculate_json(request))
         
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Грешка при калкулация на проект: {str(e)}")
 
 
+@router.post("/incremental", response_model=IncrementalProjectResponse)
+async def open_incremental_project(request: ProjectRequest):
+    """
+    Изчислява проект и го отваря за инкрементални промени
+
+    Върнатият **project_id** се използва с PATCH /incremental/{project_id}.
+    """
+    return await get_executor().run_small(calculator_service.open_incremental_project, request)
+
+
+@router.patch("/incremental/{project_id}", response_model=IncrementalProjectResponse)
+async def update_incremental_project(project_id: str, delta: ProjectDeltaRequest):
+    """
+    Прилага промени към отворен проект. Преизчисляват се само променените шкафове.
+
+    - **add**: Нови шкафове
+    - **update**: Променени шкафове (по cabinet_id)
+    - **remove**: ID на премахнати шкафове
+
+    Общите стойности са натрупаните по шкаф (листовете са оценки); с
+    разкроя на листовете ги връща GET /incremental/{project_id}.
+    """
+    return await get_executor().run_small(calculator_service.update_incremental_project, project_id, delta)
+
+
+@router.get("/incremental/{project_id}", response_model=IncrementalProjectResponse)
+async def get_incremental_project(project_id: str):
+    """
+    Връща всички шкафове и общите стойности на отворен проект (с разкроя
+    на листовете, както POST /calculate)
+    """
+    return await get_executor().run_small(calculator_service.get_incremental_project, project_id)
+
+
+@router.delete("/incremental/{project_id}")
+async def close_incremental_project(project_id: str):
+    """
+    Затваря инкрементален проект
+    """
+    calculator_service.close_incremental_project(project_id)
+    return {
+        "success": True,
+        "message": "Проектът е затворен"
+    }
+
+
 @router.post("/save")
 async def save_project(request: ProjectRequest):
     """
@@ -51,13 +144,13 @@ async def save_project(request: ProjectRequest):
     """
     try:
         # Изчисляване на проекта
-        result = calculator_service.calculate_project(request)
+        result = await _calculate(request)
         if not result.success:
             raise HTTPException(status_code=400, detail=result.error)
         
         # Генериране на ID и запазване
         project_id = str(uuid4())
-        projects_storage[project_id] = result
+        await get_executor().run_small(get_project_store().save, project_id, result)
         
         return {
             "success": True,
@@ -67,6 +160,8 @@ async def save_project(request: ProjectRequest):
             "cabinets_count": result.total_cabinets
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Грешка при запазване на проект: {str(e)}")
 
@@ -77,10 +172,11 @@ async def get_project(project_id: str):
     Връща запазен проект по ID
     """
     try:
-        if project_id not in projects_storage:
+        project = await get_executor().run_small(get_project_store().get, project_id)
+        if project is None:
             raise HTTPException(status_code=404, detail="Проектът не е намерен")
         
-        return projects_storage[project_id]
+        return project
         
     except HTTPException:
         raise
@@ -88,27 +184,59 @@ async def get_project(project_id: str):
         raise HTTPException(status_code=500, detail=f"Грешка при зареждане на проект: {str(e)}")
 
 
+def _timestamp(value: Union[datetime, date, None], end_of_day: bool = False) -> Optional[float]:
+    """Дата или дата и час -> unix време (UTC, ако няма часова зона)"""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        # Само дата: от началото на деня, а като горна граница – целият ден
+        value = datetime.combine(value + timedelta(days=1) if end_of_day else value, time())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
 @router.get("/")
-async def list_projects():
+async def list_projects(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    sort: str = "created_at",
+    order: str = "desc",
+    name_prefix: Optional[str] = None,
+    min_cost: Optional[float] = None,
+    max_cost: Optional[float] = None,
+    cabinet_type: Optional[CabinetTypeEnum] = None,
+    created_from: Union[datetime, date, None] = None,
+    created_to: Union[datetime, date, None] = None
+):
     """
-    Връща списък с всички запазени проекти
+    Връща страница от запазените проекти
+
+    - **limit**: Брой проекти на страница (до 500)
+    - **cursor**: next_cursor от предишната страница
+    - **sort**: created_at, cost, name или cabinets; **order**: asc или desc
+    - **name_prefix**, **min_cost**, **max_cost**, **cabinet_type**,
+      **created_from**, **created_to**: филтри
+
+    **total_projects** е общият брой запазени проекти (без филтрите).
     """
     try:
-        projects_summary = []
-        for project_id, project in projects_storage.items():
-            projects_summary.append({
-                "project_id": project_id,
-                "project_name": project.project_name,
-                "total_cabinets": project.total_cabinets,
-                "project_total_cost": project.project_total_cost,
-                "success": project.success
-            })
+        store = get_project_store()
+        page = await get_executor().run_small(
+            store.list, limit, cursor, sort, order, name_prefix, min_cost, max_cost,
+            cabinet_type.value if cabinet_type else None, _timestamp(created_from), _timestamp(created_to, end_of_day=True))
+        stats = await get_executor().run_small(store.stats)
         
         return {
-            "projects": projects_summary,
-            "total_projects": len(projects_summary)
+            "projects": page["projects"],
+            "next_cursor": page["next_cursor"],
+            "total_projects": stats["total_projects"]
         }
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Грешка при списък с проекти: {str(e)}")
 
@@ -119,11 +247,9 @@ async def delete_project(project_id: str):
     Изтрива запазен проект
     """
     try:
-        if project_id not in projects_storage:
+        if not await get_executor().run_small(get_project_store().delete, project_id):
             raise HTTPException(status_code=404, detail="Проектът не е намерен")
         
-        del projects_storage[project_id]
-        
         return {
             "success": True,
             "message": "Проектът е изтрит успешно"
@@ -139,6 +265,9 @@ async def delete_project(project_id: str):
 async def quick_calculate(cabinets: List[CabinetRequest]):
     """
     Бърза калкулация без име на проект
+
+    Над MAX_SYNC_PROJECT_CABINETS шкафа връща 202 с фонова задача,
+    както /projects/calculate.
     """
     try:
         if not cabinets:
@@ -149,8 +278,10 @@ async def quick_calculate(cabinets: List[CabinetRequest]):
             project_name="Бърза калкулация",
             cabinets=cabinets
         )
+        if len(cabinets) > settings.MAX_SYNC_PROJECT_CABINETS:
+            return await _job_redirect(project_request)
         
-        result = calculator_service.calculate_project(project_request)
+        result = await _calculate(project_request)
         if not result.success:
             raise HTTPException(status_code=400, detail=result.error)
         
@@ -162,6 +293,8 @@ async def quick_calculate(cabinets: List[CabinetRequest]):
             "totals": result.totals
         }
         
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -174,7 +307,8 @@ async def get_projects_stats():
     Връща статистика за всички проекти
     """
     try:
-        if not projects_storage:
+        stats = await get_executor().run_small(get_project_store().stats)
+        if not stats["total_projects"]:
             return {
                 "total_projects": 0,
                 "total_cabinets": 0,
@@ -183,25 +317,49 @@ async def get_projects_stats():
                 "most_common_type": "none"
             }
         
-        total_cabinets = sum(p.total_cabinets for p in projects_storage.values())
-        total_value = sum(p.project_total_cost for p in projects_storage.values())
-        
-        cabinet_type_counts = {}
-        for project in projects_storage.values():
-            for cabinet in project.cabinets:
-                cabinet_type = cabinet.type.value
-                cabinet_type_counts[cabinet_type] = cabinet_type_counts.get(cabinet_type, 0) + 1
-        
-        most_common_type = max(cabinet_type_counts.items(), key=lambda x: x[1])[0] if cabinet_type_counts else "none"
+        # Разпределението идва сортирано по брой (намаляващо)
+        cabinet_type_counts = stats["cabinet_types_distribution"]
+        most_common_type = next(iter(cabinet_type_counts), "none")
         
         return {
-            "total_projects": len(projects_storage),
-            "total_cabinets": total_cabinets,
-            "total_value": total_value,
-            "average_project_cost": total_value / len(projects_storage),
+            "total_projects": stats["total_projects"],
+            "total_cabinets": stats["total_cabinets"],
+            "total_value": stats["total_value"],
+            "average_project_cost": stats["total_value"] / stats["total_projects"],
             "most_common_type": most_common_type,
             "cabinet_types_distribution": cabinet_type_counts
         }
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Грешка при статистика: {str(e)}")
+
+
+@router.get("/stats/dashboard")
+async def get_projects_dashboard(days: int = 30):
+    """
+    Разширена статистика за таблото: оферти по ден за последните **days**
+    дни, средна цена по тип шкаф и перцентили на цената на проектите.
+    Цената на заявката не зависи от броя запазени проекти.
+    """
+    try:
+        if days < 1 or days > 3660:
+            raise HTTPException(status_code=400, detail="days трябва да е между 1 и 3660")
+        return await get_executor().run_small(get_project_store().dashboard, days)
+        
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Грешка при статистика: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Грешка при статистика: {str(e)}")
+
+
+@router.get("/stats/coalescing")
+async def get_coalescing_stats():
+    """
+    Брой обединени еднакви едновременни калкулации (singleflight)
+
+    - **leaders**: изчисления, пуснати реално
+    - **coalesced**: заявки, получили резултата на изчисление в ход
+    """
+    return calculator_service.singleflight.stats()
@@ -30,11 +30,41 @@ class Settings(BaseSettings):
         "http://127.0.0.1:5173",
     ]
     
-    # Database Settings (за бъдещо ползване)
+    # Database Settings – запазените проекти (app/services/project_store.py)
     DATABASE_URL: str = "sqlite:///./furniture_calculator.db"
     
     # Cache Settings
-    REDIS_URL: str = "redis://localhost:6379"
+    REDIS_URL: str = "redis://localhost:6379"   # 'memory://' = LocalRedis в процеса
+    RESPONSE_CACHE_MAX_MB: int = 64        # LRU за готови отговори (0 = изключен)
+    RESPONSE_CACHE_SHARED: bool = False    # второ ниво в REDIS_URL
+    RESPONSE_CACHE_TTL_S: int = 86400
+    NESTING_CACHE_PATH: str = "./nesting_cache.db"   # празно = без кеш за разкрои
+    NESTING_CACHE_MAX_MB: int = 64
+    
+    # Executor Settings – пулове за калкулациите (0 нишки = директно в event loop-а)
+    EXECUTOR_THREAD_WORKERS: int = 4
+    EXECUTOR_PROCESS_WORKERS: int = 2
+    EXECUTOR_THREAD_QUEUE: int = 64        # чакащи заявки над броя нишки, после 503
+    EXECUTOR_PROCESS_QUEUE: int = 8
+    LARGE_PROJECT_CABINETS: int = 20       # от толкова шкафа проектът отива в процес
+    
+    # Job Settings – фонови задачи за големи проекти (/api/v1/jobs)
+    JOBS_DB_PATH: str = "./jobs.db"
+    JOBS_WORKERS: int = 2
+    JOBS_LEASE_S: float = 30.0             # задача без подновен наем толкова време се пуска от друг процес
+    MAX_SYNC_PROJECT_CABINETS: int = 50    # над толкова /projects/calculate връща 202 + задача
+    
+    # JSON backend за бързия път на отговорите: auto, orjson, msgspec или json
+    JSON_BACKEND: str = "auto"
+    
+    # Logging Settings (app/core/observability.py)
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = ""                   # по модул: "app.services.calculator=DEBUG,cabinet_engine=WARNING"
+    LOG_FORMAT: str = "text"               # text или json
+    LOG_QUEUE_SIZE: int = 10000            # при пълна опашка записите се изхвърлят
+    TRACING_ENABLED: bool = True           # Server-Timing и времена по етапи за всяка заявка
+    TRACE_SLOW_MS: float = 1000.0          # по-бавните заявки се логват на INFO
+    PROFILING_ENABLED: bool = False        # X-Debug-Profile: 1 връща профил по етапи в отговора (само за отстраняване на проблеми)
     
     # Material Settings
     DEFAULT_MATERIAL_THICKNESS: float = 18.0
@@ -0,0 +1,293 @@
+"""
+Логване и проследяване на заявките
+
+configure_logging() настройва стандартния logging модул:
+
+- нива по модул: LOG_LEVEL за всички и LOG_LEVELS за отделни логери,
+  напр. "app.services.calculator=DEBUG,cabinet_engine=WARNING";
+- неблокиращ QueueHandler: записът отива в опашка, а форматирането и
+  писането в stderr стават в нишката на QueueListener. При пълна опашка
+  записът се изхвърля (и се брои), вместо заявката да чака;
+- структурирани записи: полетата от extra={...} и trace_id на текущата
+  заявка излизат като key=value (LOG_FORMAT=text) или в JSON (LOG_FORMAT=json).
+
+Съобщенията се пишат с %-аргументи (logger.debug("шкаф %s", cabinet_id)) –
+при изключено ниво не се форматира нищо.
+
+TracingMiddleware отваря Trace (tracing.py) за всяка HTTP заявка, връща
+времената на етапите в хедъра Server-Timing и логва заявката – на DEBUG
+винаги, на INFO при над TRACE_SLOW_MS. Времето на заявката влиза и в
+хистограмата furniture_http_request_seconds по шаблона на route-а (/metrics);
+TRACING_ENABLED=False оставя само нея.
+
+monitor_event_loop() мери закъснението на event loop-а: колко по-късно от
+планираното се събужда периодична корутина.
+
+Заявка с хедър X-Debug-Profile: 1 (или memory) към калкулациите минава
+покрай кеша за отговори под Profiler (profiling.py), а отчетът по етапи и
+калкулатори се връща в същия хедър на отговора (при PROFILING_ENABLED,
+изключено по подразбиране). Профил на паметта тече най-много един наведнъж –
+докато тече, следващият получава 409 с Retry-After.
+"""
+import asyncio
+import atexit
+import json
+import time
+import logging
+import logging.handlers
+import queue
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+from app.core.config import settings
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../'))
+
+from tracing import current_trace_id, end_trace, start_trace
+from metrics import REGISTRY
+from profiling import MemoryProfileBusy, Profiler
+
+logger = logging.getLogger("app.requests")
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "furniture_http_request_seconds", "Време за обработка на HTTP заявка по route",
+    ("method", "route", "status"))
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "furniture_event_loop_lag_seconds", "Закъснение на event loop-а спрямо планираното събуждане",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+LOOP_LAG_LAST = REGISTRY.gauge("furniture_event_loop_lag_last_seconds", "Последното измерено закъснение")
+
+# Атрибутите на всеки LogRecord – всичко извън тях е дошло от extra={...}
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "trace_id"}
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class TextFormatter(logging.Formatter):
+    """'време НИВО логер [trace] съобщение ключ=стойност ...'"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if record.trace_id:
+            fields = {"trace_id": record.trace_id, **fields}
+        if fields:
+            first, newline, rest = line.partition("\n")
+            line = first + " " + " ".join(f"{key}={value}" for key, value in fields.items()) + newline + rest
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """Един JSON обект на ред"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.trace_id:
+            entry["trace_id"] = record.trace_id
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _TraceFilter(logging.Filter):
+    """Добавя trace_id на текущата заявка – в нишката, която логва"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = current_trace_id()
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, който не чака при пълна опашка и не форматира в нишката на
+    извикващия. В дъщерен процес (fork от пула с процеси) нишката на
+    listener-а я няма – там записите се пишат направо през fallback.
+    """
+
+    def __init__(self, log_queue: queue.Queue, fallback: logging.Handler):
+        super().__init__(log_queue)
+        self.fallback = fallback
+        self.pid = os.getpid()
+        self.dropped = 0
+        self.addFilter(_TraceFilter())
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Опашката е в същия процес – записът се форматира от listener-а
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if os.getpid() != self.pid:
+            self.fallback.handle(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """'a=DEBUG, b.c=warning' -> {"a": 10, "b.c": 30}"""
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        if not level:
+            raise ValueError(f"Невалидно ниво за логер: '{item}' (очаква се име=НИВО)")
+        levels[name.strip()] = logging.getLevelName(level.strip().upper())
+        if not isinstance(levels[name.strip()], int):
+            raise ValueError(f"Непознато ниво: '{level}'")
+    return levels
+
+
+def configure_logging(level: Optional[str] = None, levels: Optional[str] = None,
+                      fmt: Optional[str] = None, queue_size: Optional[int] = None):
+    """Настройва root логера (повторно извикване само сменя нивата)"""
+    global _handler, _listener
+    root = logging.getLogger()
+    root.setLevel((level or settings.LOG_LEVEL).upper())
+    for name, value in parse_levels(settings.LOG_LEVELS if levels is None else levels).items():
+        logging.getLogger(name).setLevel(value)
+    if _handler is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter() if (fmt or settings.LOG_FORMAT) == "json" else TextFormatter())
+    log_queue: queue.Queue = queue.Queue(queue_size or settings.LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue, stream)
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Изпразва опашката и спира нишката на listener-а"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def logging_stats() -> Dict[str, int]:
+    if _handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
+
+
+REGISTRY.callback("furniture_log_records_dropped_total", "Изхвърлени записи при пълна опашка за логове",
+                  lambda: [((), logging_stats()["dropped"])], kind="counter")
+
+
+async def monitor_event_loop(interval_s: float = 0.5):
+    """Безкраен цикъл (asyncio задача): записва закъснението на всяко събуждане"""
+    loop = asyncio.get_running_loop()
+    while True:
+        planned = loop.time() + interval_s
+        await asyncio.sleep(interval_s)
+        lag = max(0.0, loop.time() - planned)
+        LOOP_LAG_SECONDS.observe(lag)
+        LOOP_LAG_LAST.set(lag)
+
+
+def _route_label(scope) -> str:
+    # Шаблонът на route-а (/api/v1/jobs/{job_id}), а не самият път – иначе етикетите нямат край
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    return "static" if scope.get("endpoint") is not None else "unmatched"
+
+
+PROFILE_HEADER = "X-Debug-Profile"
+
+
+def profile_requested(request: Request) -> bool:
+    return settings.PROFILING_ENABLED and request.headers.get(PROFILE_HEADER, "").lower() in ("1", "true", "memory")
+
+
+async def profiled_response(request: Request, compute: Callable[[], Awaitable[bytes]]) -> Response:
+    """
+    JSON отговорът на compute() + отчетът на Profiler в хедъра X-Debug-Profile.
+    Калкулацията трябва да е в пула с нишки – процесите не виждат профилера.
+    Втори едновременен профил на паметта (tracemalloc е общ) връща 409.
+    """
+    try:
+        with Profiler(memory=request.headers.get(PROFILE_HEADER, "").lower() == "memory") as profiler:
+            content = await compute()
+    except MemoryProfileBusy as e:
+        raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "1"})
+    report = json.dumps(profiler.report(), separators=(",", ":"))
+    return Response(content=content, media_type="application/json",
+                    headers={PROFILE_HEADER: report, "Cache-Control": "no-store"})
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware: време на всяка HTTP заявка в /metrics; при tracing=True
+    и Trace + Server-Timing + лог на заявката
+    """
+
+    def __init__(self, app, tracing: Optional[bool] = None, slow_ms: Optional[float] = None):
+        self.app = app
+        self.tracing = settings.TRACING_ENABLED if tracing is None else tracing
+        self.slow_ms = settings.TRACE_SLOW_MS if slow_ms is None else slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = token = None
+        if self.tracing:
+            request_id = None
+            for name, value in scope["headers"]:
+                if name == b"x-request-id":
+                    request_id = value.decode("latin-1")[:64]
+                    break
+            trace, token = start_trace(request_id)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing().encode()))
+                    headers.append((b"x-request-id", trace.trace_id.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUEST_SECONDS.labels(scope["method"], _route_label(scope), str(status)).observe(elapsed)
+            if trace is not None:
+                elapsed_ms = elapsed * 1000
+                level = logging.INFO if elapsed_ms >= self.slow_ms else logging.DEBUG
+                if logger.isEnabledFor(level):
+                    logger.log(level, "%s %s %d %.1fms", scope["method"], scope["path"], status, elapsed_ms,
+                               extra={"status": status, "duration_ms": round(elapsed_ms, 3),
+                                      "spans": trace.summary()})
+                end_trace(token)
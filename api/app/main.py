@@ -2,8 +2,11 @@
 FastAPI Furniture Calculator Application
 """
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
+import logging
 
 import sys
 import os
@@ -13,13 +16,33 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
+from app.core.config import settings
+from app.core.observability import configure_logging, shutdown_logging, monitor_event_loop, TracingMiddleware
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print("🚀 Starting Furniture Calculator API...")
+    logger.info("Starting Furniture Calculator API")
+    # Незавършените фонови задачи от предишното стартиране продължават
+    # (в пула с нишки – SQLite и пулът с процеси не блокират event loop-а)
+    from app.services.executor import get_executor
+    from app.services.jobs import get_job_manager
+    await get_executor().run_small(get_job_manager)
+    loop_monitor = asyncio.create_task(monitor_event_loop())
     yield
+    loop_monitor.cancel()
     # Shutdown
-    print("🛑 Shutting down Furniture Calculator API...")
+    logger.info("Shutting down Furniture Calculator API")
+    from app.services.executor import shutdown_executor
+    from app.services.jobs import shutdown_job_manager
+    from app.services.project_store import close_project_store
+    shutdown_executor()
+    shutdown_job_manager()
+    close_project_store()
+    shutdown_logging()
 
 app = FastAPI(
     title="Furniture Calculator API",
@@ -39,14 +62,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Време на всяка заявка за /metrics; при TRACING_ENABLED и Server-Timing + лог
+app.add_middleware(TracingMiddleware)
+
 # Include routers
 try:
-    from app.api.endpoints import cabinets, projects, materials
+    from app.api.endpoints import cabinets, projects, materials, jobs
     app.include_router(cabinets.router, prefix="/api/v1/cabinets", tags=["cabinets"])
     app.include_router(projects.router, prefix="/api/v1/projects", tags=["projects"])
     app.include_router(materials.router, prefix="/api/v1/materials", tags=["materials"])
+    app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
 except ImportError as e:
-    print(f"⚠️  Warning: Could not import routers: {e}")
+    logger.warning("Could not import routers: %s", e)
+
+# Служебните endpoint-и са преди frontend-а – mount-ът на "/" поема всички
+# пътища, регистрирани след него
+@app.get("/health")
+async def health_check():
+    """
+    Health check endpoint
+    """
+    return {"status": "healthy", "service": "furniture-calculator"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Метрики в Prometheus text format: времена по route и тип шкаф, панели
+    на заявка, кешове, опашки на пуловете, закъснение на event loop-а
+    """
+    from metrics import REGISTRY
+    import app.services.monitoring  # noqa: F401 – регистрира callback-ите на услугите
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 
 # Static files for frontend
 # Static files for frontend
@@ -62,11 +110,11 @@ try:
     if os.path.exists(frontend_path):
         # Това позволява на Render да отвори index.html на главния адрес
         app.mount("/", StaticFiles(directory=frontend_path, html=True), name="frontend")
-        print(f"✅ Frontend mounted successfully from: {frontend_path}")
+        logger.info("Frontend mounted from %s", frontend_path)
     else:
-        print(f"⚠️ Warning: Frontend directory NOT found at {frontend_path}")
+        logger.warning("Frontend directory not found at %s", frontend_path)
 except Exception as e:
-    print(f"⚠️ Warning: Could not setup static files: {e}")
+    logger.warning("Could not set up static files: %s", e)
 
 @app.get("/")
 async def root():
@@ -81,14 +129,6 @@ async def root():
     }
 
 
-@app.get("/health")
-async def health_check():
-    """
-    Health check endpoint
-    """
-    return {"status": "healthy", "service": "furniture-calculator"}
-
-
 # Тестов endpoint за проверка на импортите
 @app.get("/test-imports")
 async def test_imports():
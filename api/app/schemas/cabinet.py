@@ -145,6 +145,58 @@ class ProjectCalculationResponse(BaseModel):
     error: Optional[str] = Field(None, description="Съобщение за грешка")
 
 
+class JobStatusEnum(str, Enum):
+    """Enumeration of background job states"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobResponse(BaseModel):
+    """Response schema for a background project job"""
+    job_id: str = Field(..., description="ID на задачата")
+    kind: str = Field(..., description="Вид на задачата")
+    status: JobStatusEnum = Field(..., description="Статус")
+    project_name: Optional[str] = Field(None, description="Име на проекта")
+
+    total: int = Field(..., description="Общ брой шкафове")
+    done: int = Field(..., description="Изчислени шкафове")
+    progress: float = Field(..., description="Прогрес в проценти (0-100)")
+    cancel_requested: bool = Field(False, description="Поискан ли е отказ")
+
+    created_at: float = Field(..., description="Създадена (unix време)")
+    started_at: Optional[float] = Field(None, description="Започната (unix време)")
+    finished_at: Optional[float] = Field(None, description="Завършена (unix време)")
+
+    error: Optional[str] = Field(None, description="Съобщение за грешка")
+
+
+class ProjectDeltaRequest(BaseModel):
+    """Request schema for incremental project changes"""
+    add: List[CabinetRequest] = Field(default_factory=list, description="Нови шкафове")
+    update: List[CabinetRequest] = Field(default_factory=list, description="Променени шкафове (по cabinet_id)")
+    remove: List[str] = Field(default_factory=list, description="ID на премахнати шкафове")
+
+
+class IncrementalProjectResponse(BaseModel):
+    """Response schema for incremental project calculation"""
+    success: bool = Field(..., description="Успешна ли е калкулацията")
+    project_id: str = Field(..., description="ID на инкременталния проект")
+    project_name: str = Field(..., description="Име на проекта")
+
+    total_cabinets: int = Field(..., description="Общ брой шкафове")
+    cabinets: List[CabinetCalculationResponse] = Field(..., description="Променени шкафове (всички при създаване)")
+    removed: List[str] = Field(default_factory=list, description="ID на премахнатите шкафове")
+
+    # Общо за проекта
+    totals: Dict[str, Any] = Field(..., description="Общи стойности за проекта")
+    project_total_cost: float = Field(..., description="Обща цена на проекта")
+
+    error: Optional[str] = Field(None, description="Съобщение за грешка")
+
+
 class CabinetTypeInfo(BaseModel):
     """Information about cabinet type"""
     type: CabinetTypeEnum = Field(..., description="Тип шкафа")
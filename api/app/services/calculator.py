@@ -6,8 +6,15 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../../'))
 
-from typing import List, Dict, Any
+import json
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Callable, List, Dict, Any, Optional
+from uuid import uuid4
 from fastapi import HTTPException
+from pydantic import ValidationError
 
 import sys
 import os
@@ -15,44 +22,107 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../../../'))
 
 from models import Cabinet, CabinetType, BoardProduct, MaterialType, Money, Currency, ConstructionProfile
 from cabinet_engine import FurnitureEngine
+from incremental_project import IncrementalProject
+from nesting_cache import NestingCache
+from tracing import span
+from metrics import REGISTRY
+from app.core.config import settings
+from app.services.response_cache import request_key
+from app.services.singleflight import SingleFlight
+from app.services import fast_json
 from app.schemas.cabinet import (
     CabinetRequest, CabinetCalculationResponse, 
     ProjectRequest, ProjectCalculationResponse,
+    ProjectDeltaRequest, IncrementalProjectResponse,
     PanelResponse, HardwareItemResponse,
     CabinetTypeInfo, MaterialInfo,
     MaterialTypeEnum, CabinetTypeEnum
 )
 
 
+logger = logging.getLogger(__name__)
+
+PANELS_PER_REQUEST = REGISTRY.histogram(
+    "furniture_panels_per_request", "Брой панели в отговор на калкулация", ("kind",),
+    buckets=(5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000))
+
+# Двигателите на всички инстанции на услугата – за кешовете в /metrics
+engines: "weakref.WeakSet[FurnitureEngine]" = weakref.WeakSet()
+
+_nesting_cache = None
+_nesting_cache_pid = None
+
+
+def get_nesting_cache():
+    """
+    Общ NestingCache за всички инстанции на услугата (или None, ако е изключен).
+    SQLite връзката не се наследява през fork – всеки процес отваря своя.
+    """
+    global _nesting_cache, _nesting_cache_pid
+    if settings.NESTING_CACHE_PATH and (_nesting_cache is None or _nesting_cache_pid != os.getpid()):
+        _nesting_cache = NestingCache(settings.NESTING_CACHE_PATH, settings.NESTING_CACHE_MAX_MB * 1024 * 1024)
+        _nesting_cache_pid = os.getpid()
+    return _nesting_cache
+
+
+# Общ за всички инстанции на услугата (всеки router има своя)
+_singleflight = SingleFlight()
+
+
+def _batch_error_line(index: int, error) -> bytes:
+    return json.dumps({"index": index, "success": False, "error": error}, ensure_ascii=False,
+                      default=str).encode() + b"\n"
+
+
+class CalculationCancelled(Exception):
+    """Изчислението е прекъснато от progress callback (отказана задача)"""
+
+
 class FurnitureCalculatorService:
     """Service class for furniture calculations"""
+
+    # Отворени инкрементални проекти (най-старите се затварят при препълване)
+    MAX_INCREMENTAL_PROJECTS = 256
     
     def __init__(self):
-        self.engine = FurnitureEngine()
+        self.engine = FurnitureEngine(nesting_cache=get_nesting_cache())
+        engines.add(self.engine)
+        self.incremental_projects: "OrderedDict[str, tuple]" = OrderedDict()   # id -> (име, IncrementalProject)
+        # Методите се викат от пула с нишки – промените по отворените проекти са последователни
+        self._incremental_lock = threading.RLock()
+        # Еднакви едновременни заявки споделят едно изчисление
+        self.singleflight = _singleflight
     
     def calculate_single_cabinet(self, request: CabinetRequest) -> CabinetCalculationResponse:
         """
-        Изчислява единичен шкаф с поддръжка за новите и стари модели
+        Изчислява единичен шкаф с поддръжка за новите и стари модели.
+        Еднакви едновременни заявки се изчисляват веднъж (singleflight).
         """
+        return self.singleflight.do(request_key("cabinet", request),
+                                    lambda: self._calculate_single_cabinet(request))
+    
+    def _calculate_single_cabinet(self, request: CabinetRequest) -> CabinetCalculationResponse:
         try:
-            print(f"🔧 Debug: Starting calculation for cabinet type: {request.type.value}")
-            print(f"🔧 Debug: Request params: width={request.width}, height={request.height}, depth={request.depth}")
+            logger.debug("Калкулация на шкаф %s %sx%sx%s", request.type.value,
+                         request.width, request.height, request.depth)
             
             # SINK шкафовете използват fallback към BaseCabinet за сега
             # TODO: Имплементиране на нов SinkCalculator с MaterialCostCalculator
             
             # За всички останали типове използваме стария engine с fallback
-            cabinet = self._convert_request_to_cabinet(request)
-            print(f"🔧 Debug: Converted to cabinet: type={cabinet.type.value}, dimensions={cabinet.width}x{cabinet.height}x{cabinet.depth}")
+            with span("convert"):
+                cabinet = self._convert_request_to_cabinet(request)
             
             # Изчисляване с engine
-            result = self.engine.calculate_cabinet(cabinet)
-            print(f"🔧 Debug: Engine result type: {type(result)}")
+            with span("calculate"):
+                result = self.engine.calculate_cabinet(cabinet)
             
             # Конвертиране на резултата
             if hasattr(result, 'cabinet'):  # CalculationResult
-                response = self._convert_result_to_response(result, success=True)
-                print(f"🔧 Debug: Converted response: success={response.success}, total_cost={response.total_cost_bgn}")
+                with span("serialize"):
+                    response = self._convert_result_to_response(result, success=True)
+                PANELS_PER_REQUEST.labels("cabinet").observe(len(response.panels))
+                logger.debug("Шкаф %s: %.2f BGN", response.cabinet_id, response.total_cost_bgn)
                 return response
             elif isinstance(result, dict):  # Директен dict резултат
                 return CabinetCalculationResponse(
@@ -74,54 +144,69 @@ class FurnitureCalculatorService:
                 raise ValueError(f"Неочакван тип резултат: {type(result)}")
                 
         except ValueError as e:
-            print(f"🔧 Debug: ValueError: {str(e)}")
+            logger.debug("Невалиден шкаф: %s", e)
             raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
-            import traceback
-            print(f"🔧 Debug: Exception in calculate_single_cabinet: {str(e)}")
-            print(f"🔧 Debug: Traceback: {traceback.format_exc()}")
-            return CabinetCalculationResponse(
-                success=False,
-                cabinet_id=request.cabinet_id or f"{request.type.value}_{request.width}",
-                type=request.type,
-                dimensions={"width": request.width, "height": request.height, "depth": request.depth},
-                panels=[],
-                hardware=[],
-                used_boards={},
-                used_edges_m={},
-                labor_cost=0.0,
-                installation_cost=0.0,
-                total_cost_bgn=0.0,
-                compara_cost_bgn=0.0,
-                error=str(e)
-            )
+            logger.exception("Грешка при калкулация на шкаф %s", request.type.value)
+            return self._cabinet_error_response(request, e)
+
+    def _cabinet_error_response(self, request: CabinetRequest, error: Exception) -> CabinetCalculationResponse:
+        """Отговорът success=False при вътрешна грешка на калкулацията"""
+        return CabinetCalculationResponse(
+            success=False,
+            cabinet_id=request.cabinet_id or f"{request.type.value}_{request.width}",
+            type=request.type,
+            dimensions={"width": request.width, "height": request.height, "depth": request.depth},
+            panels=[],
+            hardware=[],
+            used_boards={},
+            used_edges_m={},
+            labor_cost=0.0,
+            installation_cost=0.0,
+            total_cost_bgn=0.0,
+            compara_cost_bgn=0.0,
+            error=str(error)
+        )
     
-    def calculate_project(self, request: ProjectRequest) -> ProjectCalculationResponse:
+    def calculate_project(self, request: ProjectRequest,
+                          progress: Optional[Callable[[int, int], None]] = None) -> ProjectCalculationResponse:
         """
-        Изчислява цял проект
+        Изчислява цял проект. Броят шкафове не се ограничава тук – големите
+        проекти минават през фоновите задачи (app/services/jobs.py).
+        progress(готови, общо) се вика след всеки шкаф.
+
+        Еднакви едновременни заявки се изчисляват веднъж (singleflight);
+        заявките с progress (фоновите задачи) не се обединяват.
         """
+        if progress is not None:
+            return self._calculate_project(request, progress)
+        return self.singleflight.do(request_key("project", request),
+                                    lambda: self._calculate_project(request))
+
+    def _calculate_project(self, request: ProjectRequest,
+                           progress: Optional[Callable[[int, int], None]] = None) -> ProjectCalculationResponse:
         try:
             if not request.cabinets:
                 raise ValueError("Проектът трябва да съдържа поне един шкаф")
             
-            if len(request.cabinets) > 50:
-                raise ValueError("Проектът не може да съдържа повече от 50 шкафа")
-            
             # Конвертиране на всички шкафове
-            cabinets = [self._convert_request_to_cabinet(cab) for cab in request.cabinets]
+            with span("convert"):
+                cabinets = [self._convert_request_to_cabinet(cab) for cab in request.cabinets]
             
             # Изчисляване на проекта
-            project_result = self.engine.calculate_project(cabinets)
+            with span("calculate"):
+                project_result = self.engine.calculate_project(cabinets, progress=progress)
             
             # Конвертиране на резултатите
             cabinet_responses = []
-            total_cost = 0.0
             
-            for result in project_result.get("cabinets", []):
-                if hasattr(result, 'cabinet'):  # Проверка дали е CalculationResult
-                    response = self._convert_result_to_response(result, success=True)
-                    cabinet_responses.append(response)
-                    total_cost += response.total_cost_bgn
+            with span("serialize"):
+                for result in project_result.get("cabinets", []):
+                    if hasattr(result, 'cabinet'):  # Проверка дали е CalculationResult
+                        response = self._convert_result_to_response(result, success=True)
+                        cabinet_responses.append(response)
+            
+            PANELS_PER_REQUEST.labels("project").observe(sum(len(cabinet.panels) for cabinet in cabinet_responses))
             
             # Общи стойности за проекта
             totals = project_result.get("totals", {})
@@ -132,22 +217,199 @@ class FurnitureCalculatorService:
                 total_cabinets=len(cabinets),
                 cabinets=cabinet_responses,
                 totals=totals,
-                project_total_cost=total_cost,
+                # Листовете са по разкроя на проекта, не по оценките на шкафовете
+                project_total_cost=totals.get("total_cost_bgn", 0.0),
                 error=None
             )
             
         except ValueError as e:
             raise HTTPException(status_code=400, detail=str(e))
+        except CalculationCancelled:
+            raise
         except Exception as e:
-            return ProjectCalculationResponse(
-                success=False,
-                project_name=request.project_name or "Неименуван проект",
-                total_cabinets=len(request.cabinets) if request.cabinets else 0,
-                cabinets=[],
-                totals={},
-                project_total_cost=0.0,
-                error=str(e)
-            )
+            logger.exception("Грешка при калкулация на проект '%s'", request.project_name)
+            return self._project_error_response(request, e)
+
+    def _project_error_response(self, request: ProjectRequest, error: Exception) -> ProjectCalculationResponse:
+        """Отговорът success=False при вътрешна грешка на калкулацията"""
+        return ProjectCalculationResponse(
+            success=False,
+            project_name=request.project_name or "Неименуван проект",
+            total_cabinets=len(request.cabinets) if request.cabinets else 0,
+            cabinets=[],
+            totals={},
+            project_total_cost=0.0,
+            error=str(error)
+        )
+    
+    # -------------------- БЪРЗ ПЪТ (JSON байтове) --------------------
+
+    def calculate_single_cabinet_json(self, request: CabinetRequest) -> bytes:
+        """
+        Като calculate_single_cabinet, но връща готов JSON (fast_json) без
+        pydantic модели. Невалиден шкаф (ValueError) вдига HTTPException 400,
+        вътрешна грешка се логва и връща отговора success=False, както
+        calculate_single_cabinet.
+        """
+        return self.singleflight.do(request_key("cabinet-json", request),
+                                    lambda: self._calculate_single_cabinet_json(request))
+
+    def _calculate_single_cabinet_json(self, request: CabinetRequest) -> bytes:
+        try:
+            with span("convert"):
+                cabinet = self._convert_request_to_cabinet(request)
+            with span("calculate"):
+                result = self.engine.calculate_cabinet(cabinet)
+        except HTTPException:
+            raise
+        except ValueError as e:
+            logger.debug("Невалиден шкаф: %s", e)
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.exception("Грешка при калкулация на шкаф %s", request.type.value)
+            return self._cabinet_error_response(request, e).model_dump_json().encode()
+        if not hasattr(result, 'cabinet'):
+            # Непознат резултат – през стария път с валидиране
+            return self._calculate_single_cabinet(request).model_dump_json().encode()
+        PANELS_PER_REQUEST.labels("cabinet").observe(len(result.panel_table))
+        with span("serialize"):
+            return fast_json.dumps(fast_json.cabinet_dict(result))
+
+    def calculate_project_json(self, request: ProjectRequest) -> bytes:
+        """
+        Като calculate_project, но връща готов JSON (fast_json) без pydantic
+        модели. Невалиден проект (ValueError) вдига HTTPException 400,
+        вътрешна грешка се логва и връща отговора success=False, както
+        calculate_project.
+        """
+        return self.singleflight.do(request_key("project-json", request),
+                                    lambda: self._calculate_project_json(request))
+
+    def _calculate_project_json(self, request: ProjectRequest) -> bytes:
+        if not request.cabinets:
+            raise HTTPException(status_code=400, detail="Проектът трябва да съдържа поне един шкаф")
+        try:
+            with span("convert"):
+                cabinets = [self._convert_request_to_cabinet(cab) for cab in request.cabinets]
+            with span("calculate"):
+                project_result = self.engine.calculate_project(cabinets)
+            with span("serialize"):
+                results = [result for result in project_result.get("cabinets", []) if hasattr(result, 'cabinet')]
+                PANELS_PER_REQUEST.labels("project").observe(sum(len(result.panel_table) for result in results))
+                project = fast_json.project_dict(request.project_name or "Неименуван проект", results,
+                                                 project_result.get("totals", {}))
+                return fast_json.dumps(project)
+        except HTTPException:
+            raise
+        except ValueError as e:
+            logger.debug("Невалиден проект: %s", e)
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.exception("Грешка при калкулация на проект '%s'", request.project_name)
+            return self._project_error_response(request, e).model_dump_json().encode()
+
+    def calculate_batch_lines(self, items: List[tuple]) -> List[bytes]:
+        """
+        Изчислява парче от пакетна заявка. items са (индекс, суров dict или
+        грешка при разчитане); връща по един NDJSON ред за всеки елемент.
+        Грешка в един елемент не спира останалите.
+        """
+        lines = []
+        for index, item in items:
+            try:
+                if isinstance(item, Exception):
+                    raise ValueError(f"Невалиден JSON: {item}")
+                request = CabinetRequest.model_validate(item)
+                response = self.calculate_single_cabinet(request)
+                if not response.success:
+                    # Вътрешна грешка на калкулацията – същият ред като при невалиден елемент
+                    lines.append(_batch_error_line(index, response.error))
+                    continue
+                lines.append(response.model_dump_json().encode() + b"\n")
+            except HTTPException as e:
+                lines.append(_batch_error_line(index, e.detail))
+            except ValidationError as e:
+                lines.append(_batch_error_line(index, e.errors(include_url=False, include_context=False)))
+            except Exception as e:
+                lines.append(_batch_error_line(index, str(e)))
+        return lines
+
+    def open_incremental_project(self, request: ProjectRequest) -> IncrementalProjectResponse:
+        """
+        Изчислява проект и го пази за последващи инкрементални промени
+        """
+        if not request.cabinets:
+            raise HTTPException(status_code=400, detail="Проектът трябва да съдържа поне един шкаф")
+
+        cabinets = [self._convert_request_to_cabinet(cab) for cab in request.cabinets]
+        project = IncrementalProject(self.engine, cabinets)
+
+        project_id = str(uuid4())
+        project_name = request.project_name or "Неименуван проект"
+        with self._incremental_lock:
+            self.incremental_projects[project_id] = (project_name, project)
+            while len(self.incremental_projects) > self.MAX_INCREMENTAL_PROJECTS:
+                self.incremental_projects.popitem(last=False)
+            return self._incremental_response(project_id, project_name, project, project.results)
+
+    def update_incremental_project(self, project_id: str, delta: ProjectDeltaRequest) -> IncrementalProjectResponse:
+        """
+        Прилага промени към отворен проект. Преизчисляват се само променените
+        шкафове; отговорът съдържа тях и новите общи стойности – натрупаните
+        суми без разкрой на листовете (той е при get_incremental_project).
+        """
+        update = []
+        for cab in delta.update:
+            if not cab.cabinet_id:
+                raise HTTPException(status_code=400, detail="Променените шкафове трябва да имат cabinet_id")
+            update.append((cab.cabinet_id, self._convert_request_to_cabinet(cab)))
+        add = [self._convert_request_to_cabinet(cab) for cab in delta.add]
+
+        with self._incremental_lock:
+            project_name, project = self._get_incremental_project(project_id)
+            try:
+                changed = project.apply(add=add, remove=delta.remove, update=update)
+            except KeyError as e:
+                raise HTTPException(status_code=404, detail=e.args[0])
+
+            results = {key: result for key, result in changed.items() if result is not None}
+            removed = [key for key, result in changed.items() if result is None]
+            return self._incremental_response(project_id, project_name, project, results, removed,
+                                              nested=False)
+
+    def get_incremental_project(self, project_id: str) -> IncrementalProjectResponse:
+        """Връща всички шкафове и общите стойности на отворен проект"""
+        with self._incremental_lock:
+            project_name, project = self._get_incremental_project(project_id)
+            return self._incremental_response(project_id, project_name, project, project.results)
+
+    def close_incremental_project(self, project_id: str):
+        with self._incremental_lock:
+            if self.incremental_projects.pop(project_id, None) is None:
+                raise HTTPException(status_code=404, detail="Проектът не е намерен")
+
+    def _get_incremental_project(self, project_id: str):
+        entry = self.incremental_projects.get(project_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Проектът не е намерен")
+        self.incremental_projects.move_to_end(project_id)
+        return entry
+
+    def _incremental_response(self, project_id: str, project_name: str, project: IncrementalProject,
+                              results: Dict, removed: List[str] = (),
+                              nested: bool = True) -> IncrementalProjectResponse:
+        totals = project.project_totals(nested)
+        return IncrementalProjectResponse(
+            success=True,
+            project_id=project_id,
+            project_name=project_name,
+            total_cabinets=len(project),
+            cabinets=[self._convert_result_to_response(result, success=True) for result in results.values()],
+            removed=list(removed),
+            totals=totals,
+            project_total_cost=totals["total_cost_bgn"],
+            error=None
+        )
     
     def get_cabinet_types(self) -> List[CabinetTypeInfo]:
         """
@@ -442,4 +704,27 @@ class FurnitureCalculatorService:
             "width": [300, 400, 500, 600, 800, 900],
             "height": [760],
             "depth": [560]
-        })
\ No newline at end of file
+        })
+
+
+# -------------------- ИЗПЪЛНЕНИЕ В ОТДЕЛЕН ПРОЦЕС --------------------
+# Функции на ниво модул, за да се pickle-ват към ProcessPoolExecutor
+# (виж app/services/executor.py). Всеки процес пази собствена услуга.
+
+_process_service = None
+
+
+def _get_process_service() -> FurnitureCalculatorService:
+    global _process_service
+    if _process_service is None:
+        _process_service = FurnitureCalculatorService()
+    return _process_service
+
+
+def calculate_project_in_process(request: ProjectRequest) -> ProjectCalculationResponse:
+    return _get_process_service().calculate_project(request)
+
+
+def calculate_project_json_in_process(request: ProjectRequest) -> bytes:
+    # Готовите байтове се pickle-ват много по-евтино от pydantic модела
+    return _get_process_service().calculate_project_json(request)
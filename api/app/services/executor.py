@@ -0,0 +1,161 @@
+"""
+Executor layer – изпълнение на калкулациите извън event loop-а
+
+Всички endpoint-и са async def, а FurnitureCalculatorService е синхронен.
+Извикан директно, един голям проект блокира event loop-а и всички останали
+заявки чакат. Тук:
+
+- малките заявки (един шкаф, малък проект, валидиране) отиват в ThreadPoolExecutor;
+- големите проекти и разкроят – в ProcessPoolExecutor (собствен GIL);
+- всеки пул има лимит на опашката; при препълване заявката веднага
+  получава 503 с Retry-After, вместо да чака неограничено.
+
+EXECUTOR_THREAD_WORKERS=0 изпълнява всичко директно в event loop-а
+(старото поведение – за сравнение в load теста).
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../'))
+
+from tracing import span
+
+
+class _Lane:
+    """Един пул + брояч на заявките в него (изпълнявани и чакащи)"""
+
+    def __init__(self, name: str, executor: Optional[Executor], workers: int, max_queue: int):
+        self.name = name
+        self.executor = executor
+        self.workers = workers
+        self.limit = workers + max_queue
+        self.depth = 0
+        self.rejected = 0
+        self.completed = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.depth >= self.limit:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail=f"Сървърът е претоварен ({self.name}: {self.depth} заявки). Опитайте отново.",
+                    headers={"Retry-After": "1"},
+                )
+            self.depth += 1
+
+    def release(self):
+        with self._lock:
+            self.depth -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "limit": self.limit,
+            "depth": self.depth,
+            "queued": max(0, self.depth - self.workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+class CalculationExecutor:
+    """Два пула – нишки за малки и процеси за големи калкулации"""
+
+    def __init__(self, thread_workers: int = 4, process_workers: int = 2,
+                 thread_queue: int = 64, process_queue: int = 8):
+        self.inline = thread_workers <= 0
+        self.small = _Lane("threads",
+                           None if self.inline else ThreadPoolExecutor(thread_workers, thread_name_prefix="calc"),
+                           max(thread_workers, 1), thread_queue)
+        if process_workers > 0 and not self.inline:
+            self.large = _Lane("processes", ProcessPoolExecutor(process_workers), process_workers, process_queue)
+        else:
+            # Без процеси големите задачи минават през пула с нишки
+            self.large = self.small
+
+    async def run_small(self, fn: Callable, *args, **kwargs) -> Any:
+        """Изпълнява fn в пула с нишки (fn може да ползва общото състояние)"""
+        return await self._run(self.small, fn, *args, **kwargs)
+
+    async def run_large(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Изпълнява fn в пула с процеси. fn и аргументите трябва да се
+        pickle-ват (функция на ниво модул, pydantic модели, dataclass-и).
+        """
+        return await self._run(self.large, fn, *args, **kwargs)
+
+    async def _run(self, lane: _Lane, fn: Callable, *args, **kwargs) -> Any:
+        lane.acquire()
+        if self.inline:
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                lane.release()
+
+        call = partial(fn, *args, **kwargs)
+        if isinstance(lane.executor, ThreadPoolExecutor):
+            # Пулът не пренася contextvars – Trace-ът на заявката идва изрично
+            call = partial(contextvars.copy_context().run, call)
+        try:
+            future = lane.executor.submit(call)
+        except BaseException:
+            lane.release()
+            raise
+        # Мястото се освобождава, когато задачата в пула свърши, а не когато
+        # заявката спре да я чака (напр. прекъсната връзка) – иначе опашката
+        # и 503 не виждат задачите, които още вървят
+        future.add_done_callback(lambda _: lane.release())
+        # Времето в пула (с чакането на опашката) – в процесите етапите не се виждат
+        with span(lane.name):
+            return await asyncio.wrap_future(future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inline": self.inline,
+            "small": self.small.stats(),
+            "large": self.large.stats(),
+        }
+
+    def shutdown(self):
+        for lane in {id(self.small): self.small, id(self.large): self.large}.values():
+            if lane.executor is not None:
+                lane.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_executor: Optional[CalculationExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> CalculationExecutor:
+    """Общият executor на приложението (създава се при първо ползване)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = CalculationExecutor(
+                    thread_workers=settings.EXECUTOR_THREAD_WORKERS,
+                    process_workers=settings.EXECUTOR_PROCESS_WORKERS,
+                    thread_queue=settings.EXECUTOR_THREAD_QUEUE,
+                    process_queue=settings.EXECUTOR_PROCESS_QUEUE,
+                )
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
@@ -0,0 +1,149 @@
+"""
+Бърза сериализация на резултатите от двигателя до JSON байтове
+
+Стандартният път строи PanelResponse / HardwareItemResponse модел за всеки
+панел и хардуер, валидира ги, а после FastAPI валидира и сериализира целия
+отговор още веднъж. Резултатите от двигателя са доверени, затова тук
+CalculationResult се превръща направо в речник със същите полета, ред и
+типове като CabinetCalculationResponse (панелите се четат по колони от
+PanelTable), и се сериализира с най-бързия наличен backend:
+
+    orjson -> msgspec -> стандартния json (без допълнителни зависимости)
+
+JSON_BACKEND в настройките избира конкретен backend ('auto' = първия наличен).
+"""
+import json
+from enum import Enum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../'))
+
+from models import CalculationResult, MATERIAL_TYPES, PANEL_NAMES, EDGE_THICKNESSES, unpack_edges
+
+_MATERIAL_VALUES = [material.value for material in MATERIAL_TYPES]
+
+# Декодираните кантове по пакетиран код (повтарят се във всички шкафове)
+_EDGE_CACHE: Dict[int, Tuple[Optional[float], ...]] = {}
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _load_backend(name: str) -> Optional[Callable[[Any], bytes]]:
+    if name == "orjson":
+        try:
+            import orjson
+        except ImportError:
+            return None
+        return orjson.dumps
+    if name == "msgspec":
+        try:
+            import msgspec
+        except ImportError:
+            return None
+        return msgspec.json.Encoder().encode
+    if name == "json":
+        return _stdlib_dumps
+    raise ValueError(f"Непознат JSON backend: {name}")
+
+
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def select_backend(name: str = "auto") -> Tuple[str, Callable[[Any], bytes]]:
+    """(име, dumps) за поискания backend; 'auto' избира първия наличен"""
+    for candidate in (BACKENDS if name == "auto" else (name,)):
+        dumps = _load_backend(candidate)
+        if dumps is not None:
+            return candidate, dumps
+    raise ValueError(f"JSON backend '{name}' не е инсталиран")
+
+
+def _backend_from_settings() -> Tuple[str, Callable[[Any], bytes]]:
+    try:
+        from app.core.config import settings
+        return select_backend(settings.JSON_BACKEND)
+    except ImportError:
+        return select_backend()
+
+
+BACKEND, dumps = _backend_from_settings()
+
+
+def plain(obj: Any) -> Any:
+    """Enum ключове и стойности -> .value (рекурсивно), за totals и подобни"""
+    if isinstance(obj, dict):
+        return {(key.value if isinstance(key, Enum) else key): plain(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [plain(value) for value in obj]
+    if isinstance(obj, Enum):
+        return obj.value
+    return obj
+
+
+def _edges(packed: int) -> Tuple[Optional[float], ...]:
+    edges = _EDGE_CACHE.get(packed)
+    if edges is None:
+        edges = _EDGE_CACHE[packed] = tuple(EDGE_THICKNESSES[code] for code in unpack_edges(packed))
+    return edges
+
+
+def panels_list(result: CalculationResult) -> List[Dict[str, Any]]:
+    table = result.panel_table
+    panels = []
+    for name, width, height, material, edges, quantity, area in zip(
+            table.name, table.width_mm, table.height_mm, table.material,
+            table.edges, table.quantity, table.area_sqm):
+        front, back, left, right = _edges(edges)
+        panels.append({
+            "name": PANEL_NAMES[name],
+            "width_mm": width,
+            "height_mm": height,
+            "material": _MATERIAL_VALUES[material],
+            "quantity": quantity,
+            "edge_front": front,
+            "edge_back": back,
+            "edge_left": left,
+            "edge_right": right,
+            "area_sqm": area,
+        })
+    return panels
+
+
+def cabinet_dict(result: CalculationResult, success: bool = True) -> Dict[str, Any]:
+    """Като _convert_result_to_response(...).model_dump(mode='json'), без pydantic"""
+    cabinet = result.cabinet
+    total = float(result.total_cost_bgn)
+    return {
+        "success": success,
+        "cabinet_id": cabinet.cabinet_id,
+        "type": cabinet.type.value,
+        "dimensions": {"width": int(cabinet.width), "height": int(cabinet.height), "depth": int(cabinet.depth)},
+        "panels": panels_list(result),
+        "hardware": [{"name": item.name, "quantity": int(item.quantity), "notes": item.notes}
+                     for item in result.hardware],
+        "used_boards": {name: int(count) for name, count in result.used_boards.items()},
+        "used_edges_m": {name: float(meters) for name, meters in result.used_edges_m.items()},
+        "labor_cost": float(result.labor_cost),
+        "installation_cost": float(result.installation_cost),
+        "total_cost_bgn": total,
+        "compara_cost_bgn": total,
+        "error": getattr(result, "error", None),
+    }
+
+
+def project_dict(project_name: str, results: Iterable[CalculationResult], totals: Dict) -> Dict[str, Any]:
+    """Като ProjectCalculationResponse(...).model_dump(mode='json'), без pydantic"""
+    cabinets = [cabinet_dict(result) for result in results]
+    return {
+        "success": True,
+        "project_name": project_name,
+        "total_cabinets": len(cabinets),
+        "cabinets": cabinets,
+        "totals": plain(totals),
+        "project_total_cost": float(totals.get("total_cost_bgn", 0.0)),
+        "error": None,
+    }
@@ -0,0 +1,369 @@
+"""
+Фонови задачи за големи проекти
+
+Синхронният /projects/calculate е за проекти до MAX_SYNC_PROJECT_CABINETS
+шкафа. По-големите се пускат като задача:
+
+- задачата се записва в SQLite таблица (JOBS_DB_PATH) – заявка, статус,
+  прогрес, резултат или грешка;
+- изпълнява се в ProcessPoolExecutor (JOBS_WORKERS процеса), като
+  работникът сам пише прогреса и резултата в базата;
+- отказът е флаг в таблицата – чакаща задача се отказва веднага, а
+  работеща спира при следващото обновяване на прогреса;
+- всяка незавършена задача има собственик (мениджърът, който я е пуснал)
+  и наем (lease_until), който собственикът подновява на JOBS_LEASE_S / 3
+  секунди. Задача с изтекъл наем е на спрял процес – друг мениджър (или
+  същият след рестарт) я взима, 'running' става отново 'queued' и се пуска
+  пак. Така при няколко uvicorn работника всеки изпълнява само своите.
+
+Статуси: queued -> running -> done | failed | cancelled
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+from app.core.config import settings
+from app.schemas.cabinet import ProjectRequest
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = (DONE, FAILED, CANCELLED)
+
+# Прогресът се записва най-често на толкова секунди (и при всеки нов процент)
+PROGRESS_INTERVAL_S = 0.5
+
+_COLUMNS = ("id", "kind", "status", "project_name", "total", "done", "cancel_requested",
+            "error", "created_at", "started_at", "finished_at")
+
+# Колоните, добавени след първата версия на таблицата (ALTER TABLE за старите бази)
+_LEASE_COLUMNS = (("owner", "TEXT"), ("lease_until", "REAL"))
+
+
+class JobStore:
+    """SQLite таблица със задачите. Една връзка на процес, достъпът е под lock."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                project_name TEXT,
+                total INTEGER NOT NULL DEFAULT 0,
+                done INTEGER NOT NULL DEFAULT 0,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                request TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                owner TEXT,
+                lease_until REAL
+            )""")
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for name, kind in _LEASE_COLUMNS:
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs(status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_created_at ON jobs(created_at)")
+
+    def _query(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _update(self, sql: str, params=()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, params).rowcount
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        return dict(zip(_COLUMNS, row))
+
+    def create(self, kind: str, request: ProjectRequest, owner: str, lease_s: float) -> Dict[str, Any]:
+        job_id = str(uuid4())
+        now = time.time()
+        self._update(
+            "INSERT INTO jobs (id, kind, status, project_name, total, request, created_at, owner, lease_until) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, QUEUED, request.project_name, len(request.cabinets),
+             request.model_dump_json(), now, owner, now + lease_s))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+        return self._row(rows[0]) if rows else None
+
+    def list(self, limit: int = 50, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        sql = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+        params: tuple = ()
+        if status:
+            sql += " WHERE status = ?"
+            params = (status,)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        return [self._row(row) for row in self._query(sql, params + (limit,))]
+
+    def request(self, job_id: str) -> Optional[str]:
+        rows = self._query("SELECT request FROM jobs WHERE id = ?", (job_id,))
+        return rows[0][0] if rows else None
+
+    def result(self, job_id: str) -> Optional[str]:
+        rows = self._query("SELECT result FROM jobs WHERE id = ?", (job_id,))
+        return rows[0][0] if rows else None
+
+    def start(self, job_id: str) -> bool:
+        """queued -> running; False, ако задачата междувременно е отказана или взета"""
+        return self._update(
+            "UPDATE jobs SET status = ?, started_at = ?, done = 0 WHERE id = ? AND status = ?",
+            (RUNNING, time.time(), job_id, QUEUED)) == 1
+
+    def progress(self, job_id: str, done: int, total: int) -> bool:
+        """Записва прогреса; връща True, ако е поискан отказ"""
+        rows = self._query(
+            "UPDATE jobs SET done = ?, total = ? WHERE id = ? RETURNING cancel_requested",
+            (done, total, job_id))
+        return bool(rows and rows[0][0])
+
+    def finish(self, job_id: str, result_json: str):
+        self._update(
+            "UPDATE jobs SET status = ?, result = ?, done = total, finished_at = ? WHERE id = ? AND status = ?",
+            (DONE, result_json, time.time(), job_id, RUNNING))
+
+    def fail(self, job_id: str, error: str):
+        self._update(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND status IN (?, ?)",
+            (FAILED, error, time.time(), job_id, QUEUED, RUNNING))
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Чакаща задача се отказва веднага, на работеща се вдига флаг.
+        Завършените не се променят.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, now, job_id, QUEUED))
+            self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, RUNNING))
+        return self.get(job_id)
+
+    def mark_cancelled(self, job_id: str):
+        self._update(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, RUNNING))
+
+    def renew(self, owner: str, lease_s: float) -> int:
+        """Подновява наема на незавършените задачи на собственика"""
+        return self._update(
+            "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN (?, ?)",
+            (time.time() + lease_s, owner, QUEUED, RUNNING))
+
+    def claim_expired(self, owner: str, lease_s: float) -> List[str]:
+        """
+        Взима задачите с изтекъл наем (собственикът им е спрял): 'running'
+        стават отново 'queued' (отказаните – 'cancelled'), а собственик
+        става owner. Връща взетите задачи за пускане.
+        """
+        now = time.time()
+        expired = "status = ? AND (lease_until IS NULL OR lease_until < ?)"
+        with self._lock:
+            # IMMEDIATE – два мениджъра не могат да вземат една и съща задача
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    f"UPDATE jobs SET status = ?, finished_at = ? WHERE {expired} AND cancel_requested = 1",
+                    (CANCELLED, now, RUNNING, now))
+                self._conn.execute(
+                    f"UPDATE jobs SET status = ?, done = 0, started_at = NULL WHERE {expired}",
+                    (QUEUED, RUNNING, now))
+                rows = self._conn.execute(
+                    f"SELECT id FROM jobs WHERE {expired} ORDER BY created_at", (QUEUED, now)).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET owner = ?, lease_until = ? WHERE id = ?",
+                    [(owner, now + lease_s, row[0]) for row in rows])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [row[0] for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._query("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# -------------------- РАБОТНИК (в отделен процес) --------------------
+
+_worker_store: Optional[JobStore] = None
+
+
+def _get_worker_store(path: str) -> JobStore:
+    global _worker_store
+    if _worker_store is None or _worker_store.path != path:
+        _worker_store = JobStore(path)
+    return _worker_store
+
+
+def run_project_job(db_path: str, job_id: str) -> str:
+    """
+    Изпълнява една задача в работния процес. Функция на ниво модул, за да
+    се pickle-ва; връща крайния статус.
+    """
+    from app.services.calculator import CalculationCancelled, _get_process_service
+
+    store = _get_worker_store(db_path)
+    if not store.start(job_id):
+        return store.get(job_id)["status"]
+
+    try:
+        request = ProjectRequest.model_validate_json(store.request(job_id))
+        last_write = 0.0
+        last_percent = -1
+
+        def progress(done: int, total: int):
+            nonlocal last_write, last_percent
+            percent = done * 100 // total if total else 100
+            now = time.monotonic()
+            if percent == last_percent and now - last_write < PROGRESS_INTERVAL_S:
+                return
+            last_write, last_percent = now, percent
+            if store.progress(job_id, done, total):
+                raise CalculationCancelled(job_id)
+
+        result = _get_process_service().calculate_project(request, progress)
+    except CalculationCancelled:
+        store.mark_cancelled(job_id)
+        return CANCELLED
+    except Exception as e:
+        store.fail(job_id, getattr(e, "detail", None) or str(e))
+        return FAILED
+
+    if not result.success:
+        store.fail(job_id, result.error or "Грешка при калкулация на проект")
+        return FAILED
+    store.finish(job_id, result.model_dump_json())
+    return DONE
+
+
+# -------------------- МЕНИДЖЪР (в процеса на API-то) --------------------
+
+class JobManager:
+    """
+    Записва задачите и ги пуска в пула с процеси. Нишка на заден план
+    подновява наема на задачите му и взима тези с изтекъл наем.
+    """
+
+    def __init__(self, path: str, workers: int = 2, lease_s: float = 30.0):
+        self.path = path
+        self.workers = max(1, workers)
+        self.lease_s = lease_s
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.store = JobStore(path)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def resume(self) -> int:
+        """Пуска задачите с изтекъл наем (от спрял процес или предишно стартиране)"""
+        job_ids = self.store.claim_expired(self.owner, self.lease_s)
+        for job_id in job_ids:
+            self._dispatch(job_id)
+        return len(job_ids)
+
+    def start_heartbeat(self):
+        if self._heartbeat is None:
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="jobs-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.lease_s / 3):
+            try:
+                self.store.renew(self.owner, self.lease_s)
+                self.resume()
+            except Exception:
+                # Заета или временно недостъпна база – опитва се пак на следващия такт
+                pass
+
+    def submit(self, request: ProjectRequest, kind: str = "project") -> Dict[str, Any]:
+        job = self.store.create(kind, request, self.owner, self.lease_s)
+        self._dispatch(job["id"])
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.cancel(job_id)
+
+    def _dispatch(self, job_id: str):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers)
+            future = self._pool.submit(run_project_job, self.path, job_id)
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+
+    def _on_done(self, job_id: str, future: Future):
+        # Работникът е паднал (напр. BrokenProcessPool) – задачата не остава 'running'
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.store.fail(job_id, f"Работният процес спря: {error}")
+            with self._pool_lock:
+                self._pool = None
+
+    def stats(self) -> Dict[str, int]:
+        return self.store.counts()
+
+    def shutdown(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+        with self._pool_lock:
+            if self._pool is not None:
+                # Незавършените задачи остават в базата и се взимат, когато наемът им изтече
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+        self.store.close()
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """Общият мениджър на задачите (при създаване пуска задачите с изтекъл наем)"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                manager = JobManager(settings.JOBS_DB_PATH, settings.JOBS_WORKERS, settings.JOBS_LEASE_S)
+                manager.resume()
+                manager.start_heartbeat()
+                _manager = manager
+    return _manager
+
+
+def shutdown_job_manager():
+    global _manager
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None
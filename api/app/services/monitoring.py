@@ -0,0 +1,91 @@
+"""
+Метрики на услугите за /metrics
+
+Тук няма нови броячи – callback-ите четат при всяко /metrics това, което
+услугите вече броят: кешовете (калкулации, разкрои, готови отговори),
+опашките на executor-а, singleflight и фоновите задачи. Услуга, която още
+не е създадена (напр. executor-ът преди първата заявка), не се създава от
+/metrics – просто липсва в изхода.
+"""
+from typing import Iterator, Tuple
+
+from metrics import REGISTRY
+
+from app.services import executor, jobs, response_cache
+from app.services.calculator import engines, get_nesting_cache, _singleflight
+
+
+def _cache_stats() -> Iterator[Tuple[str, dict]]:
+    hits = misses = 0
+    for engine in list(engines):
+        if engine.cache is not None:
+            stats = engine.cache.stats()
+            hits += stats["hits"]
+            misses += stats["misses"]
+    yield "calculation", {"hits": hits, "misses": misses}
+
+    nesting = get_nesting_cache()
+    if nesting is not None:
+        yield "nesting", nesting.stats()
+
+    cache = response_cache._cache
+    if cache is not None:
+        stats = cache.stats()
+        yield "response", {"hits": stats["hits"], "misses": stats["misses"] + stats["shared_hits"]}
+        if stats["shared"]:
+            yield "response_shared", {"hits": stats["shared_hits"], "misses": stats["misses"]}
+
+
+def _cache_samples(field: str):
+    return [((name,), stats[field]) for name, stats in _cache_stats()]
+
+
+def _hit_ratios():
+    samples = []
+    for name, stats in _cache_stats():
+        lookups = stats["hits"] + stats["misses"]
+        samples.append(((name,), stats["hits"] / lookups if lookups else 0.0))
+    return samples
+
+
+def _lanes():
+    calculation_executor = executor._executor
+    if calculation_executor is None:
+        return []
+    lanes = {id(lane): lane for lane in (calculation_executor.small, calculation_executor.large)}
+    return [(lane.name, lane.stats()) for lane in lanes.values()]
+
+
+def _lane_samples(field: str):
+    return [((name,), stats[field]) for name, stats in _lanes()]
+
+
+def _job_counts():
+    manager = jobs._manager
+    if manager is None:
+        return []
+    return [((status,), count) for status, count in sorted(manager.stats().items())]
+
+
+REGISTRY.callback("furniture_cache_hits_total", "Попадения в кеш", lambda: _cache_samples("hits"),
+                  ("cache",), kind="counter")
+REGISTRY.callback("furniture_cache_misses_total", "Пропуски в кеш", lambda: _cache_samples("misses"),
+                  ("cache",), kind="counter")
+REGISTRY.callback("furniture_cache_hit_ratio", "Дял на попаденията от началото на процеса", _hit_ratios,
+                  ("cache",))
+
+REGISTRY.callback("furniture_executor_depth", "Заявки в пула (изпълнявани и чакащи)",
+                  lambda: _lane_samples("depth"), ("lane",))
+REGISTRY.callback("furniture_executor_queued", "Чакащи заявки в опашката на пула",
+                  lambda: _lane_samples("queued"), ("lane",))
+REGISTRY.callback("furniture_executor_limit", "Максимум заявки в пула преди 503",
+                  lambda: _lane_samples("limit"), ("lane",))
+REGISTRY.callback("furniture_executor_rejected_total", "Отказани заявки (503) при пълна опашка",
+                  lambda: _lane_samples("rejected"), ("lane",), kind="counter")
+
+REGISTRY.callback("furniture_singleflight_coalesced_total", "Заявки, получили резултата на друга в ход",
+                  lambda: [((), _singleflight.stats()["coalesced"])], kind="counter")
+REGISTRY.callback("furniture_singleflight_in_flight", "Изчисления в ход в singleflight",
+                  lambda: [((), _singleflight.stats()["in_flight"])])
+
+REGISTRY.callback("furniture_jobs", "Фонови задачи по статус", _job_counts, ("status",))
@@ -0,0 +1,256 @@
+"""
+Статистика на запазените проекти, поддържана при запис и изтриване
+
+Вместо /stats/summary да обхожда всички проекти и шкафове, ProjectStore
+добавя (или изважда) приноса на всеки проект към агрегатните таблици в
+същата транзакция:
+
+    stats_totals       – общ брой проекти, шкафове и стойност (един ред)
+    stats_types        – брой шкафове и стойност по тип шкаф
+    stats_daily        – оферти, шкафове и стойност по ден (UTC)
+    stats_cost_sketch  – CostSketch на цената на проектите
+
+Четенето не зависи от броя проекти. Перцентилите идват от CostSketch –
+логаритмична хистограма (като DDSketch) с относителна грешка 1%; за разлика
+от повечето скици тя позволява и изваждане, така че изтритите проекти
+излизат точно от разпределението.
+"""
+import math
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.schemas.cabinet import ProjectCalculationResponse
+
+STATS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stats_totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    projects INTEGER NOT NULL,
+    cabinets INTEGER NOT NULL,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats_types (
+    type TEXT PRIMARY KEY,
+    cabinets INTEGER NOT NULL,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats_daily (
+    day TEXT PRIMARY KEY,
+    quotes INTEGER NOT NULL,
+    cabinets INTEGER NOT NULL,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats_cost_sketch (
+    bucket INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+"""
+
+PERCENTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class CostSketch:
+    """
+    Логаритмична хистограма на положителни стойности. Стойност v попада в
+    кошница ceil(log(v) / log(gamma)), gamma = (1 + a) / (1 - a), и всеки
+    квантил се връща с относителна грешка a. Нулите и отрицателните имат
+    отделна кошница ZERO_BUCKET.
+    """
+
+    ZERO_BUCKET = -(1 << 31)
+
+    def __init__(self, relative_accuracy: float = 0.01, counts: Optional[Dict[int, int]] = None):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.counts: Dict[int, int] = dict(counts or {})
+
+    def bucket(self, value: float) -> int:
+        if value <= 0:
+            return self.ZERO_BUCKET
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def bucket_value(self, bucket: int) -> float:
+        """Представителната стойност на кошница (средата в относителен смисъл)"""
+        if bucket == self.ZERO_BUCKET:
+            return 0.0
+        return 2 * self.gamma ** bucket / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        """count < 0 изважда стойността"""
+        bucket = self.bucket(value)
+        remaining = self.counts.get(bucket, 0) + count
+        if remaining > 0:
+            self.counts[bucket] = remaining
+        else:
+            self.counts.pop(bucket, None)
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts.values())
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if not total:
+            return None
+        rank = round(q * (total - 1))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen > rank:
+                return self.bucket_value(bucket)
+        return self.bucket_value(max(self.counts))
+
+
+_SKETCH = CostSketch()
+
+
+def _day(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+@dataclass
+class ProjectContribution:
+    """Приносът на един проект към агрегатите"""
+    created_at: float
+    cabinets: int
+    value: float
+    types: Dict[str, Tuple[int, float]] = field(default_factory=dict)   # тип -> (брой, стойност)
+
+    @classmethod
+    def from_response(cls, project: ProjectCalculationResponse, created_at: float) -> "ProjectContribution":
+        types: Dict[str, Tuple[int, float]] = {}
+        for cabinet in project.cabinets:
+            count, value = types.get(cabinet.type.value, (0, 0.0))
+            types[cabinet.type.value] = (count + 1, value + cabinet.total_cost_bgn)
+        return cls(created_at, project.total_cabinets, project.project_total_cost, types)
+
+    @classmethod
+    def load(cls, conn: sqlite3.Connection, project_id: str) -> Optional["ProjectContribution"]:
+        row = conn.execute(
+            "SELECT created_at, total_cabinets, project_total_cost FROM projects WHERE id = ?",
+            (project_id,)).fetchone()
+        if row is None:
+            return None
+        types = conn.execute(
+            "SELECT type, COUNT(*), SUM(total_cost_bgn) FROM cabinets WHERE project_id = ? GROUP BY type",
+            (project_id,)).fetchall()
+        return cls(row[0], row[1], row[2], {type_: (count, value) for type_, count, value in types})
+
+
+def apply(conn: sqlite3.Connection, contribution: ProjectContribution, sign: int):
+    """Добавя (sign=1) или изважда (sign=-1) проект от агрегатите. Вика се в транзакция."""
+    c = contribution
+    conn.execute(
+        "INSERT INTO stats_totals (id, projects, cabinets, value) VALUES (1, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET projects = projects + excluded.projects, "
+        "cabinets = cabinets + excluded.cabinets, value = value + excluded.value",
+        (sign, sign * c.cabinets, sign * c.value))
+    conn.executemany(
+        "INSERT INTO stats_types (type, cabinets, value) VALUES (?, ?, ?) "
+        "ON CONFLICT(type) DO UPDATE SET cabinets = cabinets + excluded.cabinets, value = value + excluded.value",
+        [(type_, sign * count, sign * value) for type_, (count, value) in c.types.items()])
+    conn.execute(
+        "INSERT INTO stats_daily (day, quotes, cabinets, value) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(day) DO UPDATE SET quotes = quotes + excluded.quotes, "
+        "cabinets = cabinets + excluded.cabinets, value = value + excluded.value",
+        (_day(c.created_at), sign, sign * c.cabinets, sign * c.value))
+    conn.execute(
+        "INSERT INTO stats_cost_sketch (bucket, count) VALUES (?, ?) "
+        "ON CONFLICT(bucket) DO UPDATE SET count = count + excluded.count",
+        (_SKETCH.bucket(c.value), sign))
+
+    if sign < 0:
+        # Празните редове се махат, за да не остава шум от сумите с плаваща запетая
+        conn.execute("DELETE FROM stats_types WHERE cabinets <= 0")
+        conn.execute("DELETE FROM stats_daily WHERE quotes <= 0")
+        conn.execute("DELETE FROM stats_cost_sketch WHERE count <= 0")
+        conn.execute("UPDATE stats_totals SET cabinets = 0, value = 0.0 WHERE projects <= 0")
+
+
+def ensure(conn: sqlite3.Connection):
+    """
+    Създава таблиците; ако агрегатите липсват (нова или стара база без тях),
+    ги изгражда от запазените проекти.
+    """
+    conn.executescript(STATS_SCHEMA)
+    if conn.execute("SELECT 1 FROM stats_totals WHERE id = 1").fetchone() is not None:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM stats_totals WHERE id = 1").fetchone() is None:
+            rebuild(conn)
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def rebuild(conn: sqlite3.Connection):
+    """Преизчислява всички агрегати от таблиците projects и cabinets"""
+    for table in ("stats_totals", "stats_types", "stats_daily", "stats_cost_sketch"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute(
+        "INSERT INTO stats_totals (id, projects, cabinets, value) "
+        "SELECT 1, COUNT(*), COALESCE(SUM(total_cabinets), 0), COALESCE(SUM(project_total_cost), 0.0) FROM projects")
+    conn.execute(
+        "INSERT INTO stats_types (type, cabinets, value) "
+        "SELECT type, COUNT(*), SUM(total_cost_bgn) FROM cabinets GROUP BY type")
+    daily: Dict[str, List] = {}
+    sketch = CostSketch(_SKETCH.relative_accuracy)
+    for created_at, cabinets, value in conn.execute(
+            "SELECT created_at, total_cabinets, project_total_cost FROM projects"):
+        row = daily.setdefault(_day(created_at), [0, 0, 0.0])
+        row[0] += 1
+        row[1] += cabinets
+        row[2] += value
+        sketch.add(value)
+    conn.executemany("INSERT INTO stats_daily (day, quotes, cabinets, value) VALUES (?, ?, ?, ?)",
+                     [(day, *row) for day, row in daily.items()])
+    conn.executemany("INSERT INTO stats_cost_sketch (bucket, count) VALUES (?, ?)", sketch.counts.items())
+
+
+# -------------------- ЧЕТЕНЕ --------------------
+
+def read_summary(conn: sqlite3.Connection) -> Dict[str, Any]:
+    row = conn.execute("SELECT projects, cabinets, value FROM stats_totals WHERE id = 1").fetchone()
+    projects, cabinets, value = row or (0, 0, 0.0)
+    distribution = conn.execute(
+        "SELECT type, cabinets FROM stats_types ORDER BY cabinets DESC, type").fetchall()
+    return {
+        "total_projects": projects,
+        "total_cabinets": cabinets,
+        "total_value": value,
+        "cabinet_types_distribution": dict(distribution),
+    }
+
+
+def _load_sketch(conn: sqlite3.Connection) -> CostSketch:
+    return CostSketch(_SKETCH.relative_accuracy, dict(conn.execute("SELECT bucket, count FROM stats_cost_sketch")))
+
+
+def read_dashboard(conn: sqlite3.Connection, days: int = 30,
+                   percentiles: Iterable[float] = PERCENTILES) -> Dict[str, Any]:
+    """Оферти по ден за последните days дни, средна цена по тип шкаф и перцентили на цената"""
+    since = _day(time.time() - (days - 1) * 86400)
+    daily = conn.execute(
+        "SELECT day, quotes, cabinets, value FROM stats_daily WHERE day >= ? ORDER BY day", (since,)).fetchall()
+    types = conn.execute("SELECT type, cabinets, value FROM stats_types ORDER BY cabinets DESC, type").fetchall()
+    sketch = _load_sketch(conn)
+    return {
+        **read_summary(conn),
+        "quotes_per_day": [
+            {"day": day, "quotes": quotes, "cabinets": cabinets, "total_value": value}
+            for day, quotes, cabinets, value in daily
+        ],
+        "cost_per_cabinet_type": {
+            type_: {"cabinets": cabinets, "total_value": value, "average_cost": value / cabinets}
+            for type_, cabinets, value in types
+        },
+        "project_cost_percentiles": {
+            f"p{round(q * 100, 1):g}": sketch.quantile(q) for q in percentiles
+        },
+        "percentile_relative_accuracy": sketch.relative_accuracy,
+    }
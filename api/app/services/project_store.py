@@ -0,0 +1,388 @@
+"""
+Постоянно хранилище за запазени проекти (SQLite, settings.DATABASE_URL)
+
+Проектът се записва нормализиран в три таблици – projects, cabinets и
+panels – с една транзакция и executemany за шкафовете и панелите. Списъкът,
+зареждането са заявки по индекси, а статистиката се поддържа при запис и
+изтриване (project_stats.py).
+
+Базата е в WAL режим: няколко uvicorn worker-а четат едновременно и виждат
+проектите, запазени от другите. Връзките се вземат от малък пул (по една на
+нишка от executor-а), а не се отварят при всяка заявка.
+"""
+import base64
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services import project_stats
+from app.services.project_stats import ProjectContribution
+from app.schemas.cabinet import (
+    ProjectCalculationResponse, CabinetCalculationResponse, PanelResponse, HardwareItemResponse
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    project_name TEXT NOT NULL,
+    total_cabinets INTEGER NOT NULL,
+    project_total_cost REAL NOT NULL,
+    success INTEGER NOT NULL,
+    error TEXT,
+    totals TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_projects_created_at ON projects(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_projects_cost ON projects(project_total_cost, id);
+CREATE INDEX IF NOT EXISTS ix_projects_name ON projects(project_name, id);
+CREATE INDEX IF NOT EXISTS ix_projects_cabinets ON projects(total_cabinets, id);
+
+CREATE TABLE IF NOT EXISTS cabinets (
+    project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    cabinet_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    depth INTEGER,
+    labor_cost REAL NOT NULL,
+    installation_cost REAL NOT NULL,
+    total_cost_bgn REAL NOT NULL,
+    compara_cost_bgn REAL,
+    success INTEGER NOT NULL,
+    error TEXT,
+    extra TEXT NOT NULL,
+    PRIMARY KEY (project_id, position)
+);
+CREATE INDEX IF NOT EXISTS ix_cabinets_type ON cabinets(type, project_id);
+
+CREATE TABLE IF NOT EXISTS panels (
+    project_id TEXT NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    cabinet_position INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    width_mm INTEGER NOT NULL,
+    height_mm INTEGER NOT NULL,
+    material TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    edge_front REAL,
+    edge_back REAL,
+    edge_left REAL,
+    edge_right REAL,
+    area_sqm REAL NOT NULL,
+    PRIMARY KEY (project_id, cabinet_position, position)
+);
+"""
+
+
+# Колоните за сортиране на списъка (всяка има индекс (колона, id))
+SORT_COLUMNS = {
+    "created_at": "created_at",
+    "cost": "project_total_cost",
+    "name": "project_name",
+    "cabinets": "total_cabinets",
+}
+
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(sort: str, order: str, value: Any, project_id: str) -> str:
+    payload = json.dumps([sort, order, value, project_id], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple[Any, str]:
+    """Връща (стойност, id) на последния ред от предишната страница"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, cursor_order, value, project_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise ValueError("Невалиден cursor")
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise ValueError("cursor е от списък с друго сортиране")
+    return value, project_id
+
+
+def sqlite_path(database_url: str) -> str:
+    """'sqlite:///./file.db' -> './file.db' (обикновен път се връща както е)"""
+    for prefix in ("sqlite:///", "sqlite://"):
+        if database_url.startswith(prefix):
+            return database_url[len(prefix):] or ":memory:"
+    return database_url
+
+
+class _ConnectionPool:
+    """Пул от SQLite връзки; при празен пул се отваря нова (до max_size се пазят)"""
+
+    def __init__(self, path: str, max_size: int = 8):
+        self.path = path
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(max_size)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class ProjectStore:
+    """Запазени проекти в SQLite"""
+
+    def __init__(self, path: str, pool_size: int = 8):
+        self.path = path
+        self._pool = _ConnectionPool(path, pool_size)
+        with self._pool.connection() as conn:
+            conn.executescript(_SCHEMA)
+            project_stats.ensure(conn)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    # -------------------- ЗАПИС --------------------
+
+    def save(self, project_id: str, project: ProjectCalculationResponse) -> float:
+        """Записва проекта с всички шкафове и панели; връща created_at"""
+        created_at = time.time()
+        cabinet_rows = []
+        panel_rows = []
+        for position, cabinet in enumerate(project.cabinets):
+            dimensions = cabinet.dimensions
+            cabinet_rows.append((
+                project_id, position, cabinet.cabinet_id, cabinet.type.value,
+                dimensions.get("width"), dimensions.get("height"), dimensions.get("depth"),
+                cabinet.labor_cost, cabinet.installation_cost, cabinet.total_cost_bgn,
+                cabinet.compara_cost_bgn, int(cabinet.success), cabinet.error,
+                json.dumps({
+                    "dimensions": dimensions,
+                    "hardware": [item.model_dump() for item in cabinet.hardware],
+                    "used_boards": cabinet.used_boards,
+                    "used_edges_m": cabinet.used_edges_m,
+                }, ensure_ascii=False),
+            ))
+            for index, panel in enumerate(cabinet.panels):
+                panel_rows.append((
+                    project_id, position, index, panel.name, panel.width_mm, panel.height_mm,
+                    panel.material.value, panel.quantity, panel.edge_front, panel.edge_back,
+                    panel.edge_left, panel.edge_right, panel.area_sqm,
+                ))
+
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO projects (id, project_name, total_cabinets, project_total_cost, success, error, "
+                "totals, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (project_id, project.project_name, project.total_cabinets, project.project_total_cost,
+                 int(project.success), project.error, project.model_dump_json(include={"totals"}),
+                 created_at))
+            conn.executemany(
+                "INSERT INTO cabinets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", cabinet_rows)
+            conn.executemany(
+                "INSERT INTO panels VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", panel_rows)
+            project_stats.apply(conn, ProjectContribution.from_response(project, created_at), 1)
+        return created_at
+
+    def delete(self, project_id: str) -> bool:
+        """Изтрива проекта (шкафовете и панелите – каскадно); False, ако липсва"""
+        with self._transaction() as conn:
+            contribution = ProjectContribution.load(conn, project_id)
+            if contribution is None:
+                return False
+            conn.execute("DELETE FROM projects WHERE id = ?", (project_id,))
+            project_stats.apply(conn, contribution, -1)
+            return True
+
+    # -------------------- ЧЕТЕНЕ --------------------
+
+    def get(self, project_id: str) -> Optional[ProjectCalculationResponse]:
+        with self._pool.connection() as conn:
+            project = conn.execute(
+                "SELECT project_name, total_cabinets, project_total_cost, success, error, totals "
+                "FROM projects WHERE id = ?", (project_id,)).fetchone()
+            if project is None:
+                return None
+            cabinet_rows = conn.execute(
+                "SELECT position, cabinet_id, type, labor_cost, installation_cost, total_cost_bgn, "
+                "compara_cost_bgn, success, error, extra FROM cabinets WHERE project_id = ? ORDER BY position",
+                (project_id,)).fetchall()
+            panel_rows = conn.execute(
+                "SELECT cabinet_position, name, width_mm, height_mm, material, quantity, edge_front, edge_back, "
+                "edge_left, edge_right, area_sqm FROM panels WHERE project_id = ? "
+                "ORDER BY cabinet_position, position", (project_id,)).fetchall()
+
+        panels: Dict[int, List[PanelResponse]] = {}
+        for (cabinet_position, name, width_mm, height_mm, material, quantity,
+             edge_front, edge_back, edge_left, edge_right, area_sqm) in panel_rows:
+            panels.setdefault(cabinet_position, []).append(PanelResponse(
+                name=name, width_mm=width_mm, height_mm=height_mm, material=material, quantity=quantity,
+                edge_front=edge_front, edge_back=edge_back, edge_left=edge_left, edge_right=edge_right,
+                area_sqm=area_sqm))
+
+        cabinets = []
+        for (position, cabinet_id, cabinet_type, labor_cost, installation_cost, total_cost_bgn,
+             compara_cost_bgn, success, error, extra) in cabinet_rows:
+            extra = json.loads(extra)
+            cabinets.append(CabinetCalculationResponse(
+                success=bool(success),
+                cabinet_id=cabinet_id,
+                type=cabinet_type,
+                dimensions=extra["dimensions"],
+                panels=panels.get(position, []),
+                hardware=[HardwareItemResponse(**item) for item in extra["hardware"]],
+                used_boards=extra["used_boards"],
+                used_edges_m=extra["used_edges_m"],
+                labor_cost=labor_cost,
+                installation_cost=installation_cost,
+                total_cost_bgn=total_cost_bgn,
+                compara_cost_bgn=compara_cost_bgn,
+                error=error
+            ))
+
+        project_name, total_cabinets, project_total_cost, success, error, totals = project
+        return ProjectCalculationResponse(
+            success=bool(success),
+            project_name=project_name,
+            total_cabinets=total_cabinets,
+            cabinets=cabinets,
+            totals=json.loads(totals)["totals"],
+            project_total_cost=project_total_cost,
+            error=error
+        )
+
+    def list(self, limit: int = 50, cursor: Optional[str] = None, sort: str = "created_at",
+             order: str = "desc", name_prefix: Optional[str] = None, min_cost: Optional[float] = None,
+             max_cost: Optional[float] = None, cabinet_type: Optional[str] = None,
+             created_from: Optional[float] = None, created_to: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Страница от запазените проекти. Пагинацията е по ключ (sort колона, id):
+        следващата страница започва след последния ред на предишната, затова
+        цената на страница не зависи от броя проекти и от позицията в списъка.
+        Връща {"projects": [...], "next_cursor": str или None}.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Невалидно сортиране: {sort} (позволени: {', '.join(SORT_COLUMNS)})")
+        if order not in ("asc", "desc"):
+            raise ValueError("order трябва да е asc или desc")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        column = SORT_COLUMNS[sort]
+
+        where: List[str] = []
+        params: List[Any] = []
+        if cursor:
+            value, last_id = decode_cursor(cursor, sort, order)
+            where.append(f"({column}, id) {'<' if order == 'desc' else '>'} (?, ?)")
+            params += [value, last_id]
+        if name_prefix:
+            # Диапазон вместо LIKE – използва индекса по име
+            where.append("project_name >= ? AND project_name < ?")
+            params += [name_prefix, name_prefix + "\U0010ffff"]
+        if min_cost is not None:
+            where.append("project_total_cost >= ?")
+            params.append(min_cost)
+        if max_cost is not None:
+            where.append("project_total_cost <= ?")
+            params.append(max_cost)
+        if created_from is not None:
+            where.append("created_at >= ?")
+            params.append(created_from)
+        if created_to is not None:
+            where.append("created_at < ?")
+            params.append(created_to)
+        if cabinet_type:
+            where.append("EXISTS (SELECT 1 FROM cabinets c WHERE c.type = ? AND c.project_id = projects.id)")
+            params.append(cabinet_type)
+
+        direction = "DESC" if order == "desc" else "ASC"
+        sql = ("SELECT id, project_name, total_cabinets, project_total_cost, success, created_at FROM projects"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + f" ORDER BY {column} {direction}, id {direction} LIMIT ?")
+        with self._pool.connection() as conn:
+            rows = conn.execute(sql, params + [limit + 1]).fetchall()
+
+        projects = [
+            {
+                "project_id": project_id,
+                "project_name": project_name,
+                "total_cabinets": total_cabinets,
+                "project_total_cost": project_total_cost,
+                "success": bool(success),
+                "created_at": created_at,
+            }
+            for project_id, project_name, total_cabinets, project_total_cost, success, created_at in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = projects[-1]
+            sort_value = {"created_at": last["created_at"], "cost": last["project_total_cost"],
+                          "name": last["project_name"], "cabinets": last["total_cabinets"]}[sort]
+            next_cursor = encode_cursor(sort, order, sort_value, last["project_id"])
+        return {"projects": projects, "next_cursor": next_cursor}
+
+    def stats(self) -> Dict[str, Any]:
+        """Общ брой, стойност и разпределение по тип шкаф (project_stats.py)"""
+        with self._pool.connection() as conn:
+            return project_stats.read_summary(conn)
+
+    def dashboard(self, days: int = 30) -> Dict[str, Any]:
+        """Оферти по ден, средна цена по тип шкаф и перцентили на цената"""
+        with self._pool.connection() as conn:
+            return project_stats.read_dashboard(conn, days)
+
+    def close(self):
+        self._pool.close()
+
+
+_store: Optional[ProjectStore] = None
+_store_lock = threading.Lock()
+
+
+def get_project_store() -> ProjectStore:
+    """Общото хранилище на приложението (по settings.DATABASE_URL)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProjectStore(sqlite_path(settings.DATABASE_URL))
+    return _store
+
+
+def close_project_store():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
@@ -0,0 +1,261 @@
+"""
+Кеш за готови отговори на калкулациите (ETag / If-None-Match)
+
+Резултатът от /cabinets/calculate и /projects/calculate зависи само от
+тялото на заявката и от версията на двигателя и цените. Ключът е SHA-256 на
+каноничното тяло (model_dump с попълнени стойности по подразбиране,
+сортирани ключове) + ENGINE_VERSION, pricing_fingerprint(), NESTING_VERSION
+и версията на API-то. Същият ключ е и силният ETag на отговора, затова
+заявка с If-None-Match за текущия ключ получава 304 без никаква работа.
+
+Две нива:
+
+- локален LRU в процеса (ограничен по байтове);
+- по избор общ кеш през settings.REDIS_URL (redis-py), споделен между
+  worker-ите. URL 'memory://' използва LocalRedis – заместител в процеса със
+  същия интерфейс (get / set с ex), за тестове и разработка без Redis.
+
+Кешират се само успешните отговори, вече сериализирани до байтове.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from fastapi import Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../'))
+
+from cabinet_engine import ENGINE_VERSION
+from costing import pricing_fingerprint
+from nesting import NESTING_VERSION
+
+# Версиите влизат в ключа – нов двигател или нови цени не виждат старите записи
+CACHE_NAMESPACE = "calc:v1"
+
+
+def cache_versions() -> Dict[str, Any]:
+    return {
+        "engine": ENGINE_VERSION,
+        "pricing": pricing_fingerprint(),
+        "nesting": NESTING_VERSION,
+        "api": settings.VERSION,
+    }
+
+
+_VERSIONS_DIGEST = hashlib.sha256(json.dumps(cache_versions(), sort_keys=True).encode()).hexdigest()
+
+
+def request_key(kind: str, body: BaseModel) -> str:
+    """Каноничен ключ на заявка: вид + тяло + версии"""
+    canonical = json.dumps(body.model_dump(mode="json"), sort_keys=True, separators=(",", ":"),
+                           ensure_ascii=False)
+    digest = hashlib.sha256()
+    digest.update(_VERSIONS_DIGEST.encode())
+    digest.update(kind.encode())
+    digest.update(b"\0")
+    digest.update(canonical.encode())
+    return digest.hexdigest()
+
+
+def etag_for(key: str) -> str:
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Слаби валидатори (W/"...") също съвпадат при If-None-Match
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
+
+
+class LocalRedis:
+    """Минимален заместител на redis.Redis в процеса (get / set с ex / delete / flushdb)"""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ex: Optional[int] = None) -> bool:
+        with self._lock:
+            self._data[key] = (bytes(value), time.time() + ex if ex else None)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+def connect_shared(url: str):
+    """Клиент за общия кеш: LocalRedis за 'memory://', иначе redis-py"""
+    if url.startswith("memory://"):
+        return LocalRedis()
+    import redis  # незадължителна зависимост – нужна е само при включен общ кеш
+    return redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+
+class ResponseCache:
+    """Двустепенен кеш: LRU в процеса + незадължителен общ (Redis) кеш"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, shared=None, shared_ttl_s: int = 86400):
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.shared_ttl_s = shared_ttl_s
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.shared_errors = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+        if self.shared is not None:
+            try:
+                body = self.shared.get(f"{CACHE_NAMESPACE}:{key}")
+            except Exception:
+                # Общият кеш е оптимизация – при недостъпен Redis се смята наново
+                body = None
+                self.shared_errors += 1
+            if body is not None:
+                self._put_local(key, body)
+                with self._lock:
+                    self.shared_hits += 1
+                return body
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, body: bytes):
+        self._put_local(key, body)
+        if self.shared is not None:
+            try:
+                self.shared.set(f"{CACHE_NAMESPACE}:{key}", body, ex=self.shared_ttl_s)
+            except Exception:
+                self.shared_errors += 1
+
+    def _put_local(self, key: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "shared": self.shared is not None,
+                "shared_errors": self.shared_errors,
+                "hit_ratio": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+                "versions": cache_versions(),
+            }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Общият кеш на приложението (None при RESPONSE_CACHE_MAX_MB=0)"""
+    global _cache
+    if _cache is None and settings.RESPONSE_CACHE_MAX_MB > 0:
+        with _cache_lock:
+            if _cache is None:
+                shared = connect_shared(settings.REDIS_URL) if settings.RESPONSE_CACHE_SHARED else None
+                _cache = ResponseCache(settings.RESPONSE_CACHE_MAX_MB * 1024 * 1024, shared,
+                                       settings.RESPONSE_CACHE_TTL_S)
+    return _cache
+
+
+def _serialize(result) -> bytes:
+    return result if isinstance(result, bytes) else result.model_dump_json().encode()
+
+
+async def cached_response(request: Request, kind: str, body: BaseModel,
+                          compute: Callable[[], Awaitable[Union[BaseModel, bytes]]]) -> Response:
+    """
+    Отговор от кеша или от compute(). compute връща успешния отговор –
+    pydantic модел или готови JSON байтове (fast_json) – или вдига
+    HTTPException; грешките не се кешират.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return Response(content=_serialize(await compute()), media_type="application/json")
+
+    key = request_key(kind, body)
+    etag = etag_for(key)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    # Общият кеш е мрежова заявка – не в event loop-а
+    shared = cache.shared is not None
+    content = await asyncio.to_thread(cache.get, key) if shared else cache.get(key)
+    if content is not None:
+        headers["X-Cache"] = "HIT"
+    else:
+        content = _serialize(await compute())
+        if shared:
+            await asyncio.to_thread(cache.put, key, content)
+        else:
+            cache.put(key, content)
+        headers["X-Cache"] = "MISS"
+    return Response(content=content, media_type="application/json", headers=headers)
@@ -0,0 +1,97 @@
+"""
+Singleflight – обединяване на еднакви едновременни калкулации
+
+Когато няколко таба отворят една и съща оферта, заявките пристигат почти
+едновременно и всяка би пуснала целия двигател. SingleFlight пази по ключ
+(каноничния хеш на тялото) изчислението в ход: първата заявка („лидер“)
+смята, а останалите чакат и получават същия резултат или същото изключение.
+След края ключът се освобождава – това не е кеш (за него виж
+response_cache.py).
+
+do() е за синхронния код в пула с нишки, do_async() – за корутини в event
+loop-а (напр. изпращане към пула с процеси).
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Едно изчисление на ключ в даден момент; броячи за обединените заявки"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Задачите са вързани за event loop-а – ключът включва и него
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            task = self._async_calls.get(flight_key)
+            if task is None:
+                # Изчислението е отделна задача: отказът на лидера не я спира
+                # и чакащите след него пак получават резултата
+                task = self._async_calls[flight_key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda done: self._async_done(flight_key, done))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        # shield: отказана заявка (и лидерът) не отказва изчислението на другите
+        return await asyncio.shield(task)
+
+    def _async_done(self, flight_key: Tuple[int, str], task: asyncio.Future):
+        with self._lock:
+            del self._async_calls[flight_key]
+        if not task.cancelled():
+            # Изключението е „прочетено“ – без предупреждение, ако никой не чака
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._async_calls),
+            }
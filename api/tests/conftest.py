@@ -0,0 +1,71 @@
+"""
+Общи настройки на тестовете
+
+Настройките (app.core.config) се четат при първия import, затова базите
+се насочват към временна директория още тук – тестовете не пипат
+./furniture_calculator.db, ./jobs.db и кеша за разкрои.
+"""
+import os
+import sys
+import tempfile
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(API_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, API_DIR)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="furniture-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'projects.db')}"
+os.environ["JOBS_DB_PATH"] = os.path.join(_TMP_DIR, "jobs.db")
+os.environ["NESTING_CACHE_PATH"] = ""
+os.environ["RESPONSE_CACHE_SHARED"] = "false"
+
+import pytest
+
+from app.schemas.cabinet import CabinetRequest, ProjectRequest
+
+
+def make_cabinet_request(type: str = "base", width: int = 600, height: int = 720, depth: int = 560,
+                         **fields) -> CabinetRequest:
+    return CabinetRequest(type=type, width=width, height=height, depth=depth, **fields)
+
+
+def make_project_request(name: str = "Тестов проект", cabinets=None) -> ProjectRequest:
+    """По подразбиране: долен, горен, с чекмеджета и за мивка (цокъл 1800мм)"""
+    if cabinets is None:
+        cabinets = [
+            make_cabinet_request("base", 600, cabinet_id="base_1"),
+            make_cabinet_request("upper", 800, 720, 320, cabinet_id="upper_1"),
+            make_cabinet_request("drawer", 400, cabinet_id="drawer_1", number_of_drawers=3),
+            make_cabinet_request("sink", 800, cabinet_id="sink_1"),
+        ]
+    return ProjectRequest(project_name=name, cabinets=cabinets)
+
+
+@pytest.fixture(scope="session")
+def cabinet_request():
+    return make_cabinet_request
+
+
+@pytest.fixture(scope="session")
+def project_request():
+    return make_project_request
+
+
+@pytest.fixture(scope="session")
+def service():
+    from app.services.calculator import FurnitureCalculatorService
+    return FurnitureCalculatorService()
+
+
+@pytest.fixture(scope="session")
+def engine(service):
+    return service.engine
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,55 @@
+"""
+Бързият път (fast_json) връща същия JSON като pydantic моделите
+"""
+import json
+
+import pytest
+
+from app.schemas.cabinet import CabinetCalculationResponse, CabinetTypeEnum, ProjectCalculationResponse
+from app.services import fast_json
+
+
+@pytest.mark.parametrize("cabinet_type", [t.value for t in CabinetTypeEnum])
+def test_cabinet_json_matches_pydantic(service, cabinet_request, cabinet_type):
+    request = cabinet_request(cabinet_type, 600, 720 if cabinet_type != "column" else 2100,
+                              cabinet_id=f"{cabinet_type}_1", number_of_drawers=2)
+    fast = json.loads(service.calculate_single_cabinet_json(request))
+    slow = json.loads(service.calculate_single_cabinet(request).model_dump_json())
+    assert fast == slow
+    # И минава валидирането на схемата на отговора
+    CabinetCalculationResponse.model_validate(fast)
+
+
+def test_project_json_matches_pydantic(service, project_request):
+    request = project_request()
+    fast = json.loads(service.calculate_project_json(request))
+    slow = json.loads(service.calculate_project(request).model_dump_json())
+    assert fast == slow
+    ProjectCalculationResponse.model_validate(fast)
+
+
+def test_backends_produce_the_same_document(service, cabinet_request):
+    result = service.engine.calculate_cabinet(service._convert_request_to_cabinet(cabinet_request()))
+    document = fast_json.cabinet_dict(result)
+    expected = json.loads(fast_json.select_backend("json")[1](document))
+    for name in fast_json.BACKENDS:
+        try:
+            _, dumps = fast_json.select_backend(name)
+        except ValueError:
+            continue   # не е инсталиран
+        assert json.loads(dumps(document)) == expected, name
+
+
+def test_internal_error_keeps_the_error_envelope(service, cabinet_request, project_request, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("счупен калкулатор")
+
+    monkeypatch.setattr(service.engine, "calculate_cabinet", broken)
+    monkeypatch.setattr(service.engine, "calculate_project", broken)
+    for fast, slow in ((service.calculate_single_cabinet_json(cabinet_request()),
+                        service.calculate_single_cabinet(cabinet_request())),
+                       (service.calculate_project_json(project_request()),
+                        service.calculate_project(project_request()))):
+        document = json.loads(fast)
+        assert document == json.loads(slow.model_dump_json())
+        assert not document["success"] and document["error"] == "счупен калкулатор"
@@ -0,0 +1,196 @@
+"""
+Фонови задачи – преходите между статусите и наемите на собствениците
+"""
+import json
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import jobs
+from app.services.jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobStore, run_project_job
+
+LEASE_S = 30.0
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def job(store, project_request):
+    return store.create("project", project_request(), "owner-a", LEASE_S)
+
+
+def test_created_job_is_queued(job, project_request):
+    assert job["status"] == QUEUED
+    assert job["total"] == len(project_request().cabinets)
+    assert job["done"] == 0 and not job["cancel_requested"]
+
+
+def test_queued_running_done(store, job):
+    assert store.start(job["id"])
+    # Вече взета задача не се стартира втори път
+    assert not store.start(job["id"])
+    assert store.get(job["id"])["status"] == RUNNING
+
+    assert not store.progress(job["id"], 2, 4)
+    assert store.get(job["id"])["done"] == 2
+
+    store.finish(job["id"], '{"success": true}')
+    finished = store.get(job["id"])
+    assert finished["status"] == DONE
+    assert finished["done"] == finished["total"]
+    assert finished["finished_at"] is not None
+    assert store.result(job["id"]) == '{"success": true}'
+
+
+def test_fail_from_queued_and_running(store, project_request):
+    queued = store.create("project", project_request(), "owner-a", LEASE_S)
+    store.fail(queued["id"], "грешка")
+    assert store.get(queued["id"])["status"] == FAILED
+
+    running = store.create("project", project_request(), "owner-a", LEASE_S)
+    store.start(running["id"])
+    store.fail(running["id"], "грешка")
+    assert store.get(running["id"])["error"] == "грешка"
+
+
+def test_cancel_queued_is_immediate(store, job):
+    assert store.cancel(job["id"])["status"] == CANCELLED
+    assert not store.start(job["id"])
+
+
+def test_cancel_running_sets_flag(store, job):
+    store.start(job["id"])
+    cancelled = store.cancel(job["id"])
+    assert cancelled["status"] == RUNNING and cancelled["cancel_requested"]
+    # Работникът вижда флага при следващия прогрес
+    assert store.progress(job["id"], 1, 4)
+    store.mark_cancelled(job["id"])
+    assert store.get(job["id"])["status"] == CANCELLED
+
+
+def test_finished_jobs_do_not_change(store, job):
+    store.start(job["id"])
+    store.finish(job["id"], "{}")
+    store.cancel(job["id"])
+    store.fail(job["id"], "късно")
+    store.mark_cancelled(job["id"])
+    finished = store.get(job["id"])
+    assert finished["status"] == DONE and not finished["cancel_requested"] and finished["error"] is None
+
+
+# -------------------- НАЕМИ --------------------
+
+def test_live_owner_keeps_its_jobs(store, job):
+    store.start(job["id"])
+    assert store.claim_expired("owner-b", LEASE_S) == []
+    assert store.get(job["id"])["status"] == RUNNING
+
+
+def test_expired_lease_is_requeued_once(store, project_request):
+    running = store.create("project", project_request(), "owner-a", 0.01)
+    store.start(running["id"])
+    cancelled = store.create("project", project_request(), "owner-a", 0.01)
+    store.start(cancelled["id"])
+    store.cancel(cancelled["id"])
+    time.sleep(0.02)
+
+    assert store.claim_expired("owner-b", LEASE_S) == [running["id"]]
+    requeued = store.get(running["id"])
+    assert requeued["status"] == QUEUED and requeued["done"] == 0 and requeued["started_at"] is None
+    assert store.get(cancelled["id"])["status"] == CANCELLED
+    # Вече е на owner-b с нов наем
+    assert store.claim_expired("owner-c", LEASE_S) == []
+
+
+def test_renew_extends_only_own_jobs(store, project_request):
+    mine = store.create("project", project_request(), "owner-a", 0.01)
+    other = store.create("project", project_request(), "owner-b", 0.01)
+    time.sleep(0.02)
+    assert store.renew("owner-a", LEASE_S) == 1
+    assert store.claim_expired("owner-c", LEASE_S) == [other["id"]]
+    assert store.get(mine["id"])["status"] == QUEUED
+
+
+def test_old_database_gets_lease_columns(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+                 "project_name TEXT, total INTEGER NOT NULL DEFAULT 0, done INTEGER NOT NULL DEFAULT 0, "
+                 "cancel_requested INTEGER NOT NULL DEFAULT 0, request TEXT NOT NULL, result TEXT, "
+                 "error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)")
+    conn.execute("INSERT INTO jobs (id, kind, status, request, created_at) VALUES ('old', 'project', ?, '{}', 0)",
+                 (RUNNING,))
+    conn.commit()
+    conn.close()
+
+    store = JobStore(path)
+    # Задача без наем е от версия без наеми – собственикът ѝ отдавна го няма
+    assert store.claim_expired("owner-a", LEASE_S) == ["old"]
+    store.close()
+
+
+# -------------------- РАБОТНИКЪТ --------------------
+
+def test_worker_runs_job_to_done(store, job, monkeypatch):
+    monkeypatch.setattr(jobs, "_worker_store", store)
+    assert run_project_job(store.path, job["id"]) == DONE
+    result = json.loads(store.result(job["id"]))
+    assert result["success"] and result["total_cabinets"] == job["total"]
+    # Вече изпълнена задача не се пуска пак
+    assert run_project_job(store.path, job["id"]) == DONE
+
+
+def test_worker_stops_on_cancel(store, job, monkeypatch):
+    monkeypatch.setattr(jobs, "_worker_store", store)
+    monkeypatch.setattr(jobs, "PROGRESS_INTERVAL_S", 0.0)
+    original_progress = store.progress
+
+    def cancel_on_first_progress(job_id, done, total):
+        store.cancel(job_id)
+        return original_progress(job_id, done, total)
+
+    monkeypatch.setattr(store, "progress", cancel_on_first_progress)
+    assert run_project_job(store.path, job["id"]) == CANCELLED
+    assert store.get(job["id"])["status"] == CANCELLED
+
+
+# -------------------- СИНХРОННА ГРАНИЦА --------------------
+
+def _project(count: int) -> dict:
+    return {"project_name": "API тест",
+            "cabinets": [{"type": "base", "width": 400 + 10 * i, "height": 720, "depth": 560} for i in range(count)]}
+
+
+@pytest.fixture
+def small_sync_limit(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_SYNC_PROJECT_CABINETS", 3)
+
+
+def test_large_project_becomes_a_job(client, small_sync_limit):
+    for path, body in (("/api/v1/projects/calculate", _project(4)),
+                       ("/api/v1/projects/quick-calculate", _project(4)["cabinets"])):
+        response = client.post(path, json=body)
+        assert response.status_code == 202, path
+        job_id = response.json()["job_id"]
+        assert response.headers["Location"] == f"/api/v1/jobs/{job_id}"
+        assert client.get(f"/api/v1/jobs/{job_id}").status_code == 200
+
+
+def test_save_and_incremental_have_no_sync_limit(client, small_sync_limit):
+    saved = client.post("/api/v1/projects/save", json=_project(4))
+    assert saved.status_code == 200
+    client.delete(f"/api/v1/projects/{saved.json()['project_id']}")
+
+    opened = client.post("/api/v1/projects/incremental", json=_project(4))
+    assert opened.status_code == 200
+    project_id = opened.json()["project_id"]
+    patch = client.patch(f"/api/v1/projects/incremental/{project_id}", json={"add": _project(2)["cabinets"]})
+    assert patch.status_code == 200 and patch.json()["total_cabinets"] == 6
+    client.delete(f"/api/v1/projects/incremental/{project_id}")
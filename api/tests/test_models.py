@@ -0,0 +1,121 @@
+"""
+PanelTable (колонните панели) и copy-on-write копията от кеша
+"""
+import pickle
+
+import pytest
+
+from models import (
+    HardwareItem, MaterialType, Panel, PanelTable, decode_edge, encode_edge, pack_edges, unpack_edges
+)
+
+
+def _panels():
+    return [
+        Panel("Страница", 720, 560, MaterialType.BODY, edge_front=1.0, quantity=2, area_sqm=0.4032),
+        Panel("Врата", 716, 597, MaterialType.DOOR, 2.0, 2.0, 2.0, 2.0, area_sqm=0.427452),
+        Panel("Гръб", 716, 596, MaterialType.BACK),
+        Panel("Рафт", 564, 530, MaterialType.BODY, edge_front=0.4, edge_right=1.0, quantity=3),
+    ]
+
+
+# -------------------- КОДИРАНЕ НА КАНТОВЕТЕ --------------------
+
+@pytest.mark.parametrize("thickness", [None, 0.4, 0.45, 1.0, 2.0, 3.5, 12.25])
+def test_edge_roundtrip_is_exact(thickness):
+    assert decode_edge(encode_edge(thickness)) == thickness
+
+
+def test_pack_edges_keeps_sides_apart():
+    codes = unpack_edges(pack_edges(0.45, 1.0, 2.0, None))
+    assert [decode_edge(code) for code in codes] == [0.45, 1.0, 2.0, None]
+
+
+def test_panel_keeps_exact_edges_and_large_sizes():
+    panel = Panel("Плот", 40_000, 3_000_000_000, MaterialType.BODY, 0.45, 4.5, None, 1.0, quantity=5_000_000_000)
+    table = PanelTable.from_panels([panel])
+    assert table.panel(0) == panel
+
+
+# -------------------- PANELTABLE --------------------
+
+def test_panel_table_roundtrip():
+    panels = _panels()
+    table = PanelTable.from_panels(panels)
+    assert len(table) == len(panels)
+    assert [table.panel(i) for i in range(len(table))] == panels
+    assert list(table.names()) == [panel.name for panel in panels]
+
+
+def test_panel_table_pickle_carries_names():
+    table = PanelTable.from_panels(_panels())
+    restored = pickle.loads(pickle.dumps(table))
+    assert restored == table
+    # Кодовете на имената са локални за процеса – в състоянието са само използваните
+    state = table.__getstate__()
+    assert sorted(state["names"]) == sorted({panel.name for panel in _panels()})
+    assert max(state["name"]) == len(state["names"]) - 1
+    # Дебелините на кант – само използваните, с локални кодове
+    assert sorted(state["edge_thicknesses"][1:]) == [0.4, 1.0, 2.0]
+
+
+def test_panel_table_edit_and_remove_where():
+    table = PanelTable.from_panels(_panels())
+    table.set_panel(2, Panel("Гръб", 700, 500, MaterialType.BACK))
+    table.insert_panel(0, Panel("Дъно", 564, 560, MaterialType.BODY, edge_front=1.0))
+    table.delete(1)
+    assert list(table.names()) == ["Дъно", "Врата", "Гръб", "Рафт"]
+    assert table.panel(2).width_mm == 700
+
+    assert table.remove_where(lambda name: name.startswith("Р")) == 1
+    assert table.remove_where(lambda name: False) == 0
+    assert list(table.names()) == ["Дъно", "Врата", "Гръб"]
+    assert all(len(getattr(table, column)) == 3 for column in PanelTable.COLUMNS)
+
+
+def test_panel_table_copy_is_independent():
+    table = PanelTable.from_panels(_panels())
+    copy = table.copy()
+    copy.delete(0)
+    assert len(table) == 4 and len(copy) == 3
+
+
+# -------------------- COPY-ON-WRITE ОТ КЕША --------------------
+
+def test_cached_results_share_panels_until_written(service, engine, cabinet_request):
+    cabinet = service._convert_request_to_cabinet(cabinet_request(width=612))
+    first = engine.calculate_cabinet(cabinet)
+    second = engine.calculate_cabinet(cabinet)
+    assert first.panel_table is second.panel_table
+
+    panels_before = list(second.panels)
+    first.panels.append(Panel("Допълнителен", 100, 100, MaterialType.BODY))
+    assert first.panel_table is not second.panel_table
+    assert list(second.panels) == panels_before
+    # Кешираният резултат също не е променен
+    assert list(engine.calculate_cabinet(cabinet).panels) == panels_before
+
+
+def test_cached_results_do_not_share_hardware_or_dicts(service, engine, cabinet_request):
+    cabinet = service._convert_request_to_cabinet(cabinet_request(width=614))
+    first = engine.calculate_cabinet(cabinet)
+    second = engine.calculate_cabinet(cabinet)
+    assert first.hardware and first.hardware[0] is not second.hardware[0]
+
+    quantity = second.hardware[0].quantity
+    first.hardware[0].quantity += 100
+    first.add_hardware(HardwareItem("Допълнителен", 1))
+    first.used_boards["нов"] = 1
+    assert second.hardware[0].quantity == quantity
+    assert "Допълнителен" not in [item.name for item in second.hardware]
+    assert "нов" not in second.used_boards
+    assert engine.calculate_cabinet(cabinet).hardware[0].quantity == quantity
+
+
+def test_remove_panels_copies_shared_table(service, engine, cabinet_request):
+    cabinet = service._convert_request_to_cabinet(cabinet_request(width=616))
+    first = engine.calculate_cabinet(cabinet)
+    second = engine.calculate_cabinet(cabinet)
+    removed = first.remove_panels(lambda name: True)
+    assert removed == len(second.panels) > 0
+    assert len(first.panels) == 0
@@ -0,0 +1,182 @@
+"""
+Геометрията на разкроя: детайлите са в полезната площ на листа, не се
+застъпват и между тях остава поне дебелината на диска
+"""
+import random
+import weakref
+from itertools import combinations
+
+import pytest
+
+from app.schemas.cabinet import ProjectDeltaRequest
+from costing import BOARD_NAMES
+from models import MaterialType
+from nesting import (DEFAULT_SETTINGS, DEFAULT_SHEETS, NestingPart, NestingSettings, ProjectNesting, SheetSpec,
+                     nest_parts, nest_project)
+
+SHEET = SheetSpec(MaterialType.BODY, 18, 2800, 2070, "ПДЧ 18мм")
+
+
+def _random_parts(count: int, seed: int, grain: str = "any"):
+    rng = random.Random(seed)
+    return [NestingPart(f"Детайл {i}", rng.randint(50, 1200), rng.randint(50, 900), grain)
+            for i in range(count)]
+
+
+def _assert_valid(layout, settings: NestingSettings):
+    spec, kerf, trim = layout.spec, settings.kerf_mm, settings.trim_mm
+    placed = []
+    for sheet in layout.sheets:
+        assert sheet.placements
+        for p in sheet.placements:
+            part = layout.parts[p.part]
+            expected = (part.height, part.width) if p.rotated else (part.width, part.height)
+            assert (p.width, p.height) == expected
+            if part.grain != "any":
+                assert p.rotated == (part.grain == "vertical")
+            # В полезната площ (без почистването по ръбовете)
+            assert p.x >= trim and p.y >= trim
+            assert p.x + p.width <= spec.width_mm - trim
+            assert p.y + p.height <= spec.height_mm - trim
+        # Без застъпване – с дебелината на диска между детайлите
+        for a, b in combinations(sheet.placements, 2):
+            apart = (a.x + a.width + kerf <= b.x or b.x + b.width + kerf <= a.x or
+                     a.y + a.height + kerf <= b.y or b.y + b.height + kerf <= a.y)
+            assert apart, (a, b)
+        assert sheet.used_area == sum(p.width * p.height for p in sheet.placements)
+        placed += [p.part for p in sheet.placements]
+    return placed
+
+
+@pytest.mark.parametrize("heuristic", ["BAF", "BSSF", "BLSF"])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_random_parts_are_placed_once_without_overlap(heuristic, seed):
+    settings = NestingSettings(heuristic=heuristic)
+    parts = _random_parts(120, seed)
+    layout = nest_parts(parts, SHEET, settings)
+    placed = _assert_valid(layout, settings)
+    assert sorted(placed) == list(range(len(parts)))
+    assert not layout.unplaced
+    assert 0 < layout.utilization <= 1
+
+
+@pytest.mark.parametrize("kerf", [0, 4, 8])
+def test_kerf_is_respected(kerf):
+    settings = NestingSettings(kerf_mm=kerf)
+    layout = nest_parts(_random_parts(60, 7), SHEET, settings)
+    _assert_valid(layout, settings)
+
+
+def test_exact_fit_uses_whole_usable_area():
+    # Два детайла по половин полезна ширина (с диска между тях) – на един лист
+    settings = NestingSettings(kerf_mm=4, trim_mm=10)
+    usable_w = SHEET.width_mm - 2 * settings.trim_mm
+    usable_h = SHEET.height_mm - 2 * settings.trim_mm
+    half = (usable_w - settings.kerf_mm) // 2
+    parts = [NestingPart("A", half, usable_h), NestingPart("B", half, usable_h)]
+    layout = nest_parts(parts, SHEET, settings)
+    assert layout.sheet_count == 1
+    _assert_valid(layout, settings)
+
+
+def test_grain_parts_are_not_rotated_freely():
+    settings = NestingSettings()
+    parts = _random_parts(40, 11, "horizontal") + _random_parts(40, 12, "vertical")
+    layout = nest_parts(parts, SHEET, settings)
+    _assert_valid(layout, settings)
+
+
+def test_grain_part_is_never_placed_against_the_grain():
+    # Побира се само незавъртян, а шарката изисква завъртане – не се нарежда
+    settings = NestingSettings()
+    parts = [NestingPart("Страница", 2500, 600, "vertical"), NestingPart("Рафт", 2500, 600, "horizontal")]
+    layout = nest_parts(parts, SHEET, settings)
+    placed = _assert_valid(layout, settings)
+    assert layout.unplaced == [0] and placed == [1]
+
+
+def test_oversize_grain_part_is_split_across_the_grain():
+    settings = NestingSettings()
+    layout = nest_parts([NestingPart("Колона", 600, 4000, "vertical")], SHEET, settings)
+    placed = _assert_valid(layout, settings)
+    pieces = layout.parts[1:]
+    assert sorted(placed) == list(range(1, len(layout.parts))) and not layout.unplaced
+    assert all(piece.width == 600 for piece in pieces) and sum(piece.height for piece in pieces) == 4000
+
+
+def test_oversize_part_is_split_into_pieces():
+    settings = NestingSettings()
+    parts = [NestingPart("Плот", 4000, 600)]
+    layout = nest_parts(parts, SHEET, settings)
+    placed = _assert_valid(layout, settings)
+    assert 0 not in placed and not layout.unplaced
+    pieces = layout.parts[1:]
+    assert pieces and all(piece.source == 0 for piece in pieces)
+    assert sum(piece.width for piece in pieces) >= 4000
+
+
+def test_project_nesting_covers_every_panel(service, engine, project_request):
+    results = [engine.calculate_cabinet(service._convert_request_to_cabinet(cab))
+               for cab in project_request().cabinets]
+    nesting = nest_project(results)
+    panels = sum(quantity for result in results for quantity, width, height in zip(
+        result.panel_table.quantity, result.panel_table.width_mm, result.panel_table.height_mm)
+        if width > 0 and height > 0)
+    assert sum(len(layout.parts) for layout in nesting.layouts) == panels
+    for layout in nesting.layouts:
+        _assert_valid(layout, NestingSettings())
+    assert sum(nesting.used_boards().values()) == sum(layout.sheet_count for layout in nesting.layouts)
+
+
+# -------------------- ПРОЕКТ --------------------
+
+def _results(service, engine, project_request):
+    return [engine.calculate_cabinet(service._convert_request_to_cabinet(cab))
+            for cab in project_request().cabinets]
+
+
+def test_nested_boards_use_the_per_cabinet_keys(service, engine, project_request):
+    # Един ключ за материал, независимо от дебелината на листа (гърбът е 3мм)
+    layouts = [nest_parts([NestingPart("Детайл", 500, 700)], DEFAULT_SHEETS[material])
+               for material in MaterialType]
+    assert ProjectNesting(layouts).used_boards() == {BOARD_NAMES[material]: 1 for material in MaterialType}
+
+    results = _results(service, engine, project_request)
+    per_cabinet = {name for result in results for name in result.used_boards}
+    project = engine.calculate_project([result.cabinet for result in results])
+    assert set(project["totals"]["used_boards"]) == per_cabinet
+
+
+def test_iter_project_does_not_keep_results_by_default(service, engine, project_request):
+    cabinets = [service._convert_request_to_cabinet(cab) for cab in project_request().cabinets]
+    refs = []
+    for event in engine.iter_project(iter(cabinets)):
+        if event["event"] == "cabinet":
+            refs.append(weakref.ref(event["result"]))
+        summary = event
+        del event
+    assert all(ref() is None for ref in refs)
+    assert "nesting" not in summary["totals"]
+
+    nested = list(engine.iter_project(cabinets, DEFAULT_SETTINGS))[-1]["totals"]
+    expected = engine.calculate_project(cabinets)["totals"]
+    assert nested["used_boards"] == expected["used_boards"]
+    assert nested["total_cost_bgn"] == pytest.approx(expected["total_cost_bgn"])
+
+
+def test_incremental_patch_does_not_nest(service, project_request, cabinet_request, monkeypatch):
+    opened = service.open_incremental_project(project_request())
+    calls = []
+    original = service.engine.nest_totals
+    monkeypatch.setattr(service.engine, "nest_totals", lambda *args, **kwargs: calls.append(1) or original(*args, **kwargs))
+
+    patched = service.update_incremental_project(opened.project_id, ProjectDeltaRequest(add=[cabinet_request()]))
+    assert not calls and "nesting" not in patched.totals
+    _, project = service.incremental_projects[opened.project_id]
+    assert patched.project_total_cost == pytest.approx(project.totals.total_cost_bgn)
+
+    # Разкроят е при GET – веднъж, до следващата промяна
+    fetched = service.get_incremental_project(opened.project_id)
+    service.get_incremental_project(opened.project_id)
+    assert len(calls) == 1 and "nesting" in fetched.totals
+    service.close_incremental_project(opened.project_id)
@@ -0,0 +1,72 @@
+"""
+ProjectStore – пагинация с cursor по всички сортирания
+"""
+import pytest
+
+from app.services.project_store import ProjectStore
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory, service, cabinet_request, project_request):
+    store = ProjectStore(str(tmp_path_factory.mktemp("store") / "projects.db"))
+    for i in range(23):
+        # Повтарящи се имена и цени – подредбата трябва да е стабилна и при равни стойности
+        cabinets = [cabinet_request("base", 400 + 100 * (i % 4)) for _ in range(1 + i % 3)]
+        project = service.calculate_project(project_request(f"Проект {i % 5}", cabinets))
+        store.save(f"id-{i:02d}", project)
+    yield store
+    store.close()
+
+
+def _all_pages(store, limit, **filters):
+    ids, cursor, pages = [], None, 0
+    while True:
+        page = store.list(limit, cursor, **filters)
+        ids += [project["project_id"] for project in page["projects"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids, pages
+        assert pages < 100
+
+
+@pytest.mark.parametrize("sort", ["created_at", "cost", "name", "cabinets"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_cover_every_project_once(store, sort, order):
+    full = [project["project_id"] for project in store.list(500, sort=sort, order=order)["projects"]]
+    assert len(full) == 23
+    for limit in (1, 4, 23):
+        ids, pages = _all_pages(store, limit, sort=sort, order=order)
+        assert ids == full
+        # Редът след страницата се чете предварително – няма празна последна страница
+        assert pages == -(-23 // limit)
+
+
+def test_filters_apply_on_every_page(store):
+    ids, _ = _all_pages(store, 2, sort="cost", order="asc", name_prefix="Проект 1")
+    assert ids == [project["project_id"] for project in store.list(500, sort="cost", order="asc",
+                                                           name_prefix="Проект 1")["projects"]]
+    assert ids and all(int(project_id[3:]) % 5 == 1 for project_id in ids)
+
+
+def test_cursor_from_other_sort_is_rejected(store):
+    cursor = store.list(2, sort="cost", order="asc")["next_cursor"]
+    with pytest.raises(ValueError):
+        store.list(2, cursor, sort="name", order="asc")
+    with pytest.raises(ValueError):
+        store.list(2, "не-е-cursor")
+
+
+def test_invalid_sort_is_rejected(store):
+    with pytest.raises(ValueError):
+        store.list(sort="total")
+    with pytest.raises(ValueError):
+        store.list(order="up")
+
+
+def test_created_at_index_has_the_tie_breaker(tmp_path):
+    store = ProjectStore(str(tmp_path / "fresh.db"))
+    with store._pool.connection() as conn:
+        columns = [row[2] for row in conn.execute("PRAGMA index_info(ix_projects_created_at)")]
+    store.close()
+    assert columns == ["created_at", "id"]
@@ -0,0 +1,69 @@
+"""
+ProjectTotals – добавяне и изваждане на шкафове
+"""
+import pytest
+
+from project_totals import ProjectTotals
+
+
+def _results(service, engine, project_request):
+    return [engine.calculate_cabinet(service._convert_request_to_cabinet(cab))
+            for cab in project_request().cabinets]
+
+
+def _assert_same(actual: dict, expected: dict):
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, dict):
+            assert actual[key].keys() == value.keys(), key
+            for name, amount in value.items():
+                assert actual[key][name] == pytest.approx(amount), (key, name)
+        else:
+            assert actual[key] == pytest.approx(value), key
+
+
+def test_remove_matches_full_recalculation(service, engine, project_request):
+    results = _results(service, engine, project_request)
+    totals = ProjectTotals()
+    for result in results:
+        totals.add(result)
+    totals.remove(results[1])
+
+    expected = ProjectTotals()
+    for result in results[:1] + results[2:]:
+        expected.add(result)
+    _assert_same(totals.snapshot(), expected.snapshot())
+
+
+def test_remove_all_leaves_empty_totals(service, engine, project_request):
+    results = _results(service, engine, project_request)
+    totals = ProjectTotals()
+    for result in results:
+        totals.add(result)
+    for result in reversed(results):
+        totals.remove(result)
+
+    snapshot = totals.snapshot()
+    assert snapshot["cabinet_count"] == 0
+    for section in ("hardware", "used_boards", "used_edges_m", "material_area"):
+        assert snapshot[section] == {}, section
+    assert snapshot["total_cost_bgn"] == pytest.approx(0.0, abs=1e-9)
+    assert snapshot["board_cost_bgn"] == pytest.approx(0.0, abs=1e-9)
+    assert snapshot["plinth_length"] == 0
+
+
+def test_board_cost_is_part_of_total(service, engine, project_request):
+    totals = ProjectTotals()
+    for result in _results(service, engine, project_request):
+        totals.add(result)
+    assert 0 < totals.board_cost_bgn < totals.total_cost_bgn
+
+
+def test_plinth_only_from_floor_cabinets(service, engine, project_request):
+    results = _results(service, engine, project_request)
+    totals = ProjectTotals()
+    for result in results:
+        totals.add(result)
+    # Горният шкаф (800) не е в цокъла
+    assert totals.plinth_length == 600 + 400 + 800
+    assert totals.plinth_panel().width_mm == 1800
@@ -0,0 +1,54 @@
+"""
+Кешът за отговори – ETag и 304 при If-None-Match
+"""
+import pytest
+
+from app.services.response_cache import etag_matches
+
+
+def _cabinet(width: int = 600) -> dict:
+    return {"type": "base", "width": width, "height": 720, "depth": 560}
+
+
+def _project(count: int) -> dict:
+    return {"project_name": "API тест", "cabinets": [_cabinet(400 + 10 * i) for i in range(count)]}
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/api/v1/cabinets/calculate", _cabinet(731)),
+    ("/api/v1/projects/calculate", _project(3)),
+])
+def test_etag_and_not_modified(client, path, body):
+    first = client.post(path, json=body)
+    assert first.status_code == 200 and first.headers["X-Cache"] == "MISS"
+    etag = first.headers["ETag"]
+
+    second = client.post(path, json=body)
+    assert second.headers["X-Cache"] == "HIT" and second.headers["ETag"] == etag
+    assert second.content == first.content
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        not_modified = client.post(path, json=body, headers={"If-None-Match": header})
+        assert not_modified.status_code == 304, header
+        assert not_modified.content == b"" and not_modified.headers["ETag"] == etag
+
+    stale = client.post(path, json=body, headers={"If-None-Match": '"other"'})
+    assert stale.status_code == 200 and stale.content == first.content
+
+
+def test_etag_depends_on_the_body(client):
+    first = client.post("/api/v1/cabinets/calculate", json=_cabinet(733)).headers["ETag"]
+    second = client.post("/api/v1/cabinets/calculate", json=_cabinet(734)).headers["ETag"]
+    assert first != second
+
+
+def test_errors_are_not_cached(client):
+    body = {"type": "base", "width": 600, "height": 720, "depth": 560, "has_back": "не"}
+    assert client.post("/api/v1/cabinets/calculate", json=body).status_code == 422
+    assert "ETag" not in client.post("/api/v1/cabinets/calculate", json=body).headers
+
+
+def test_etag_matches():
+    assert not etag_matches(None, '"a"')
+    assert not etag_matches('"b"', '"a"')
+    assert etag_matches(' W/"a" ', '"a"')
@@ -0,0 +1,140 @@
+"""
+SingleFlight – еднаквите едновременни изчисления се правят веднъж
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+
+def _run_concurrently(flight, key, fn, count):
+    results, errors = [], []
+    barrier = threading.Barrier(count)
+
+    def call():
+        barrier.wait()
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return object()
+
+    results, errors = _run_concurrently(flight, "k", compute, 8)
+    assert not errors and len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"leaders": 1, "coalesced": 7, "in_flight": 0}
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight()
+
+    def compute():
+        time.sleep(0.2)
+        raise ValueError("невалиден шкаф")
+
+    results, errors = _run_concurrently(flight, "k", compute, 4)
+    assert not results and len(errors) == 4
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_key_is_released_after_the_call():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == 1
+    assert flight.do("k", lambda: 2) == 2
+    assert flight.stats()["leaders"] == 2
+
+
+def test_async_calls_share_one_computation():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "готово"
+
+    async def main():
+        return await asyncio.gather(*[flight.do_async("k", compute) for _ in range(5)])
+
+    assert asyncio.run(main()) == ["готово"] * 5
+    assert len(calls) == 1
+
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async("k", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do_async("k", compute))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == 42
+
+
+def test_cancelled_leader_does_not_fail_the_followers():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return 42
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async("k", compute))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flight.do_async("k", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        results = await asyncio.gather(*followers)
+        return results, flight.stats()["in_flight"]
+
+    assert asyncio.run(main()) == ([42, 42, 42], 0)
+    assert len(calls) == 1
+
+
+def test_async_exception_is_shared_and_key_released():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("невалиден шкаф")
+
+    async def main():
+        results = await asyncio.gather(*[flight.do_async("k", compute) for _ in range(3)],
+                                       return_exceptions=True)
+        return results, await flight.do_async("k", lambda: asyncio.sleep(0, "отново"))
+
+    results, again = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert again == "отново"
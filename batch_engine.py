@@ -0,0 +1,572 @@
+"""
+Векторизиран (NumPy) двигател за пакетна калкулация на шкафове
+
+Всеки калкулатор от cabinet_types/ е описан като поредица от "слотове" –
+по един за всеки панел/хардуер, който скаларният код добавя. Всеки слот е
+масивен израз върху групата шкафове от един CabinetType, а маската на
+слота отговаря на if-условието в скаларния код. Редът на слотовете е
+редът на add_panel/add_hardware, затова резултатът (включително
+сумирането на площи и кант) е идентичен със скаларния път.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from models import *
+from costing import (
+    CostCoefficients, BASE_COSTS, UPPER_COSTS, DRAWER_COSTS, OVEN_COSTS, BOARD_NAMES,
+    STANDARD_SHEET_AREA, SHEET_RESERVE, EDGE_PRICE_PER_M, LABOR_RATES,
+    HARDWARE_TIME_PER_ITEM, EDGE_TIME_PER_M, edge_name,
+)
+
+
+# -------------------- КОДОВЕ --------------------
+
+CABINET_TYPES: Tuple[CabinetType, ...] = tuple(CabinetType)
+CABINET_TYPE_CODES: Dict[CabinetType, int] = {t: i for i, t in enumerate(CABINET_TYPES)}
+
+# Кантовете се пазят като float; 0.0 означава "без кант" (както None в Panel)
+EDGE_THICKNESSES: Tuple[float, ...] = (1.0, 2.0)
+
+
+# -------------------- ВХОД --------------------
+
+@dataclass
+class CabinetBatch:
+    """
+    Колонен пакет от шкафове. Всички колони са NumPy масиви с еднаква дължина.
+
+    type може да бъде масив от кодове (CABINET_TYPE_CODES), от CabinetType или
+    от низове ("base", "upper", ...). door_count == 0 означава "автоматично",
+    точно както door_count=None в Cabinet.
+    """
+    type: np.ndarray
+    width: np.ndarray
+    height: np.ndarray
+    depth: np.ndarray
+    shelf_count: Optional[np.ndarray] = None
+    door_count: Optional[np.ndarray] = None
+    drawer_count: Optional[np.ndarray] = None
+    has_back: Optional[np.ndarray] = None          # има гръб И има материал за гръб
+    has_door_board: Optional[np.ndarray] = None    # има материал за врати
+    has_closing_panel: Optional[np.ndarray] = None
+
+    def __post_init__(self):
+        self.type = _coerce_type_codes(self.type)
+        n = len(self.type)
+        self.width = np.asarray(self.width, dtype=np.float64)
+        self.height = np.asarray(self.height, dtype=np.float64)
+        self.depth = np.asarray(self.depth, dtype=np.float64)
+        self.shelf_count = _column(self.shelf_count, n, 0, np.int64)
+        self.door_count = _column(self.door_count, n, 0, np.int64)
+        self.drawer_count = _column(self.drawer_count, n, 0, np.int64)
+        self.has_back = _column(self.has_back, n, True, np.bool_)
+        self.has_door_board = _column(self.has_door_board, n, True, np.bool_)
+        self.has_closing_panel = _column(self.has_closing_panel, n, False, np.bool_)
+
+        for name in ("width", "height", "depth"):
+            if len(getattr(self, name)) != n:
+                raise ValueError(f"Колоната {name} има различна дължина от type")
+
+    def __len__(self) -> int:
+        return len(self.type)
+
+    @classmethod
+    def from_cabinets(cls, cabinets: Sequence[Cabinet]) -> "CabinetBatch":
+        """Създава пакет от списък с Cabinet обекти"""
+        return cls(
+            type=np.fromiter((CABINET_TYPE_CODES[c.type] for c in cabinets), dtype=np.int8, count=len(cabinets)),
+            width=[c.width for c in cabinets],
+            height=[c.height for c in cabinets],
+            depth=[c.depth for c in cabinets],
+            shelf_count=[c.shelf_count for c in cabinets],
+            door_count=[c.door_count or 0 for c in cabinets],
+            drawer_count=[c.drawer_count for c in cabinets],
+            has_back=[bool(c.has_back and c.back_board) for c in cabinets],
+            has_door_board=[bool(c.door_board) for c in cabinets],
+            has_closing_panel=[bool(getattr(c, 'has_closing_panel', False)) for c in cabinets],
+        )
+
+
+def _coerce_type_codes(values) -> np.ndarray:
+    arr = np.asarray(values)
+    if arr.dtype.kind in "iu":
+        return arr.astype(np.int8)
+    codes = []
+    for value in arr.tolist():
+        if not isinstance(value, CabinetType):
+            value = CabinetType(value)
+        codes.append(CABINET_TYPE_CODES[value])
+    return np.asarray(codes, dtype=np.int8)
+
+
+def _column(values, n: int, default, dtype) -> np.ndarray:
+    if values is None:
+        return np.full(n, default, dtype=dtype)
+    arr = np.asarray(values, dtype=dtype)
+    if len(arr) != n:
+        raise ValueError("Колоните на пакета трябва да имат еднаква дължина")
+    return arr
+
+
+# -------------------- ПРАВИЛА --------------------
+
+@dataclass
+class _PanelSlot:
+    name: str
+    width: np.ndarray
+    height: np.ndarray
+    material: MaterialType
+    quantity: np.ndarray
+    edges: Tuple[float, float, float, float] = (0.0, 0.0, 0.0, 0.0)  # front, back, left, right
+    mask: Optional[np.ndarray] = None
+
+
+@dataclass
+class _HardwareSlot:
+    name: str
+    quantity: np.ndarray
+    notes: Optional[str] = None
+    mask: Optional[np.ndarray] = None
+
+
+@dataclass
+class _GroupRules:
+    panels: List[_PanelSlot]
+    hardware: List[_HardwareSlot]
+    costs: CostCoefficients
+    # Някои калкулатори (мивка, хладилник) смятат цената върху резултата
+    # от BaseCabinetCalculator и след това променят панелите
+    cost_panels: Optional[List[_PanelSlot]] = None
+    cost_hardware: Optional[List[_HardwareSlot]] = None
+    plinth: bool = True
+
+
+def _full(g: Dict[str, np.ndarray], value) -> np.ndarray:
+    return np.full(len(g["width"]), value)
+
+
+def _base_rules(g: Dict[str, np.ndarray]) -> _GroupRules:
+    """BaseCabinetCalculator.calculate"""
+    t, gap = 18, 3
+    w, h, d = g["width"], g["height"], g["depth"]
+    bottom_width = w - 2 * t
+    door_count = np.where(g["door_count"] > 0, g["door_count"], np.where(w > 600, 2, 1))
+    single = door_count == 1
+    has_shelves = g["shelf_count"] > 0
+
+    panels = [
+        _PanelSlot("Страничен панел", h, d, MaterialType.BODY, _full(g, 2), (1.0, 0.0, 1.0, 0.0)),
+        _PanelSlot("Дъно", bottom_width, d, MaterialType.BODY, _full(g, 1), (1.0, 0.0, 0.0, 0.0)),
+        _PanelSlot("Стабилизатор", bottom_width, _full(g, 100.0), MaterialType.BODY,
+                   np.where(w > 600, 3, 2), (1.0, 0.0, 0.0, 0.0)),
+        _PanelSlot("Рафт", bottom_width - 1, d - 30, MaterialType.BODY, g["shelf_count"],
+                   (1.0, 0.0, 0.0, 0.0), has_shelves),
+        _PanelSlot("Гръб", w - 20, h - 20, MaterialType.BACK, _full(g, 1), mask=g["has_back"]),
+        _PanelSlot("Врата", np.where(single, w - gap, (w / 2) - (gap / 2)), h - gap, MaterialType.DOOR,
+                   np.where(single, 1, 2), (2.0, 2.0, 2.0, 2.0)),
+    ]
+
+    leg_count = np.where(w <= 600, 4, np.where(w <= 1000, 6, 8))
+    hardware = [
+        _HardwareSlot("Краче за долен шкаф", leg_count, "100мм"),
+        _HardwareSlot("Щипка за краче", leg_count // 2),
+        _HardwareSlot("Панта", door_count * np.where(h > 600, 3, 2)),
+        _HardwareSlot("Рафтодържател", g["shelf_count"] * 4, mask=has_shelves),
+    ]
+    return _GroupRules(panels, hardware, BASE_COSTS)
+
+
+def _sink_rules(g: Dict[str, np.ndarray]) -> _GroupRules:
+    """SinkCabinetCalculator.calculate – винаги 3 стабилизатора"""
+    base = _base_rules(g)
+    panels = [p for p in base.panels if "Стабилизатор" not in p.name]
+    panels.append(_PanelSlot("Стабилизатор (мивка)", g["width"] - 2 * 18, _full(g, 100.0), MaterialType.BODY,
+                             _full(g, 3), (1.0, 0.0, 0.0, 0.0)))
+    return _GroupRules(panels, base.hardware, base.costs, base.panels, base.hardware)
+
+
+def _fridge_column_rules(g: Dict[str, np.ndarray]) -> _GroupRules:
+    """ApplianceCabinetCalculator._calculate_fridge_column"""
+    base = _base_rules(g)
+    gap = 3
+    w, h = g["width"], g["height"]
+    bottom = next(p for p in base.panels if p.name == "Дъно")
+
+    panels = [p for p in base.panels if "Стабилизатор" not in p.name and "Врата" not in p.name]
+    panels += [
+        _PanelSlot("Капак (хладилник/колона)", np.rint(bottom.width), bottom.height, MaterialType.BODY,
+                   _full(g, 1), (1.0, 0.0, 0.0, 0.0)),
+        _PanelSlot("Врата 1 (мала)", np.trunc((w // 2) - gap - 50), np.trunc(h - gap), MaterialType.DOOR,
+                   _full(g, 1), (2.0, 0.0, 0.0, 0.0)),
+        _PanelSlot("Врата 2 (голяма)", np.trunc((w // 2) - gap + 50), np.trunc(h - gap), MaterialType.DOOR,
+                   _full(g, 1), (2.0, 0.0, 0.0, 0.0)),
+    ]
+    hardware = [hw for hw in base.hardware if "Панта" not in hw.name]
+    hardware += [
+        _HardwareSlot("Панта за мала врата", _full(g, 2)),
+        _HardwareSlot("Панта за голяма врата", _full(g, 4)),
+        _HardwareSlot("Панта за висок шкаф", _full(g, 6)),
+    ]
+    return _GroupRules(panels, hardware, base.costs, base.panels, base.hardware)
+
+
+def _upper_rules(g: Dict[str, np.ndarray]) -> _GroupRules:
+    """UpperCabinetCalculator.calculate"""
+    t, gap = 18, 3
+    w, h, d = g["width"], g["height"], g["depth"]
+    top_width = w - 2 * t
+    door_count = np.where(g["door_count"] > 0, g["door_count"], np.where(w <= 500, 1, 2))
+    single = door_count == 1
+    has_shelves = g["shelf_count"] > 0
+
+    panels = [
+        _PanelSlot("Страничен панел", h, d, MaterialType.BODY, _full(g, 2), (1.0, 0.0, 1.0, 0.0)),
+        _PanelSlot("Пола", top_width, d, MaterialType.BODY, _full(g, 1), (1.0, 0.0, 0.0, 0.0)),
+        _PanelSlot("Рафт", top_width - 1, d - 30, MaterialType.BODY, g["shelf_count"],
+                   (1.0, 0.0, 0.0, 0.0), has_shelves),
+        _PanelSlot("Гръб", w - 20, h - 20, MaterialType.BACK, _full(g, 1), mask=g["has_back"]),
+        _PanelSlot("Врата", np.where(single, w - gap, (w / 2) - (gap / 2)), h - gap, MaterialType.DOOR,
+                   np.where(single, 1, 2), (2.0, 2.0, 2.0, 2.0)),
+        _PanelSlot("Затварящ панел", _full(g, 18.0), h - 10, MaterialType.BODY, _full(g, 1),
+                   (1.0, 0.0, 0.0, 1.0), g["has_closing_panel"]),
+    ]
+    hardware = [
+        _HardwareSlot("Панта", door_count * np.where(h > 700, 3, 2)),
+        _HardwareSlot("Рафтодържател", g["shelf_count"] * 4, mask=has_shelves),
+        _HardwareSlot("Закачалка за горен шкаф", np.where(w <= 600, 2, 3)),
+    ]
+    return _GroupRules(panels, hardware, UPPER_COSTS, plinth=False)
+
+
+def _drawer_rules(g: Dict[str, np.ndarray]) -> _GroupRules:
+    """DrawerCabinetCalculator.calculate"""
+    t = 18
+    w, h, d = g["width"], g["height"], g["depth"]
+    bottom_width = w - 2 * t
+    # door_count се използва за брой чекмеджета (както в скаларния калкулатор)
+    drawer_count = np.where(g["door_count"] > 0, g["door_count"], 3)
+
+    panels = [
+        _PanelSlot("Страничен панел", h, d, MaterialType.BODY, _full(g, 2), (1.0, 0.0, 1.0, 0.0)),
+        _PanelSlot("Дъно", bottom_width, d, MaterialType.BODY, _full(g, 1), (1.0, 0.0, 0.0, 0.0)),
+        _PanelSlot("Стабилизатор", bottom_width, _full(g, 100.0), MaterialType.BODY,
+                   np.where(w > 600, 3, 2), (1.0, 0.0, 0.0, 0.0)),
+        _PanelSlot("Гръб", w - 20, h - 20, MaterialType.BACK, _full(g, 1), mask=g["has_back"]),
+        _PanelSlot("Вътрешен панел", d - 40, h - 100, MaterialType.BODY, drawer_count - 1,
+                   mask=drawer_count > 1),
+        _PanelSlot("Фасада за чекмедже", w - 3, ((h - 100) / drawer_count) - 2, MaterialType.DOOR,
+                   drawer_count, (2.0, 2.0, 2.0, 2.0), g["has_door_board"]),
+        _PanelSlot("Допълнително дъно", bottom_width, d, MaterialType.BODY, _full(g, 1),
+                   (1.0, 0.0, 0.0, 0.0), w > 600),
+    ]
+    leg_count = np.where(w <= 600, 4, 6)
+    hardware = [
+        _HardwareSlot("Краче за чекмедже", leg_count, "100мм"),
+        _HardwareSlot("Щипка за краче", leg_count // 2),
+        _HardwareSlot("Водач за чекмедже", drawer_count * 2),
+        _HardwareSlot("Ръкохватка за чекмедже", drawer_count),
+    ]
+    return _GroupRules(panels, hardware, DRAWER_COSTS)
+
+
+def _oven_rules(g: Dict[str, np.ndarray]) -> _GroupRules:
+    """OvenCabinetCalculator.calculate"""
+    t, gap = 18, 3
+    w, h, d = g["width"], g["height"], g["depth"]
+    oven_bottom_width = w - 2 * t
+    oven_door_height = 560
+    has_drawer = (h - oven_door_height - 50) > 100
+
+    panels = [
+        _PanelSlot("Страничен панел", h, d, MaterialType.BODY, _full(g, 2), (1.0, 0.0, 1.0, 0.0)),
+        _PanelSlot("Дъно за фурна", oven_bottom_width, d, MaterialType.BODY, _full(g, 2), (1.0, 0.0, 0.0, 0.0)),
+        _PanelSlot("Страничен панел за фурна", _full(g, 560.0), d, MaterialType.BODY, _full(g, 2),
+                   (1.0, 0.0, 0.0, 0.0)),
+        _PanelSlot("Гръб", w - 40, h - 40, MaterialType.BACK, _full(g, 1), mask=g["has_back"]),
+        _PanelSlot("Врата за фурна", w - gap, _full(g, float(oven_door_height)), MaterialType.DOOR,
+                   _full(g, 1), (2.0, 2.0, 2.0, 2.0)),
+        _PanelSlot("Фасада за чекмедже под фурна", w - 6, _full(g, 145.0), MaterialType.DOOR, _full(g, 1),
+                   (2.0, 2.0, 2.0, 2.0), has_drawer),
+        _PanelSlot("Дъно за чекмедже", oven_bottom_width, d - 40, MaterialType.BODY, _full(g, 1),
+                   (1.0, 0.0, 0.0, 0.0), has_drawer),
+    ]
+    leg_count = np.where(w <= 600, 6, 8)
+    hardware = [
+        _HardwareSlot("Краче за фурна", leg_count, "100мм"),
+        _HardwareSlot("Щипка за краче", leg_count // 2),
+        _HardwareSlot("Панта за фурна", _full(g, 3)),
+        _HardwareSlot("Водач за чекмедже", _full(g, 2), mask=has_drawer),
+        _HardwareSlot("Ръкохватка за чекмедже", _full(g, 1), mask=has_drawer),
+        _HardwareSlot("Конзола за фурна", _full(g, 4)),
+    ]
+    return _GroupRules(panels, hardware, OVEN_COSTS)
+
+
+# Съответствие с FurnitureEngine.calculators (APPLIANCE няма калкулатор -> BASE)
+_RULES = {
+    CabinetType.BASE: _base_rules,
+    CabinetType.UPPER: _upper_rules,
+    CabinetType.DRAWER: _drawer_rules,
+    CabinetType.OVEN: _oven_rules,
+    CabinetType.SINK: _sink_rules,
+    CabinetType.BLIND: _base_rules,
+    CabinetType.APPLIANCE: _base_rules,
+    CabinetType.FRIDGE: _fridge_column_rules,
+    CabinetType.COLUMN: _fridge_column_rules,
+}
+
+
+# -------------------- РЕЗУЛТАТ --------------------
+
+@dataclass
+class BatchResult:
+    """
+    Колонен резултат от calculate_batch.
+
+    panels: таблица с панели, подредени по cabinet_index и после в реда, в който
+    скаларният калкулатор ги добавя. name е индекс в panel_names, material е
+    индекс в MATERIAL_TYPES, кантовете са 0.0 когато няма кант.
+
+    totals: масиви по шкаф. used_boards[board] == 0 означава, че шкафът не
+    използва този материал; used_edges_m[edge] е NaN, ако няма такъв кант.
+    """
+    size: int
+    panels: Dict[str, np.ndarray]
+    panel_names: List[str]
+    hardware: Dict[str, np.ndarray]
+    hardware_names: List[str]
+    hardware_notes: List[Optional[str]]
+    totals: Dict[str, object] = field(default_factory=dict)
+
+    def panel_rows(self, index: int) -> slice:
+        """Редовете от таблицата с панели за шкаф index"""
+        offsets = self.panels["offsets"]
+        return slice(int(offsets[index]), int(offsets[index + 1]))
+
+    def hardware_rows(self, index: int) -> slice:
+        offsets = self.hardware["offsets"]
+        return slice(int(offsets[index]), int(offsets[index + 1]))
+
+    def to_calculation_result(self, index: int, cabinet: Cabinet) -> CalculationResult:
+        """Материализира един шкаф като CalculationResult (за съвместимост)"""
+        result = CalculationResult(cabinet=cabinet)
+        p = self.panels
+        for row in range(*self.panel_rows(index).indices(len(p["width_mm"]))):
+            result.panels.append(Panel(
+                name=self.panel_names[p["name"][row]],
+                width_mm=int(p["width_mm"][row]),
+                height_mm=int(p["height_mm"][row]),
+                material=MATERIAL_TYPES[p["material"][row]],
+                edge_front=float(p["edge_front"][row]) or None,
+                edge_back=float(p["edge_back"][row]) or None,
+                edge_left=float(p["edge_left"][row]) or None,
+                edge_right=float(p["edge_right"][row]) or None,
+                quantity=int(p["quantity"][row]),
+                area_sqm=float(p["area_sqm"][row]),
+            ))
+        hw = self.hardware
+        for row in range(*self.hardware_rows(index).indices(len(hw["quantity"]))):
+            result.hardware.append(HardwareItem(
+                name=self.hardware_names[hw["name"][row]],
+                quantity=int(hw["quantity"][row]),
+                notes=self.hardware_notes[hw["name"][row]],
+            ))
+
+        totals = self.totals
+        for board_name, sheets in totals["used_boards"].items():
+            if sheets[index]:
+                result.used_boards[board_name] = int(sheets[index])
+        for edge_name, meters in totals["used_edges_m"].items():
+            if not np.isnan(meters[index]):
+                result.used_edges_m[edge_name] = float(meters[index])
+        result.labor_cost = float(totals["labor_cost"][index])
+        result.installation_cost = float(totals["installation_cost"][index])
+        result.total_cost_bgn = float(totals["total_cost_bgn"][index])
+        result.board_cost_bgn = float(totals["board_cost_bgn"][index])
+        result.plinth_length = float(totals["plinth_length"][index])
+        return result
+
+
+def calculate_batch(batch: CabinetBatch) -> BatchResult:
+    """Изчислява пакет от шкафове, групирани по CabinetType"""
+    n = len(batch)
+    panel_parts: Dict[str, List[np.ndarray]] = {k: [] for k in (
+        "cabinet_index", "order", "name", "width_mm", "height_mm", "material",
+        "edge_front", "edge_back", "edge_left", "edge_right", "quantity", "area_sqm")}
+    hw_parts: Dict[str, List[np.ndarray]] = {k: [] for k in ("cabinet_index", "order", "name", "quantity")}
+    panel_names: List[str] = []
+    panel_name_codes: Dict[str, int] = {}
+    hardware_names: List[str] = []
+    hardware_notes: List[Optional[str]] = []
+    hardware_name_codes: Dict[Tuple[str, Optional[str]], int] = {}
+
+    board_names = [BOARD_NAMES[m] for m in MATERIAL_TYPES]
+    edge_names = [edge_name(t) for t in EDGE_THICKNESSES]
+    used_boards = {name: np.zeros(n, dtype=np.int64) for name in board_names}
+    used_edges = {name: np.full(n, np.nan) for name in edge_names}
+    labor_cost = np.zeros(n)
+    installation_cost = np.zeros(n)
+    total_cost = np.zeros(n)
+    board_cost = np.zeros(n)
+    plinth_length = np.zeros(n)
+
+    for type_code in np.unique(batch.type):
+        cabinet_type = CABINET_TYPES[type_code]
+        idx = np.flatnonzero(batch.type == type_code)
+        g = {
+            "width": batch.width[idx],
+            "height": batch.height[idx],
+            "depth": batch.depth[idx],
+            "shelf_count": batch.shelf_count[idx],
+            "door_count": batch.door_count[idx],
+            "has_back": batch.has_back[idx],
+            "has_door_board": batch.has_door_board[idx],
+            "has_closing_panel": batch.has_closing_panel[idx],
+        }
+        rules = _RULES[cabinet_type](g)
+
+        # === ПАНЕЛИ ===
+        for order, slot in enumerate(rules.panels):
+            mask = slot.mask if slot.mask is not None else slice(None)
+            rows = idx[mask]
+            if not len(rows):
+                continue
+            width = slot.width[mask].astype(np.float64)
+            height = slot.height[mask].astype(np.float64)
+            code = panel_name_codes.setdefault(slot.name, len(panel_names))
+            if code == len(panel_names):
+                panel_names.append(slot.name)
+            panel_parts["cabinet_index"].append(rows)
+            panel_parts["order"].append(np.full(len(rows), order, dtype=np.int16))
+            panel_parts["name"].append(np.full(len(rows), code, dtype=np.int16))
+            # area_sqm се смята от незакръглените размери (както CalculationResult.add_panel)
+            panel_parts["area_sqm"].append((width * height) / 1000000.0)
+            panel_parts["width_mm"].append(np.rint(width).astype(np.int64))
+            panel_parts["height_mm"].append(np.rint(height).astype(np.int64))
+            panel_parts["material"].append(np.full(len(rows), MATERIAL_CODES[slot.material], dtype=np.int8))
+            for key, value in zip(("edge_front", "edge_back", "edge_left", "edge_right"), slot.edges):
+                panel_parts[key].append(np.full(len(rows), value))
+            panel_parts["quantity"].append(np.broadcast_to(slot.quantity, g["width"].shape)[mask].astype(np.int64))
+
+        # === ХАРДУЕР ===
+        for order, slot in enumerate(rules.hardware):
+            mask = slot.mask if slot.mask is not None else slice(None)
+            rows = idx[mask]
+            if not len(rows):
+                continue
+            key = (slot.name, slot.notes)
+            code = hardware_name_codes.setdefault(key, len(hardware_names))
+            if code == len(hardware_names):
+                hardware_names.append(slot.name)
+                hardware_notes.append(slot.notes)
+            hw_parts["cabinet_index"].append(rows)
+            hw_parts["order"].append(np.full(len(rows), order, dtype=np.int16))
+            hw_parts["name"].append(np.full(len(rows), code, dtype=np.int16))
+            hw_parts["quantity"].append(np.broadcast_to(slot.quantity, g["width"].shape)[mask].astype(np.int64))
+
+        # === МАТЕРИАЛИ И ЦЕНИ ===
+        cost_panels = rules.cost_panels if rules.cost_panels is not None else rules.panels
+        cost_hardware = rules.cost_hardware if rules.cost_hardware is not None else rules.hardware
+        _cost_group(g, idx, cost_panels, cost_hardware, rules.costs,
+                    used_boards, used_edges, labor_cost, installation_cost, total_cost, board_cost)
+
+        if rules.plinth:
+            plinth_length[idx] = g["width"]
+
+    panels = _concat_sorted(panel_parts, n)
+    hardware = _concat_sorted(hw_parts, n)
+
+    return BatchResult(
+        size=n,
+        panels=panels,
+        panel_names=panel_names,
+        hardware=hardware,
+        hardware_names=hardware_names,
+        hardware_notes=hardware_notes,
+        totals={
+            "used_boards": used_boards,
+            "used_edges_m": used_edges,
+            "labor_cost": labor_cost,
+            "installation_cost": installation_cost,
+            "total_cost_bgn": total_cost,
+            "board_cost_bgn": board_cost,
+            "plinth_length": plinth_length,
+        },
+    )
+
+
+def _cost_group(g, idx, panels: List[_PanelSlot], hardware: List[_HardwareSlot], costs: CostCoefficients,
+                used_boards, used_edges, labor_cost, installation_cost, total_cost, board_costs):
+    """
+    Векторна версия на costing.calculate_materials_and_costs.
+    Слотовете се обхождат в реда на панелите, за да се запази редът на
+    сумиране на float стойностите от скаларния код.
+    """
+    m = len(idx)
+    zeros = np.zeros(m)
+    board_area = {mt: zeros.copy() for mt in MATERIAL_TYPES}
+    board_present = {mt: np.zeros(m, dtype=bool) for mt in MATERIAL_TYPES}
+    edge_len = {t: zeros.copy() for t in EDGE_THICKNESSES}
+    edge_present = {t: np.zeros(m, dtype=bool) for t in EDGE_THICKNESSES}
+    panel_count = np.zeros(m, dtype=np.int64)
+    hardware_count = np.zeros(m, dtype=np.int64)
+
+    for slot in panels:
+        mask = slot.mask if slot.mask is not None else np.ones(m, dtype=bool)
+        width = np.rint(slot.width).astype(np.int64)
+        height = np.rint(slot.height).astype(np.int64)
+        quantity = np.broadcast_to(slot.quantity, (m,)).astype(np.int64)
+        panel_count += mask
+
+        area = (width * height * quantity) / 1_000_000
+        board_area[slot.material] = board_area[slot.material] + np.where(mask, area, 0.0)
+        board_present[slot.material] |= mask
+
+        for thickness, length in zip(slot.edges, (width, width, height, height)):
+            if thickness:
+                edge_len[thickness] = edge_len[thickness] + np.where(mask, (length * quantity) / 1000, 0.0)
+                edge_present[thickness] |= mask
+
+    for slot in hardware:
+        hardware_count += slot.mask if slot.mask is not None else True
+
+    board_cost = np.zeros(m, dtype=np.int64)
+    for material in MATERIAL_TYPES:
+        present = board_present[material]
+        sheets = np.where(present, (board_area[material] / STANDARD_SHEET_AREA + SHEET_RESERVE).astype(np.int64) + 1, 0)
+        used_boards[BOARD_NAMES[material]][idx] = sheets
+        board_cost += sheets * costs.board_prices.get(material, 0)
+
+    edge_total = zeros.copy()
+    for thickness in EDGE_THICKNESSES:
+        present = edge_present[thickness]
+        used_edges[edge_name(thickness)][idx] = np.where(present, edge_len[thickness], np.nan)
+        edge_total = edge_total + np.where(present, edge_len[thickness], 0.0)
+
+    assembly_time = costs.assembly_base + (panel_count * costs.assembly_per_panel)
+    hardware_time = hardware_count * HARDWARE_TIME_PER_ITEM
+    edge_time = edge_total * EDGE_TIME_PER_M
+    labor = (assembly_time * LABOR_RATES["assembly"] +
+             hardware_time * LABOR_RATES["hardware"] +
+             edge_time * LABOR_RATES["edge"])
+
+    labor_cost[idx] = labor
+    installation_cost[idx] = costs.installation_fee
+    board_costs[idx] = board_cost
+    total_cost[idx] = board_cost + edge_total * EDGE_PRICE_PER_M + labor + costs.installation_fee
+
+
+def _concat_sorted(parts: Dict[str, List[np.ndarray]], n: int) -> Dict[str, np.ndarray]:
+    """Слепва частите по групи и ги подрежда по шкаф и после по реда на добавяне"""
+    if not parts["cabinet_index"]:
+        table = {k: np.zeros(0) for k in parts if k != "order"}
+        table["offsets"] = np.zeros(n + 1, dtype=np.int64)
+        return table
+
+    cabinet_index = np.concatenate(parts["cabinet_index"])
+    order = np.lexsort((np.concatenate(parts["order"]), cabinet_index))
+    table = {k: np.concatenate(v)[order] for k, v in parts.items() if k != "order"}
+    table["offsets"] = np.searchsorted(table["cabinet_index"], np.arange(n + 1))
+    return table
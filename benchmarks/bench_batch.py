@@ -0,0 +1,71 @@
+"""
+Бенчмарк: FurnitureEngine.calculate_batch срещу скаларния calculate_cabinet
+
+Употреба:
+    python benchmarks/bench_batch.py [--sizes 10000 100000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from main import create_default_body_board, create_default_door_board, create_default_back_board
+from models import Cabinet, CabinetType, ConstructionProfile
+from cabinet_engine import FurnitureEngine
+from batch_engine import CabinetBatch
+
+
+def make_cabinets(count: int, seed: int = 42):
+    """Случайна смес от всички типове шкафове със стандартни размери"""
+    rnd = random.Random(seed)
+    body, door, back = create_default_body_board(), create_default_door_board(), create_default_back_board()
+    construction = ConstructionProfile()
+    cabinets = []
+    for i in range(count):
+        cabinet_type = rnd.choice(list(CabinetType))
+        cabinets.append(Cabinet(
+            cabinet_id=f"cab_{i}",
+            type=cabinet_type,
+            width=rnd.choice([300, 400, 500, 600, 800, 900, 1000, 1200]),
+            height=rnd.choice([700, 760, 820, 900]) if cabinet_type not in (CabinetType.FRIDGE, CabinetType.COLUMN) else 2200,
+            depth=320 if cabinet_type == CabinetType.UPPER else 560,
+            body_board=body,
+            door_board=door,
+            back_board=back,
+            construction=construction,
+            shelf_count=rnd.choice([0, 1, 2]),
+            door_count=rnd.choice([None, 1, 2]),
+        ))
+    return cabinets
+
+
+def bench(count: int):
+    engine = FurnitureEngine()
+    cabinets = make_cabinets(count)
+    batch = CabinetBatch.from_cabinets(cabinets)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # предупрежденията за APPLIANCE
+        for cabinet in cabinets:
+            engine.calculate_cabinet(cabinet)
+    scalar_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine.calculate_batch(batch)
+    batch_s = time.perf_counter() - start
+
+    print(f"{count:>8} шкафа | скаларно: {scalar_s:8.3f} s ({count / scalar_s:>10,.0f}/s) | "
+          f"пакетно: {batch_s:8.3f} s ({count / batch_s:>12,.0f}/s) | x{scalar_s / batch_s:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        bench(size)
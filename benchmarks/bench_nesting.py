@@ -0,0 +1,64 @@
+"""
+Бенчмарк: разкрой на проект (nesting.py) срещу оценката по шкаф
+
+Цел: под 200 ms за 500 детайла (типична кухня). С --budget се пуска и
+multi-start търсенето (nesting_optimizer.py) за толкова секунди.
+
+Употреба:
+    python benchmarks/bench_nesting.py [--cabinets 40 60 200] [--repeat 5] [--budget 3 --workers 4]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cabinet_engine import FurnitureEngine
+from nesting import collect_parts, nest_project
+from nesting_optimizer import optimize_project
+from bench_batch import make_cabinets
+
+
+def bench(count: int, repeat: int, budget: float, workers: int):
+    engine = FurnitureEngine()
+    with contextlib.redirect_stdout(io.StringIO()):  # предупрежденията за APPLIANCE
+        project = engine.calculate_project(make_cabinets(count, seed=count), nesting=None)
+    results = project["cabinets"]
+    estimated = project["totals"]["used_boards"]
+    parts = sum(len(group) for group in collect_parts(results).values())
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        nesting = nest_project(results)
+        best = min(best, time.perf_counter() - start)
+
+    print(f"{count:>6} шкафа | {parts:>6} детайла | {best * 1000:8.1f} ms | "
+          f"оценка: {sum(estimated.values()):>5} листа | разкрой: {sum(nesting.used_boards().values()):>5} листа")
+    for summary in nesting.summary():
+        print(f"{'':>8}{summary['board']:<14} {summary['sheets']:>5} листа, запълване {summary['utilization']:.0%}")
+
+    if budget > 0:
+        start = time.perf_counter()
+        nesting, optimized = optimize_project(results, budget, workers=workers)
+        elapsed = time.perf_counter() - start
+        print(f"{'':>8}multi-start ({budget:g} s, {workers} процеса, {elapsed:.2f} s): "
+              f"{sum(nesting.used_boards().values()):>5} листа")
+        for result in optimized:
+            curve = " -> ".join(f"{sheets}@{t:.2f}s" for t, sheets, _ in result.curve)
+            print(f"{'':>8}{result.layout.spec.board_name:<14} {result.attempts:>4} опита, "
+                  f"най-добра {result.strategy}: {curve}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cabinets", type=int, nargs="+", default=[40, 60, 200])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=0.0, help="секунди за multi-start (0 = без)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    for count in args.cabinets:
+        bench(count, args.repeat, args.budget, args.workers)
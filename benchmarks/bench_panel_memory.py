@@ -0,0 +1,56 @@
+"""
+Бенчмарк за памет: PanelTable срещу списък от Panel обекти
+
+Изчислява N шкафа и сравнява паметта, която заемат панелите им:
+  - като PanelTable (текущото представяне в CalculationResult)
+  - като списък от Panel dataclass-и (предишното представяне)
+
+Употреба:
+    python benchmarks/bench_panel_memory.py [--cabinets 300 3000]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cabinet_engine import FurnitureEngine
+from bench_batch import make_cabinets
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    data = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, data
+
+
+def bench(count: int):
+    engine = FurnitureEngine()
+    cabinets = make_cabinets(count)
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = [engine.calculate_cabinet(c) for c in cabinets]
+    panel_count = sum(len(r.panel_table) for r in results)
+
+    table_bytes, _ = measure(lambda: [r.panel_table.copy() for r in results])
+    list_bytes, _ = measure(lambda: [list(r.panels) for r in results])
+
+    print(f"{count:>7} шкафа, {panel_count:>8} панела | PanelTable: {table_bytes / 1024:10.1f} KiB "
+          f"({table_bytes / panel_count:6.1f} B/панел) | list[Panel]: {list_bytes / 1024:10.1f} KiB "
+          f"({list_bytes / panel_count:6.1f} B/панел) | x{list_bytes / table_bytes:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cabinets", type=int, nargs="+", default=[300, 3000, 30000])
+    args = parser.parse_args()
+    for count in args.cabinets:
+        bench(count)
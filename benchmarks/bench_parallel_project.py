@@ -0,0 +1,55 @@
+"""
+Бенчмарк: мащабиране на calculate_project в паралелен режим (1..N процеса)
+
+Кешът е изключен, за да се мери самата калкулация, а не попаденията в него.
+Проверява също, че общите стойности са побитово еднакви със серийния път.
+
+Употреба:
+    python benchmarks/bench_parallel_project.py [--count 20000] [--max-workers 8] [--chunk-size 0]
+"""
+import argparse
+import contextlib
+import io
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from cabinet_engine import FurnitureEngine
+from bench_batch import make_cabinets
+
+
+def bench(count: int, max_workers: int, chunk_size: int):
+    cabinets = make_cabinets(count)
+    engine = FurnitureEngine(cache_size=0)
+    serial_s = None
+    reference = None
+    try:
+        for workers in range(1, max_workers + 1):
+            with contextlib.redirect_stdout(io.StringIO()):  # предупрежденията за APPLIANCE
+                if workers > 1:
+                    # Загряване на пула – стартът на процесите не влиза в измерването
+                    engine.calculate_project(cabinets[:workers], workers=workers, chunk_size=1)
+                start = time.perf_counter()
+                project = engine.calculate_project(cabinets, workers=workers, chunk_size=chunk_size or None)
+                elapsed = time.perf_counter() - start
+
+            totals = pickle.dumps(project["totals"])
+            if reference is None:
+                serial_s, reference = elapsed, totals
+            same = "да" if totals == reference else "НЕ"
+            print(f"{workers:>3} процеса | {elapsed:8.3f} s ({count / elapsed:>10,.0f}/s) | "
+                  f"x{serial_s / elapsed:.2f} | еднакви totals: {same}")
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20_000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=0, help="0 = автоматично")
+    args = parser.parse_args()
+    bench(args.count, max(1, args.max_workers), args.chunk_size)
@@ -0,0 +1,102 @@
+"""
+Бенчмарк: сериализация на отговора на проект – стария път срещу fast_json
+
+И двата пътя започват от едни и същи резултати на двигателя (самата
+калкулация не се мери):
+
+    pydantic  _convert_result_to_response за всеки шкаф + ProjectCalculationResponse,
+              после както FastAPI: валидиране по response_model, dump_python(mode="json")
+              и json.dumps в JSONResponse
+    fast_json project_dict + dumps за всеки наличен backend (orjson, msgspec, json)
+
+Проверява и че JSON-ът от двата пътя е еднакъв след разчитане.
+
+Употреба:
+    python benchmarks/bench_serialization.py [--sizes 50 500] [--repeat 20]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from pydantic import TypeAdapter
+
+from app.services.calculator import FurnitureCalculatorService
+from app.services import fast_json
+from app.schemas.cabinet import CabinetRequest, ProjectCalculationResponse
+
+TYPES = ["base", "upper", "drawer", "sink", "oven"]
+
+
+def make_requests(count: int):
+    return [
+        CabinetRequest(type=TYPES[i % len(TYPES)], width=300 + (i % 10) * 100,
+                       height=700 if TYPES[i % len(TYPES)] == "upper" else 760, depth=560)
+        for i in range(count)
+    ]
+
+
+def pydantic_path(service, adapter, results, totals) -> bytes:
+    cabinets = [service._convert_result_to_response(result) for result in results]
+    response = ProjectCalculationResponse(
+        success=True, project_name="Бенчмарк", total_cabinets=len(cabinets), cabinets=cabinets,
+        totals=totals, project_total_cost=sum(cabinet.total_cost_bgn for cabinet in cabinets), error=None)
+    # Това прави FastAPI с response_model и JSONResponse
+    content = adapter.dump_python(adapter.validate_python(response), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def fast_path(dumps, results, totals) -> bytes:
+    return dumps(fast_json.project_dict("Бенчмарк", results, totals))
+
+
+def measure(fn, repeat: int) -> float:
+    fn()  # загряване
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def bench(sizes, repeat: int):
+    service = FurnitureCalculatorService()
+    adapter = TypeAdapter(ProjectCalculationResponse)
+    backends = []
+    for name in fast_json.BACKENDS:
+        try:
+            backends.append(fast_json.select_backend(name))
+        except ValueError:
+            print(f"({name} не е инсталиран – пропуска се)")
+
+    for size in sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            cabinets = [service._convert_request_to_cabinet(request) for request in make_requests(size)]
+            project = service.engine.calculate_project(cabinets)
+        results, totals = project["cabinets"], project["totals"]
+
+        reference = json.loads(pydantic_path(service, adapter, results, totals))
+        baseline = measure(lambda: pydantic_path(service, adapter, results, totals), repeat)
+        size_kb = len(pydantic_path(service, adapter, results, totals)) / 1024
+        print(f"\n{size} шкафа ({size_kb:,.0f} KB JSON)")
+        print(f"  {'pydantic':<16} {baseline * 1000:9.2f} ms")
+        for name, dumps in backends:
+            elapsed = measure(lambda: fast_path(dumps, results, totals), repeat)
+            same = "да" if json.loads(fast_path(dumps, results, totals)) == reference else "НЕ"
+            print(f"  {'fast_json/' + name:<16} {elapsed * 1000:9.2f} ms | x{baseline / elapsed:5.1f} | "
+                  f"еднакъв JSON: {same}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    bench(args.sizes, args.repeat)
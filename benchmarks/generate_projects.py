@@ -0,0 +1,286 @@
+"""
+Генератор на реалистични проекти за бенчмаркове и load тестове
+
+Вместо един и същ долен шкаф 600 мм генерира кухни, подредени по стени:
+
+    - долна линия: мивка, фурна, чекмеджета, долни шкафове, ъглов (blind)
+      шкаф при ъгъл; хладилник / колона в края на стената
+    - горна линия над долните шкафове (без високите колони)
+    - ширините са стандартните от FurnitureCalculatorService._get_size_suggestions
+
+Договорните обекти (сгради) се правят от няколко шаблона на апартамент,
+повторени по етажи – както при реална поръчка, много от шкафовете са
+еднакви (кешовете трябва да ги хващат), а cabinet_id е уникален.
+
+Всичко е детерминирано по --seed. Изходът е поточен – шкафовете се
+генерират и записват един по един, без целият проект да е в паметта,
+затова размерът е произволен:
+
+    json      един ProjectRequest (за /api/v1/projects/calculate)
+    ndjson    по един ProjectRequest на ред (кухня / апартамент)
+    cabinets  по един CabinetRequest на ред (за /api/v1/cabinets/calculate-batch)
+
+Употреба:
+    python benchmarks/generate_projects.py kitchens [--count 100] [--seed 42] [--format ndjson] [-o FILE]
+    python benchmarks/generate_projects.py building [--floors 12] [--apartments-per-floor 8]
+                                                    [--templates 4] [--seed 42] [--format json] [-o FILE]
+
+От код (напр. load тест):
+
+    from generate_projects import iter_kitchens
+    for name, cabinets in iter_kitchens(count=10, seed=1):
+        payload = {"project_name": name, "cabinets": list(cabinets)}
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+# Услугата се създава само за таблиците с размери – без постоянен кеш за разкрои
+os.environ.setdefault("NESTING_CACHE_PATH", "")
+
+from app.schemas.cabinet import CabinetTypeEnum  # noqa: E402
+
+CabinetDict = Dict[str, object]
+Project = Tuple[str, Iterator[CabinetDict]]
+
+TALL_HEIGHTS = [2100, 2200]
+FRIDGE_WIDTH = 600
+OVEN_WIDTH = 600
+SINK_WIDTHS = [600, 800, 900]
+BLIND_WIDTH = 900
+MIN_WALL = 1800
+MAX_WALL = 4200
+
+_sizes: Optional[Dict[CabinetTypeEnum, Dict[str, List[int]]]] = None
+
+
+def standard_sizes() -> Dict[CabinetTypeEnum, Dict[str, List[int]]]:
+    """Стандартните размери по тип от услугата (прочетени веднъж)"""
+    global _sizes
+    if _sizes is None:
+        from app.services.calculator import FurnitureCalculatorService
+        service = FurnitureCalculatorService()
+        _sizes = {cabinet_type: service._get_size_suggestions(cabinet_type) for cabinet_type in CabinetTypeEnum}
+    return _sizes
+
+
+def _cabinet(cabinet_type: CabinetTypeEnum, width: int, height: int, depth: int, **fields) -> CabinetDict:
+    cabinet = {"type": cabinet_type.value, "width": width, "height": height, "depth": depth}
+    cabinet.update(fields)
+    return cabinet
+
+
+def _base_unit(rnd: random.Random, width: int, height: int) -> CabinetDict:
+    sizes = standard_sizes()
+    if rnd.random() < 0.35 and width in sizes[CabinetTypeEnum.DRAWER]["width"]:
+        drawers = rnd.choice([2, 3, 4])
+        # Калкулаторът на чекмеджета чете броя от number_of_doors
+        return _cabinet(CabinetTypeEnum.DRAWER, width, height, sizes[CabinetTypeEnum.DRAWER]["depth"][0],
+                        number_of_doors=drawers, number_of_drawers=drawers, number_of_shelves=0)
+    return _cabinet(CabinetTypeEnum.BASE, width, height, sizes[CabinetTypeEnum.BASE]["depth"][0],
+                    number_of_doors=2 if width > 600 else 1, number_of_shelves=rnd.choice([1, 1, 2]))
+
+
+def _fill(rnd: random.Random, length: int, widths: List[int]) -> List[int]:
+    """Ширини от widths, които запълват length (остатъкът < най-малката ширина)"""
+    result = []
+    smallest = min(widths)
+    while length >= smallest:
+        fitting = [width for width in widths if width <= length]
+        width = rnd.choice(fitting)
+        result.append(width)
+        length -= width
+    return result
+
+
+def wall_run(rnd: random.Random, length: int, *, sink: bool = False, oven: bool = False,
+             fridge: bool = False, corner: bool = False) -> List[CabinetDict]:
+    """
+    Една стена с дължина length мм: долна линия (+ високи шкафове в края)
+    и горна линия над долните шкафове. Редът е отляво надясно.
+    """
+    sizes = standard_sizes()
+    base_height = rnd.choice(sizes[CabinetTypeEnum.BASE]["height"])
+    upper = sizes[CabinetTypeEnum.UPPER]
+    upper_height = rnd.choice(upper["height"])
+
+    tall: List[CabinetDict] = []
+    if fridge:
+        tall.append(_cabinet(CabinetTypeEnum.FRIDGE, FRIDGE_WIDTH, rnd.choice(TALL_HEIGHTS), 560,
+                             number_of_doors=2, number_of_shelves=0))
+        if rnd.random() < 0.4:
+            tall.append(_cabinet(CabinetTypeEnum.COLUMN, rnd.choice([500, 600]), tall[0]["height"], 560,
+                                 number_of_doors=2, number_of_shelves=4))
+    remaining = length - sum(cabinet["width"] for cabinet in tall)
+
+    fixed: List[CabinetDict] = []
+    if corner:
+        fixed.append(_cabinet(CabinetTypeEnum.BLIND, BLIND_WIDTH, base_height, 560, number_of_doors=1))
+    if sink:
+        fixed.append(_cabinet(CabinetTypeEnum.SINK, rnd.choice(SINK_WIDTHS), base_height, 560,
+                              number_of_doors=2, number_of_shelves=0))
+    if oven:
+        fixed.append(_cabinet(CabinetTypeEnum.OVEN, OVEN_WIDTH, base_height, 560,
+                              number_of_doors=0, number_of_shelves=0))
+    while fixed and sum(cabinet["width"] for cabinet in fixed) > remaining:
+        fixed.pop()
+    remaining -= sum(cabinet["width"] for cabinet in fixed)
+
+    base = [_base_unit(rnd, width, base_height)
+            for width in _fill(rnd, remaining, sizes[CabinetTypeEnum.BASE]["width"])]
+    # Ъгловият шкаф е в левия край, останалите фиксирани – разпръснати в линията
+    corner_units = [cabinet for cabinet in fixed if cabinet["type"] == CabinetTypeEnum.BLIND.value]
+    for cabinet in fixed[len(corner_units):]:
+        base.insert(rnd.randint(0, len(base)), cabinet)
+    base = corner_units + base
+
+    base_length = sum(cabinet["width"] for cabinet in base)
+    uppers = [_cabinet(CabinetTypeEnum.UPPER, width, upper_height, upper["depth"][0],
+                       number_of_doors=2 if width > 600 else 1, number_of_shelves=1 if upper_height < 900 else 2)
+              for width in _fill(rnd, base_length, upper["width"])]
+    return base + tall + uppers
+
+
+def kitchen(rnd: random.Random) -> List[CabinetDict]:
+    """Кухня на 1–3 стени (права, Г-образна, П-образна)"""
+    walls = rnd.choices([1, 2, 3], weights=[5, 4, 1])[0]
+    lengths = [rnd.randrange(MIN_WALL, MAX_WALL + 1, 100) for _ in range(walls)]
+    fridge_wall = rnd.randrange(walls)
+    cabinets: List[CabinetDict] = []
+    for index, length in enumerate(lengths):
+        cabinets.extend(wall_run(rnd, length, sink=index == 0, oven=index == min(1, walls - 1),
+                                 fridge=index == fridge_wall, corner=index > 0))
+    return cabinets
+
+
+def _numbered(prefix: str, cabinets: Iterable[CabinetDict]) -> Iterator[CabinetDict]:
+    for index, cabinet in enumerate(cabinets, 1):
+        yield {"cabinet_id": f"{prefix}-{index:02d}", **cabinet}
+
+
+def iter_kitchens(count: int, seed: int = 42) -> Iterator[Project]:
+    """count независими кухни: (име на проекта, шкафове)"""
+    rnd = random.Random(seed)
+    for number in range(1, count + 1):
+        name = f"Кухня {number}"
+        yield name, _numbered(f"K{number}", kitchen(rnd))
+
+
+def apartment_templates(count: int, seed: int = 42) -> List[List[CabinetDict]]:
+    """count различни шаблона на кухня за апартаментите в една сграда"""
+    rnd = random.Random(seed)
+    return [kitchen(rnd) for _ in range(count)]
+
+
+def iter_apartments(floors: int, per_floor: int, templates: int = 4, seed: int = 42) -> Iterator[Project]:
+    """
+    Апартаментите в сградата: (име, шкафове). Шаблонът на апартамента
+    зависи от позицията му на етажа (както в истинска сграда – вертикално
+    повтарящи се), като част от апартаментите са огледални.
+    """
+    plans = apartment_templates(templates, seed)
+    rnd = random.Random(seed + 1)
+    mirrored = [rnd.random() < 0.5 for _ in range(per_floor)]
+    for floor in range(1, floors + 1):
+        for position in range(1, per_floor + 1):
+            plan = plans[(position - 1) % len(plans)]
+            if mirrored[position - 1]:
+                plan = [dict(cabinet, left_handed=True) for cabinet in reversed(plan)]
+            yield f"Ап. {floor}.{position}", _numbered(f"F{floor}A{position}", plan)
+
+
+def iter_building_cabinets(floors: int, per_floor: int, templates: int = 4, seed: int = 42) -> Iterator[CabinetDict]:
+    """Всички шкафове в сградата като един поток (един договорен проект)"""
+    for _, cabinets in iter_apartments(floors, per_floor, templates, seed):
+        yield from cabinets
+
+
+# -------------------- ЗАПИС --------------------
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_project_json(out: TextIO, name: str, cabinets: Iterable[CabinetDict]) -> int:
+    """Записва един ProjectRequest поточно; връща броя шкафове"""
+    out.write('{"project_name":' + _dumps(name) + ',"cabinets":[')
+    count = 0
+    for cabinet in cabinets:
+        if count:
+            out.write(",")
+        out.write("\n" + _dumps(cabinet))
+        count += 1
+    out.write("\n]}\n")
+    return count
+
+
+def write_projects_ndjson(out: TextIO, projects: Iterable[Project]) -> int:
+    """По един ProjectRequest на ред; връща броя шкафове"""
+    count = 0
+    for name, cabinets in projects:
+        cabinets = list(cabinets)   # един проект (кухня/апартамент) – малък
+        out.write(_dumps({"project_name": name, "cabinets": cabinets}) + "\n")
+        count += len(cabinets)
+    return count
+
+
+def write_cabinets_ndjson(out: TextIO, cabinets: Iterable[CabinetDict]) -> int:
+    """По един CabinetRequest на ред; връща броя шкафове"""
+    count = 0
+    for cabinet in cabinets:
+        out.write(_dumps(cabinet) + "\n")
+        count += 1
+    return count
+
+
+def _write(out: TextIO, fmt: str, name: str, projects: Iterable[Project]) -> int:
+    if fmt == "ndjson":
+        return write_projects_ndjson(out, projects)
+    cabinets = (cabinet for _, project_cabinets in projects for cabinet in project_cabinets)
+    if fmt == "cabinets":
+        return write_cabinets_ndjson(out, cabinets)
+    return write_project_json(out, name, cabinets)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генератор на синтетични кухни и договорни обекти")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    kitchens_parser = subparsers.add_parser("kitchens", help="независими кухни")
+    kitchens_parser.add_argument("--count", type=int, default=100)
+
+    building_parser = subparsers.add_parser("building", help="сграда с повтарящи се апартаменти")
+    building_parser.add_argument("--floors", type=int, default=12)
+    building_parser.add_argument("--apartments-per-floor", type=int, default=8)
+    building_parser.add_argument("--templates", type=int, default=4, help="брой различни кухни в сградата")
+    building_parser.add_argument("--name", default="Жилищна сграда")
+
+    for subparser, default_format in ((kitchens_parser, "ndjson"), (building_parser, "json")):
+        subparser.add_argument("--seed", type=int, default=42)
+        subparser.add_argument("--format", choices=["json", "ndjson", "cabinets"], default=default_format,
+                               help="json: един проект; ndjson: проект на ред; cabinets: шкаф на ред")
+        subparser.add_argument("-o", "--output", help="файл (по подразбиране stdout)")
+    args = parser.parse_args(argv)
+
+    if args.command == "kitchens":
+        projects = iter_kitchens(args.count, args.seed)
+        name = f"{args.count} кухни"
+    else:
+        projects = iter_apartments(args.floors, args.apartments_per_floor, args.templates, args.seed)
+        name = args.name
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        count = _write(out, args.format, name, projects)
+    finally:
+        if args.output:
+            out.close()
+    print(f"{count} шкафа", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""
+Load тест на API-то: пропускателна способност и опашка на латентността
+
+Затворен цикъл: --profile задава броя едновременни клиенти по етапи, всеки
+клиент праща следващата заявка веднага след отговора. Видовете заявки се
+смесват по тегла (--mix), а телата са от генератора (generate_projects.py):
+
+    cabinet   POST /api/v1/cabinets/calculate  – шкаф от реалистичните кухни
+    project   POST /api/v1/projects/calculate  – цяла кухня (10–30 шкафа)
+    contract  POST /api/v1/projects/calculate  – няколко апартамента от сграда
+              (над MAX_SYNC_PROJECT_CABINETS API-то връща 202 + задача, т.е.
+              се мери само приемането ѝ)
+
+Етапи на --profile (разделени със запетая):
+
+    8:10      8 клиента за 10 секунди
+    1-32:20   линейно от 1 до 32 клиента за 20 секунди (и 32-1 надолу)
+
+Цел (--target):
+
+    asgi      приложението в същия процес през httpx.ASGITransport (с
+              lifespan) – без сокети, но клиентът и сървърът делят event
+              loop-а и процесора, затова числата са по-ниски от реалните
+    uvicorn   uvicorn в отделен процес на свободен порт (като load_executor.py)
+    URL       вече пуснат сървър, напр. http://127.0.0.1:8000
+
+Повтарящите се тела се хващат от кешовете на отговори и на шкафове;
+--unique прави всяка заявка различна (cabinet_id / project_name с пореден
+номер) – тогава се мери и калкулацията, не само кешът.
+
+За всеки етап и вид: заявки, RPS, p50/p95/p99/max, грешки (статус >= 400
+или изключение) и разбивка по статус. Резултатът е JSON (--output) с
+данни за машината и commit-а; compare сравнява два такива файла и връща
+код 1 при регресия: RPS по-нисък с над --threshold, или --metric
+(по подразбиране p99) по-висок с над --threshold и p50 също – ако е
+скочила само опашката, редът е "noisy". Ръст на грешките с над 1 пр.п.
+също е регресия.
+
+Употреба:
+    python benchmarks/load.py run [--target asgi|uvicorn|URL] [--profile 8:10] [--mix cabinet=8,project=2]
+                                  [--warmup 2] [--unique] [--seed 42] [-o benchmarks/results/load.json]
+    python benchmarks/load.py compare benchmarks/results/load-baseline.json benchmarks/results/load.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from suite import machine_metadata, _COMPARABLE_META
+from generate_projects import iter_apartments, iter_kitchens
+from load_executor import start_server
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "load.json")
+ENDPOINTS = {
+    "cabinet": "/api/v1/cabinets/calculate",
+    "project": "/api/v1/projects/calculate",
+    "contract": "/api/v1/projects/calculate",
+}
+JSON_HEADERS = {"content-type": "application/json"}
+MARKER = "@@seq@@"
+ERROR_RATE_TOLERANCE = 0.01
+
+
+# -------------------- ТЕЛА НА ЗАЯВКИТЕ --------------------
+
+class Payloads:
+    """Предварително сериализирани тела по вид; next() ги върти поред"""
+
+    def __init__(self, kinds, pool: int, contract_apartments: int, seed: int, unique: bool):
+        self.unique = unique
+        self.bodies: Dict[str, List[bytes]] = {}
+        self._positions = {kind: itertools.count() for kind in kinds}
+        self._sequence = itertools.count()
+        if "cabinet" in kinds or "project" in kinds:
+            kitchens = [(name, list(cabinets)) for name, cabinets in iter_kitchens(pool, seed)]
+            if "cabinet" in kinds:
+                self.bodies["cabinet"] = [self._encode(dict(cabinet, cabinet_id=cabinet["cabinet_id"] + MARKER))
+                                          for _, cabinets in kitchens for cabinet in cabinets]
+            if "project" in kinds:
+                self.bodies["project"] = [self._encode({"project_name": name + MARKER, "cabinets": cabinets})
+                                          for name, cabinets in kitchens]
+        if "contract" in kinds:
+            self.bodies["contract"] = []
+            for number in range(max(1, pool // 20)):
+                cabinets = [cabinet for _, apartment in iter_apartments(1, contract_apartments, seed=seed + number)
+                            for cabinet in apartment]
+                self.bodies["contract"].append(self._encode({"project_name": f"Обект {number + 1}{MARKER}",
+                                                             "cabinets": cabinets}))
+
+    def _encode(self, payload) -> bytes:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        return body if self.unique else body.replace(MARKER.encode(), b"")
+
+    def next(self, kind: str) -> bytes:
+        bodies = self.bodies[kind]
+        body = bodies[next(self._positions[kind]) % len(bodies)]
+        if self.unique:
+            body = body.replace(MARKER.encode(), f"#{next(self._sequence)}".encode())
+        return body
+
+
+# -------------------- ПРОФИЛ И СТАТИСТИКА --------------------
+
+@dataclass
+class Stage:
+    name: str
+    start: int      # клиенти в началото на етапа
+    end: int        # клиенти в края (= start при постоянен етап)
+    duration: float
+    records: Dict[str, List[Tuple[float, object]]] = field(default_factory=dict)   # вид -> [(секунди, статус)]
+    elapsed: float = 0.0
+
+    def concurrency(self, at: float) -> int:
+        return int(round(self.start + (self.end - self.start) * min(1.0, at / self.duration)))
+
+
+def parse_profile(spec: str) -> List[Stage]:
+    stages = []
+    for part in spec.split(","):
+        part = part.strip()
+        try:
+            clients, duration = part.split(":")
+            start, _, end = clients.partition("-")
+            stage = Stage(part, int(start), int(end or start), float(duration))
+        except ValueError:
+            raise ValueError(f"Невалиден етап '{part}' – очаква се КЛИЕНТИ:СЕКУНДИ или ОТ-ДО:СЕКУНДИ")
+        if stage.duration <= 0 or stage.start < 0 or stage.end < 0:
+            raise ValueError(f"Невалиден етап '{part}'")
+        stages.append(stage)
+    return stages
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.strip().partition("=")
+        if kind not in ENDPOINTS:
+            raise ValueError(f"Непознат вид заявка '{kind}' (възможни: {', '.join(ENDPOINTS)})")
+        mix[kind] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("--mix трябва да има поне едно положително тегло")
+    return mix
+
+
+def _percentiles(values: List[float], quantiles) -> List[float]:
+    if not values:
+        return [0.0 for _ in quantiles]
+    ordered = sorted(values)
+    return [ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] for q in quantiles]
+
+
+def summarize(records: List[Tuple[float, object]], duration: float) -> Dict:
+    ms = [seconds * 1000 for seconds, _ in records]
+    statuses: Dict[str, int] = {}
+    for _, status in records:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for _, status in records if not isinstance(status, int) or status >= 400)
+    p50, p95, p99 = _percentiles(ms, (0.50, 0.95, 0.99))
+    return {
+        "requests": len(ms),
+        "rps": round(len(ms) / duration, 2) if duration else 0.0,
+        "errors": errors,
+        "error_rate": round(errors / len(ms), 4) if ms else 0.0,
+        "statuses": statuses,
+        "p50_ms": round(p50, 2),
+        "p95_ms": round(p95, 2),
+        "p99_ms": round(p99, 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+        "mean_ms": round(statistics.fmean(ms), 2) if ms else 0.0,
+    }
+
+
+# -------------------- НАТОВАРВАНЕ --------------------
+
+class _State:
+    def __init__(self):
+        self.stage: Optional[Stage] = None
+        self.target = 0
+        self.done = False
+
+
+async def _client(index: int, client: httpx.AsyncClient, state: _State, payloads: Payloads,
+                  mix: Dict[str, float], rnd: random.Random):
+    kinds, weights = list(mix), list(mix.values())
+    while not state.done:
+        if index >= state.target:
+            await asyncio.sleep(0.01)
+            continue
+        kind = rnd.choices(kinds, weights)[0]
+        body = payloads.next(kind)
+        stage = state.stage   # заявката се брои в етапа, в който е започнала
+        started = time.perf_counter()
+        try:
+            response = await client.post(ENDPOINTS[kind], content=body, headers=JSON_HEADERS)
+            status = response.status_code
+        except Exception as e:
+            status = type(e).__name__
+        stage.records.setdefault(kind, []).append((time.perf_counter() - started, status))
+        # Отговор от кеша през ASGITransport може да мине без нито едно
+        # изчакване – без това _drive не би получил ход и етапът не свършва
+        await asyncio.sleep(0)
+
+
+async def _drive(stages: List[Stage], state: _State):
+    for stage in stages:
+        state.stage = stage
+        started = time.perf_counter()
+        while True:
+            elapsed = time.perf_counter() - started
+            if elapsed >= stage.duration:
+                break
+            state.target = stage.concurrency(elapsed)
+            await asyncio.sleep(min(0.1, stage.duration - elapsed))
+        stage.elapsed = time.perf_counter() - started
+    state.done = True
+
+
+async def run_load(client: httpx.AsyncClient, stages: List[Stage], payloads: Payloads,
+                   mix: Dict[str, float], seed: int) -> None:
+    state = _State()
+    clients = max(max(stage.start, stage.end) for stage in stages)
+    workers = [asyncio.create_task(_client(index, client, state, payloads, mix, random.Random(seed + index)))
+               for index in range(clients)]
+    await _drive(stages, state)
+    await asyncio.gather(*workers)
+
+
+async def _run_target(args, stages: List[Stage], payloads: Payloads, mix: Dict[str, float]):
+    clients = max(max(stage.start, stage.end) for stage in stages)
+    limits = httpx.Limits(max_connections=clients + 2)
+    if args.target == "asgi":
+        from app.main import app
+        transport = httpx.ASGITransport(app=app)
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=args.timeout) as client:
+                await _measure(client, args, stages, payloads, mix)
+        return
+
+    server = None
+    base_url = args.target
+    if args.target == "uvicorn":
+        server, base_url = start_server(inline=False)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+            await _measure(client, args, stages, payloads, mix)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+async def _measure(client: httpx.AsyncClient, args, stages: List[Stage], payloads: Payloads,
+                   mix: Dict[str, float]):
+    if args.warmup > 0:
+        # Загряване: пулове, импорти в процесите, кешове – не влиза в резултата
+        warmup = Stage("warmup", stages[0].start or 1, stages[0].start or 1, args.warmup)
+        await run_load(client, [warmup], payloads, mix, args.seed)
+    await run_load(client, stages, payloads, mix, args.seed)
+
+
+def stage_report(stage: Stage) -> Dict:
+    every = [record for records in stage.records.values() for record in records]
+    return {
+        "name": stage.name,
+        "clients": [stage.start, stage.end],
+        "duration_s": round(stage.elapsed, 3),
+        "all": summarize(every, stage.elapsed),
+        "kinds": {kind: summarize(records, stage.elapsed) for kind, records in sorted(stage.records.items())},
+    }
+
+
+def run(args) -> int:
+    stages = parse_profile(args.profile)
+    mix = parse_mix(args.mix)
+    payloads = Payloads(list(mix), args.pool, args.contract_apartments, args.seed, args.unique)
+
+    asyncio.run(_run_target(args, stages, payloads, mix))
+
+    report = {
+        "meta": machine_metadata(),
+        "settings": {"target": "url" if "://" in args.target else args.target, "profile": args.profile,
+                     "mix": mix, "warmup_s": args.warmup, "unique": args.unique, "pool": args.pool,
+                     "contract_apartments": args.contract_apartments, "seed": args.seed},
+        "stages": [stage_report(stage) for stage in stages],
+    }
+    for stage in report["stages"]:
+        for kind, stats in [("all", stage["all"])] + list(stage["kinds"].items()):
+            print(f"{stage['name']:<10} {kind:<9} {stats['requests']:>7} заявки {stats['rps']:>9} rps | "
+                  f"p50 {stats['p50_ms']:>8} ms | p95 {stats['p95_ms']:>8} ms | p99 {stats['p99_ms']:>8} ms | "
+                  f"грешки {stats['errors']} ({stats['error_rate'] * 100:.1f}%)")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nЗаписано в {args.output}")
+    return 0
+
+
+# -------------------- СРАВНЕНИЕ --------------------
+
+def _rows(report: Dict) -> Dict[str, Dict]:
+    rows = {}
+    for stage in report["stages"]:
+        rows[f"{stage['name']}/all"] = stage["all"]
+        for kind, stats in stage["kinds"].items():
+            rows[f"{stage['name']}/{kind}"] = stats
+    return rows
+
+
+def _change(current: float, baseline: float) -> float:
+    if baseline == 0:
+        return 0.0 if current == 0 else math.inf
+    return current / baseline - 1
+
+
+def compare_reports(baseline: Dict, current: Dict, threshold: float, metric: str = "p99_ms") -> List[Dict]:
+    """Ред на етап/вид: name, rps и metric (базова линия, текущ, промяна) и status"""
+    rows = []
+    base_rows, current_rows = _rows(baseline), _rows(current)
+    for name in sorted(set(base_rows) | set(current_rows)):
+        base, cur = base_rows.get(name), current_rows.get(name)
+        if base is None or cur is None:
+            rows.append({"name": name, "status": "new" if base is None else "missing"})
+            continue
+        rps_change = _change(cur["rps"], base["rps"])
+        latency_change = _change(cur[metric], base[metric])
+        if cur["error_rate"] - base["error_rate"] > ERROR_RATE_TOLERANCE or rps_change < -threshold:
+            status = "REGRESSION"
+        elif latency_change > threshold:
+            status = "REGRESSION" if _change(cur["p50_ms"], base["p50_ms"]) > threshold else "noisy"
+        elif rps_change > threshold or latency_change < -threshold:
+            status = "faster"
+        else:
+            status = "ok"
+        rows.append({"name": name, "baseline": base, "current": cur, "rps_change": rps_change,
+                     "latency_change": latency_change, "status": status})
+    return rows
+
+
+def compare(args) -> int:
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    different = [key for key in _COMPARABLE_META if baseline["meta"].get(key) != current["meta"].get(key)]
+    if different:
+        print(f"Внимание: различна машина/интерпретатор ({', '.join(different)}) – сравнението е ориентировъчно")
+    if baseline["settings"] != current["settings"]:
+        print("Внимание: различни настройки на натоварването (profile/mix/target) – етапите може да не съвпадат")
+
+    rows = compare_reports(baseline, current, args.threshold, args.metric)
+    for row in rows:
+        if "baseline" not in row:
+            print(f"{row['name']:<20} {row['status']}")
+            continue
+        base, cur = row["baseline"], row["current"]
+        print(f"{row['name']:<20} rps {base['rps']:>9} -> {cur['rps']:>9} {row['rps_change'] * 100:+7.1f}% | "
+              f"{args.metric} {base[args.metric]:>8} -> {cur[args.metric]:>8} {row['latency_change'] * 100:+7.1f}% | "
+              f"грешки {base['error_rate'] * 100:.1f}% -> {cur['error_rate'] * 100:.1f}%  {row['status']}")
+
+    regressions = [row for row in rows if row["status"] == "REGRESSION"]
+    print(f"\n{len(regressions)} регресии над {args.threshold * 100:.0f}% "
+          f"(базова линия {baseline['meta'].get('git_commit')}, текущ {current['meta'].get('git_commit')})")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load тест на API-то")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="натоварване и запис на резултата")
+    run_parser.add_argument("--target", default="asgi", help="asgi, uvicorn или URL на пуснат сървър")
+    run_parser.add_argument("--profile", default="8:10", help="етапи КЛИЕНТИ:СЕКУНДИ или ОТ-ДО:СЕКУНДИ")
+    run_parser.add_argument("--mix", default="cabinet=8,project=2", help="тегла по вид: cabinet, project, contract")
+    run_parser.add_argument("--warmup", type=float, default=2.0, help="секунди загряване преди измерването")
+    run_parser.add_argument("--unique", action="store_true", help="всяка заявка различна (без попадения в кеша)")
+    run_parser.add_argument("--pool", type=int, default=200, help="брой генерирани кухни за телата")
+    run_parser.add_argument("--contract-apartments", type=int, default=2, help="апартаменти в една contract заявка")
+    run_parser.add_argument("--timeout", type=float, default=120.0)
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT)
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="сравнение на два резултата")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10)
+    compare_parser.add_argument("--metric", default="p99_ms", choices=["p50_ms", "p95_ms", "p99_ms", "mean_ms"])
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
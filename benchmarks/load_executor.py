@@ -0,0 +1,166 @@
+"""
+Load тест: латентност на малките заявки, докато вървят големи проекти
+
+Стартира uvicorn в отделен процес (истински сокети – иначе блокиращ
+handler не се вижда) и го натоварва с httpx.AsyncClient. Две фази по
+--duration секунди:
+
+    1. само малки заявки (POST /api/v1/cabinets/calculate)
+    2. същите малки заявки + непрекъснати големи проекти (POST /api/v1/projects/calculate)
+
+При executor слоя p99 на малките заявки остава близо до фаза 1. С --inline
+калкулациите вървят директно в event loop-а (старото поведение) и p99
+расте с времето на един голям проект.
+
+Употреба:
+    python benchmarks/load_executor.py [--duration 5] [--small-concurrency 8]
+                                       [--big-concurrency 2] [--big-cabinets 50] [--inline] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+
+SMALL_CABINET = {"type": "base", "width": 600, "height": 760, "depth": 560}
+
+
+def _big_project(count: int):
+    types = ["base", "upper", "drawer", "sink", "oven"]
+    return {
+        "project_name": "Load test",
+        "cabinets": [
+            {"type": types[i % len(types)], "width": 300 + (i % 10) * 100, "height": 760, "depth": 560}
+            for i in range(count)
+        ],
+    }
+
+
+def _percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def _small_worker(client, deadline: float, latencies, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/api/v1/cabinets/calculate", json=SMALL_CABINET)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+async def _big_worker(client, deadline: float, payload, latencies, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/api/v1/projects/calculate", json=payload)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+def _summary(latencies, errors, duration: float):
+    ms = [value * 1000 for value in latencies]
+    return {
+        "requests": len(ms),
+        "rps": round(len(ms) / duration, 1),
+        "errors": len(errors),
+        "p50_ms": round(_percentile(ms, 0.50), 2),
+        "p95_ms": round(_percentile(ms, 0.95), 2),
+        "p99_ms": round(_percentile(ms, 0.99), 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+        "mean_ms": round(statistics.fmean(ms), 2) if ms else 0.0,
+    }
+
+
+async def _phase(client, duration: float, small_concurrency: int, big_concurrency: int, big_payload):
+    small, small_errors, big, big_errors = [], [], [], []
+    deadline = time.perf_counter() + duration
+    tasks = [_small_worker(client, deadline, small, small_errors) for _ in range(small_concurrency)]
+    tasks += [_big_worker(client, deadline, big_payload, big, big_errors) for _ in range(big_concurrency)]
+    await asyncio.gather(*tasks)
+    result = {"small": _summary(small, small_errors, duration)}
+    if big_concurrency:
+        result["big"] = _summary(big, big_errors, duration)
+    return result
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(inline: bool) -> tuple:
+    port = _free_port()
+    env = dict(os.environ)
+    if inline:
+        env["EXECUTOR_THREAD_WORKERS"] = "0"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=API_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/v1/cabinets/types", timeout=1).status_code == 200:
+                return server, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("uvicorn не стартира")
+
+
+async def run(args, base_url: str):
+    big_payload = _big_project(args.big_cabinets)
+    limits = httpx.Limits(max_connections=args.small_concurrency + args.big_concurrency + 2)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        # Загряване (пулове, кеш на шкафове, импорти в процесите)
+        await client.post("/api/v1/cabinets/calculate", json=SMALL_CABINET)
+        await client.post("/api/v1/projects/calculate", json=big_payload)
+
+        return {
+            "mode": "inline" if args.inline else "executor",
+            "idle": await _phase(client, args.duration, args.small_concurrency, 0, big_payload),
+            "loaded": await _phase(client, args.duration, args.small_concurrency, args.big_concurrency, big_payload),
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--small-concurrency", type=int, default=8)
+    parser.add_argument("--big-concurrency", type=int, default=2)
+    parser.add_argument("--big-cabinets", type=int, default=50)
+    parser.add_argument("--inline", action="store_true", help="без executor (калкулации в event loop-а)")
+    parser.add_argument("--json", action="store_true", help="само JSON на изхода")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.inline)
+    try:
+        report = asyncio.run(run(args, base_url))
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print(f"режим: {report['mode']}")
+        for phase in ("idle", "loaded"):
+            for kind, stats in report[phase].items():
+                print(f"  {phase:<7} {kind:<6} {stats['requests']:>6} заявки {stats['rps']:>8} rps | "
+                      f"p50 {stats['p50_ms']:>8} ms | p95 {stats['p95_ms']:>8} ms | "
+                      f"p99 {stats['p99_ms']:>8} ms | грешки {stats['errors']}")
@@ -0,0 +1,358 @@
+"""
+Бенчмарк пакет: базова линия за производителността и сравнение с нея
+
+Покрива:
+
+    calculator.<тип>.<размер>   всеки калкулатор от cabinet_types при малки,
+                                типични и крайни размери (без кеша на двигателя)
+    project.<N>                 FurnitureEngine.calculate_project за 10, 100,
+                                1 000 и 10 000 шкафа (нов двигател за всяко
+                                измерване – кешът започва празен)
+    service.*                   разчитане на ProjectRequest и конвертиране
+                                заявка -> Cabinet и резултат -> отговор
+    json.*                      сериализация на проект от 100 шкафа (pydantic и
+                                fast_json)
+
+Всяко измерване се калибрира като timeit: извикванията в една проба са
+толкова, че пробата да е поне ~10 ms, а пробите се повтарят до --time
+секунди (поне --min-samples). Резултатът е JSON с медиана, минимум, средно
+и стандартно отклонение за едно извикване + данни за машината и версиите.
+
+compare сравнява два резултата и връща код 1, ако някой бенчмарк е
+по-бавен от базовата линия с над --threshold (по подразбиране 10%) и по
+избраната метрика, и по минимума – забавяне само на медианата е "noisy"
+(натоварена машина), а не регресия.
+
+Употреба:
+    python benchmarks/suite.py run [-o benchmarks/results/latest.json] [--filter project] [--quick]
+    python benchmarks/suite.py run -o benchmarks/baseline.json
+    python benchmarks/suite.py compare benchmarks/baseline.json benchmarks/results/latest.json [--threshold 0.1]
+    python benchmarks/suite.py list
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+# Без постоянен кеш за разкрои – иначе вторият run мери попадения в него
+os.environ.setdefault("NESTING_CACHE_PATH", "")
+# Предупрежденията на двигателя (напр. APPLIANCE без калкулатор) не са част от измерването
+logging.disable(logging.WARNING)
+
+from main import create_default_body_board, create_default_door_board, create_default_back_board
+from models import Cabinet, CabinetType, ConstructionProfile
+from cabinet_engine import FurnitureEngine, ENGINE_VERSION
+from costing import PRICING_VERSION, pricing_fingerprint
+from nesting import NESTING_VERSION
+from bench_batch import make_cabinets
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "latest.json")
+PROJECT_SIZES = (10, 100, 1_000, 10_000)
+SAMPLE_TARGET_S = 0.01
+
+
+@dataclass
+class Case:
+    """setup() връща функцията, която се мери (извиква се преди всяка проба)"""
+    name: str
+    setup: Callable[[], Callable[[], Any]]
+    fresh: bool = False   # True: setup() за всяка проба и по едно извикване (нов двигател и т.н.)
+
+
+# -------------------- СЛУЧАИ --------------------
+
+# (ширина, височина, дълбочина, рафтове, чекмеджета) по размер
+SIZES = {
+    "default": {
+        "small": (300, 720, 500, 0, 2),
+        "typical": (600, 760, 560, 1, 3),
+        "extreme": (1200, 900, 650, 4, 6),
+    },
+    CabinetType.UPPER: {
+        "small": (300, 500, 280, 0, 0),
+        "typical": (600, 720, 320, 1, 0),
+        "extreme": (1200, 1000, 400, 4, 0),
+    },
+    CabinetType.FRIDGE: {
+        "small": (450, 2000, 560, 0, 0),
+        "typical": (600, 2200, 560, 2, 0),
+        "extreme": (900, 2600, 650, 5, 0),
+    },
+}
+SIZES[CabinetType.COLUMN] = SIZES[CabinetType.FRIDGE]
+
+
+def make_cabinet(cabinet_type: CabinetType, size: str) -> Cabinet:
+    width, height, depth, shelves, drawers = SIZES.get(cabinet_type, SIZES["default"])[size]
+    construction = ConstructionProfile()
+    cabinet = Cabinet(
+        cabinet_id=f"{cabinet_type.value}_{size}",
+        type=cabinet_type,
+        width=width,
+        height=height,
+        depth=depth,
+        body_board=create_default_body_board(),
+        door_board=create_default_door_board(),
+        back_board=create_default_back_board(),
+        construction=construction,
+        shelf_count=shelves,
+        drawer_count=drawers if cabinet_type == CabinetType.DRAWER else 0,
+    )
+    if cabinet_type in (CabinetType.FRIDGE, CabinetType.COLUMN):
+        cabinet.construction = ConstructionProfile(appliance_type=cabinet_type.value)
+        cabinet.appliance_type = cabinet_type.value
+    return cabinet
+
+
+def calculator_cases() -> List[Case]:
+    engine = FurnitureEngine(cache_size=0)
+    cases = []
+    for cabinet_type, calculator in engine.calculators.items():
+        for size in ("small", "typical", "extreme"):
+            def setup(calculator=calculator, cabinet=make_cabinet(cabinet_type, size)):
+                return lambda: calculator.calculate(cabinet)
+            cases.append(Case(f"calculator.{cabinet_type.value}.{size}", setup))
+    return cases
+
+
+def project_cases(sizes) -> List[Case]:
+    cases = []
+    for count in sizes:
+        cabinets = make_cabinets(count)
+
+        def setup(cabinets=cabinets):
+            engine = FurnitureEngine()
+            return lambda: engine.calculate_project(cabinets)
+        cases.append(Case(f"project.{count}", setup, fresh=True))
+    return cases
+
+
+def _project_payload(count: int) -> Dict:
+    types = ["base", "upper", "drawer", "sink", "oven"]
+    return {
+        "project_name": "Бенчмарк",
+        "cabinets": [
+            {"type": types[i % len(types)], "width": 300 + (i % 10) * 100,
+             "height": 700 if types[i % len(types)] == "upper" else 760,
+             "depth": 320 if types[i % len(types)] == "upper" else 560}
+            for i in range(count)
+        ],
+    }
+
+
+def service_cases() -> List[Case]:
+    from app.services.calculator import FurnitureCalculatorService
+    from app.services import fast_json
+    from app.schemas.cabinet import ProjectRequest, ProjectCalculationResponse
+
+    service = FurnitureCalculatorService()
+    payload = _project_payload(100)
+    request = ProjectRequest.model_validate(payload)
+    cabinets = [service._convert_request_to_cabinet(cabinet) for cabinet in request.cabinets]
+    project = service.engine.calculate_project(cabinets)
+    results, totals = project["cabinets"], project["totals"]
+
+    def to_response():
+        responses = [service._convert_result_to_response(result) for result in results]
+        return ProjectCalculationResponse(
+            success=True, project_name=request.project_name, total_cabinets=len(responses), cabinets=responses,
+            totals=totals, project_total_cost=sum(response.total_cost_bgn for response in responses), error=None)
+
+    response = to_response()
+    return [
+        Case("service.parse_request.100", lambda: lambda: ProjectRequest.model_validate(payload)),
+        Case("service.convert_request.100",
+             lambda: lambda: [service._convert_request_to_cabinet(cabinet) for cabinet in request.cabinets]),
+        Case("service.convert_response.100", lambda: to_response),
+        Case("json.pydantic.100", lambda: lambda: response.model_dump_json()),
+        Case(f"json.fast_{fast_json.BACKEND}.100",
+             lambda: lambda: fast_json.dumps(fast_json.project_dict(request.project_name, results, totals))),
+    ]
+
+
+def all_cases(quick: bool = False) -> List[Case]:
+    sizes = [size for size in PROJECT_SIZES if not quick or size <= 1_000]
+    return calculator_cases() + project_cases(sizes) + service_cases()
+
+
+# -------------------- ИЗМЕРВАНЕ --------------------
+
+def measure(case: Case, budget_s: float, min_samples: int) -> Dict[str, Any]:
+    fn = case.setup()
+    started = time.perf_counter()
+    fn()  # загряване (и калибриране)
+    single = time.perf_counter() - started
+    inner = 1 if case.fresh else max(1, int(SAMPLE_TARGET_S / max(single, 1e-9)))
+
+    samples: List[float] = []
+    deadline = time.perf_counter() + budget_s
+    while len(samples) < min_samples or (time.perf_counter() < deadline and len(samples) < 1000):
+        if case.fresh:
+            fn = case.setup()
+        start = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        samples.append((time.perf_counter() - start) / inner)
+
+    return {
+        "median_s": statistics.median(samples),
+        "min_s": min(samples),
+        "mean_s": statistics.fmean(samples),
+        "stdev_s": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "samples": len(samples),
+        "inner": inner,
+    }
+
+
+def _package_version(name: str) -> Optional[str]:
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def machine_metadata() -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "hostname": platform.node(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "packages": {name: _package_version(name) for name in ("numpy", "pydantic", "fastapi", "orjson", "msgspec")},
+        "versions": {"engine": ENGINE_VERSION, "pricing": PRICING_VERSION, "pricing_fingerprint": pricing_fingerprint(),
+                     "nesting": NESTING_VERSION},
+    }
+
+
+def _format_time(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:8.3f} s "
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:8.3f} ms"
+    return f"{seconds * 1e6:8.1f} µs"
+
+
+def run(args) -> int:
+    pattern = re.compile(args.filter) if args.filter else None
+    cases = [case for case in all_cases(args.quick) if pattern is None or pattern.search(case.name)]
+    results = {}
+    for case in cases:
+        result = measure(case, args.time, args.min_samples)
+        results[case.name] = result
+        print(f"{case.name:<34} {_format_time(result['median_s'])}  (min {_format_time(result['min_s']).strip()}, "
+              f"±{result['stdev_s'] / result['median_s'] * 100:4.1f}%, {result['samples']}x{result['inner']})")
+
+    report = {"meta": machine_metadata(), "settings": {"time_s": args.time, "min_samples": args.min_samples},
+              "results": results}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nЗаписано в {args.output}")
+    return 0
+
+
+# -------------------- СРАВНЕНИЕ --------------------
+
+# Разлики в тези полета правят сравнението съмнително
+_COMPARABLE_META = ("machine", "processor", "cpu_count", "python", "implementation")
+
+
+def compare_reports(baseline: Dict, current: Dict, threshold: float, metric: str = "median_s") -> List[Dict]:
+    """Ред на бенчмарк: name, baseline, current, change (дял) и status"""
+    rows = []
+    base_results, current_results = baseline["results"], current["results"]
+    for name in sorted(set(base_results) | set(current_results)):
+        base, cur = base_results.get(name), current_results.get(name)
+        if base is None or cur is None:
+            rows.append({"name": name, "baseline": base and base[metric], "current": cur and cur[metric],
+                         "change": None, "status": "new" if base is None else "missing"})
+            continue
+        change = cur[metric] / base[metric] - 1
+        if change > threshold:
+            status = "REGRESSION" if cur["min_s"] / base["min_s"] - 1 > threshold else "noisy"
+        else:
+            status = "faster" if change < -threshold else "ok"
+        rows.append({"name": name, "baseline": base[metric], "current": cur[metric], "change": change,
+                     "status": status})
+    return rows
+
+
+def compare(args) -> int:
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    different = [key for key in _COMPARABLE_META if baseline["meta"].get(key) != current["meta"].get(key)]
+    if different:
+        print(f"Внимание: различна машина/интерпретатор ({', '.join(different)}) – сравнението е ориентировъчно\n")
+
+    rows = compare_reports(baseline, current, args.threshold, args.metric)
+    for row in rows:
+        base = _format_time(row["baseline"]) if row["baseline"] is not None else " " * 11
+        cur = _format_time(row["current"]) if row["current"] is not None else " " * 11
+        change = f"{row['change'] * 100:+7.1f}%" if row["change"] is not None else " " * 8
+        print(f"{row['name']:<34} {base} -> {cur} {change}  {row['status']}")
+
+    regressions = [row for row in rows if row["status"] == "REGRESSION"]
+    print(f"\n{len(regressions)} регресии над {args.threshold * 100:.0f}% "
+          f"(базова линия {baseline['meta'].get('git_commit')}, текущ {current['meta'].get('git_commit')})")
+    return 1 if regressions else 0
+
+
+def list_cases(args) -> int:
+    for case in all_cases(args.quick):
+        print(case.name)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="пуска бенчмарките и записва JSON")
+    run_parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT)
+    run_parser.add_argument("--filter", help="регулярен израз за имената")
+    run_parser.add_argument("--quick", action="store_true", help="без проекта от 10 000 шкафа")
+    run_parser.add_argument("--time", type=float, default=1.0, help="секунди проби на бенчмарк")
+    run_parser.add_argument("--min-samples", type=int, default=5)
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="сравнява резултат с базова линия")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="допустимо забавяне (0.1 = 10%%)")
+    compare_parser.add_argument("--metric", choices=("median_s", "min_s", "mean_s"), default="median_s")
+    compare_parser.set_defaults(handler=compare)
+
+    list_parser = commands.add_parser("list", help="имената на бенчмарките")
+    list_parser.add_argument("--quick", action="store_true")
+    list_parser.set_defaults(handler=list_cases)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
@@ -1,9 +1,13 @@
 """
 Основен двигател за мебелни калкулации - АКТУАЛИЗИРАН С ЦОКЪЛ
 """
-from typing import List, Dict, Optional
-from collections import defaultdict
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Dict, Iterable, Iterator, Optional
 from models import *
+from project_totals import ProjectTotals
+from nesting import NestingSettings, DEFAULT_SETTINGS as DEFAULT_NESTING, nest_project
 from cabinet_types.base_cabinet import BaseCabinetCalculator
 from cabinet_types.upper_cabinet import UpperCabinetCalculator
 from cabinet_types.drawer_cabinet import DrawerCabinetCalculator
@@ -11,12 +15,34 @@ from cabinet_types.oven_cabinet import OvenCabinetCalculator
 from cabinet_types.sink_cabinet import SinkCabinetCalculator
 from cabinet_types.blind_cabinet import BlindCabinetCalculator
 from cabinet_types.appliance_cabinet import ApplianceCabinetCalculator
+from result_cache import CalculationCache, cabinet_fingerprint
+from costing import nested_board_cost
+from tracing import span
+from metrics import REGISTRY
+from profiling import Profiler, stage
+
+logger = logging.getLogger(__name__)
+
+ENGINE_SECONDS = REGISTRY.histogram(
+    "furniture_engine_cabinet_seconds", "Време за калкулация на един шкаф (вкл. кеша) по тип",
+    ("cabinet_type",))
+
+# Увеличава се при промяна в изчисленията на шкафовете (ключ на кешовете с отговори)
+ENGINE_VERSION = 1
+
 
 class FurnitureEngine:
     """Основен двигател за мебелни калкулации"""
 
-    def __init__(self, config: Optional[ConstructionProfile] = None):
+    def __init__(self, config: Optional[ConstructionProfile] = None, cache_size: int = 1024,
+                 nesting_cache=None):
         self.config = config or ConstructionProfile()
+        # Кеш за повтарящи се шкафове (cache_size=0 го изключва)
+        self.cache = CalculationCache(cache_size) if cache_size > 0 else None
+        # Постоянен кеш за разкрои (NestingCache) – по избор
+        self.nesting_cache = nesting_cache
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._process_pool_workers = 0
         self.calculators = {
             CabinetType.BASE: BaseCabinetCalculator(),
             CabinetType.UPPER: UpperCabinetCalculator(),
@@ -29,75 +55,216 @@ class FurnitureEngine:
         }
 
     def calculate_cabinet(self, cabinet: Cabinet) -> CalculationResult:
-        """Изчислява един шкаф"""
+        """
+        Изчислява един шкаф. Еднакви шкафове се вземат от кеша; върнатият
+        резултат е copy-on-write копие и може да се променя свободно.
+        """
+        started = time.perf_counter()
+        if self.cache is None:
+            result = self._calculate_uncached(cabinet)
+        else:
+            with stage("cache"):
+                key = cabinet_fingerprint(cabinet)
+                cached = self.cache.get(key)
+                if cached is None:
+                    cached = self._calculate_uncached(cabinet)
+                    self.cache.put(key, cached)
+                result = cached.shared_copy(cabinet)
+        ENGINE_SECONDS.labels(cabinet.type.value).observe(time.perf_counter() - started)
+        return result
+
+    def _calculate_uncached(self, cabinet: Cabinet) -> CalculationResult:
         calculator = self.calculators.get(cabinet.type)
         if not calculator:
-            print(f"Warning: No calculator for {cabinet.type}, using BaseCabinet")
+            logger.warning("Няма калкулатор за %s, използва се BaseCabinet", cabinet.type)
             calculator = self.calculators[CabinetType.BASE]
-        return calculator.calculate(cabinet)
-
-    def calculate_project(self, cabinets: List[Cabinet]) -> Dict:
-        """Изчислява цял проект + totals + цокъл (plinth_length от долни шкафове)"""
-        results = []
-        total_hardware = defaultdict(int)
-        used_boards = defaultdict(int)
-        used_edges_m = defaultdict(float)
-        total_labor_cost = 0.0
-        total_material_area = defaultdict(float)
-        plinth_length = 0.0  # Обща дължина на цокъла в mm
-        total_cost_bgn = 0.0
-
-        for cabinet in cabinets:
-            result = self.calculate_cabinet(cabinet)
-            results.append(result)
+        with stage("panels", type(calculator).__name__):
+            return calculator.calculate(cabinet)
+
+    def profile(self, memory: bool = False) -> Profiler:
+        """
+        Профилер по етапи за калкулациите в with блока (profiling.py):
 
-            # Сумираме хардуер
-            for item in result.hardware:
-                total_hardware[item.name] += item.quantity
+            with engine.profile() as profiler:
+                engine.calculate_project(cabinets)
+            profiler.report()
+        """
+        return Profiler(memory)
 
-            # Сумираме дъски
-            for board_name, count in result.used_boards.items():
-                used_boards[board_name] += count
+    def calculate_batch(self, batch) -> "BatchResult":
+        """
+        Изчислява пакет от шкафове векторизирано (NumPy).
+        Приема CabinetBatch (колони с NumPy масиви) или списък с Cabinet.
+        Резултатът е идентичен с calculate_cabinet за всеки шкаф.
+        """
+        from batch_engine import CabinetBatch, calculate_batch
+        if not isinstance(batch, CabinetBatch):
+            batch = CabinetBatch.from_cabinets(batch)
+        return calculate_batch(batch)
 
-            # Сумираме кант
-            for edge_name, meters in result.used_edges_m.items():
-                used_edges_m[edge_name] += meters
+    def calculate_project(self, cabinets: List[Cabinet], workers: Optional[int] = None,
+                          chunk_size: Optional[int] = None,
+                          nesting: Optional[NestingSettings] = DEFAULT_NESTING,
+                          nesting_budget_s: float = 0.0,
+                          progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Изчислява цял проект + totals + цокъл (plinth_length от долни шкафове)
 
-            # Сумираме труд и обща цена
-            total_labor_cost += result.labor_cost
-            total_cost_bgn += result.total_cost_bgn
+        totals["used_boards"] е броят листове от разкроя на всички панели на
+        проекта (nesting.py), а не сборът от оценките по шкаф, и цената на
+        листовете в totals["total_cost_bgn"] е по него (nest_totals);
+        nesting=None връща старите суми. nesting_budget_s > 0 включва multi-start търсене
+        (nesting_optimizer.py) за толкова секунди, в workers процеса.
 
-            # Сумираме материални площи
-            for panel in result.panels:
-                area = panel.area_sqm * panel.quantity
-                total_material_area[panel.material] += area
+        workers > 1 включва паралелен режим: шкафовете се разпределят на
+        парчета (chunk_size) в ProcessPoolExecutor. Общите стойности се
+        сумират в родителския процес в реда на шкафовете, затова резултатът
+        е побитово еднакъв със серийния.
 
-            # Сумираме цокъл (само от долни шкафове)
-            if cabinet.type in [CabinetType.BASE, CabinetType.SINK, CabinetType.OVEN, CabinetType.DRAWER, CabinetType.BLIND, CabinetType.APPLIANCE, CabinetType.FRIDGE]:
-                plinth_length += cabinet.width
+        progress(готови, общо) се вика след всеки шкаф (след всяко парче в
+        паралелен режим). Изключение от него прекъсва изчислението.
+        """
+        if workers and workers > 1 and len(cabinets) > 1:
+            with stage("parallel"):
+                results = self._calculate_parallel(cabinets, workers, chunk_size, progress)
+        else:
+            results = []
+            for cabinet in cabinets:
+                results.append(self.calculate_cabinet(cabinet))
+                if progress is not None:
+                    progress(len(results), len(cabinets))
+
+        with stage("totals"):
+            totals = ProjectTotals()
+            for result in results:
+                totals.add(result)
+
+        # Разкрой преди добавянето на общия цокъл – той не се реже от лист
+        project_totals = self.nest_totals(totals, results, nesting, nesting_budget_s, workers)
 
         # Опционално: добавяме общ цокъл като Panel в първия резултат
-        if plinth_length > 0 and results:
-            plinth_panel = Panel(
-                name="Общ цокъл",
-                width_mm=int(plinth_length),
-                height_mm=150,
-                material=MaterialType.PLINTH,
-                edge_front=1.0,
-                quantity=1,
-                area_sqm=(plinth_length * 150) / 1_000_000
-            )
-            results[0].add_panel(plinth_panel)
+        with stage("totals"):
+            plinth_panel = totals.plinth_panel()
+            if plinth_panel and results:
+                results[0].add_panel(plinth_panel)
 
         return {
             "cabinets": results,
-            "totals": {
-                "hardware": total_hardware,
-                "used_boards": used_boards,
-                "used_edges_m": used_edges_m,
-                "total_labor_cost": total_labor_cost,
-                "material_area": total_material_area,
-                "plinth_length": plinth_length,
-                "total_cost_bgn": total_cost_bgn
-            }
+            "totals": project_totals
         }
+
+    def nest_totals(self, totals: ProjectTotals, results: List[CalculationResult],
+                    nesting: Optional[NestingSettings] = DEFAULT_NESTING, nesting_budget_s: float = 0.0,
+                    workers: Optional[int] = None) -> Dict:
+        """
+        Речникът "totals" на проекта. С nesting used_boards е броят листове
+        от разкроя на всички панели, а цената на листовете в total_cost_bgn
+        (board_cost_bgn) е по този брой вместо сбора от оценките по шкаф.
+        """
+        project_totals = totals.to_dict()
+        if nesting is None or not results:
+            return project_totals
+
+        with span("nesting"), stage("nesting"):
+            if nesting_budget_s > 0:
+                from nesting_optimizer import optimize_project
+                project_nesting, optimized = optimize_project(results, nesting_budget_s, nesting, workers or 1,
+                                                              self.nesting_cache)
+                project_totals["nesting"] = [result.summary() for result in optimized]
+            else:
+                project_nesting = nest_project(results, nesting, self.nesting_cache)
+                project_totals["nesting"] = project_nesting.summary()
+        board_cost = nested_board_cost(project_nesting.layouts)
+        project_totals["used_boards"] = project_nesting.used_boards()
+        project_totals["board_cost_bgn"] = board_cost
+        project_totals["total_cost_bgn"] = totals.total_cost_bgn - totals.board_cost_bgn + board_cost
+        return project_totals
+
+    def iter_project(self, cabinets: Iterable[Cabinet],
+                     nesting: Optional[NestingSettings] = None) -> Iterator[Dict]:
+        """
+        Поточно изчисление на проект. Генерира събития по реда на шкафовете:
+
+            {"event": "cabinet", "index": i, "result": CalculationResult, "totals": {...}}
+            {"event": "plinth", "panel": Panel}           (само ако има долни шкафове)
+            {"event": "summary", "totals": {...}}
+
+        "totals" при шкафовете е моментно копие на натрупаните суми до този
+        шкаф (листовете са оценките по шкаф). По подразбиране резултатите не се
+        пазят и паметта не расте с броя на шкафовете – cabinets може да е и
+        генератор. Със зададено nesting сумите в "summary" съвпадат с
+        calculate_project – с разкроя на листовете (nest_totals), затова тогава
+        резултатите се пазят до края.
+        """
+        totals = ProjectTotals()
+        results: List[CalculationResult] = []
+        for index, cabinet in enumerate(cabinets):
+            result = self.calculate_cabinet(cabinet)
+            totals.add(result)
+            if nesting is not None:
+                results.append(result)
+            yield {
+                "event": "cabinet",
+                "index": index,
+                "result": result,
+                "totals": totals.snapshot()
+            }
+
+        plinth_panel = totals.plinth_panel()
+        if plinth_panel:
+            yield {"event": "plinth", "panel": plinth_panel}
+
+        summary = totals.snapshot()
+        if results:
+            nested = self.nest_totals(totals, results, nesting)
+            for key in ("used_boards", "board_cost_bgn", "total_cost_bgn", "nesting"):
+                summary[key] = nested[key]
+        yield {"event": "summary", "totals": summary}
+
+    # -------------------- ПАРАЛЕЛЕН РЕЖИМ --------------------
+
+    def _calculate_parallel(self, cabinets: List[Cabinet], workers: int,
+                            chunk_size: Optional[int],
+                            progress: Optional[Callable[[int, int], None]] = None) -> List[CalculationResult]:
+        if not chunk_size:
+            # ~4 парчета на процес – баланс между натоварване и брой pickle-и
+            chunk_size = max(1, -(-len(cabinets) // (workers * 4)))
+        chunks = [cabinets[i:i + chunk_size] for i in range(0, len(cabinets), chunk_size)]
+
+        results: List[CalculationResult] = []
+        for chunk, chunk_results in zip(chunks, self._get_process_pool(workers).map(_calculate_chunk, chunks)):
+            # Работникът не връща шкафа обратно – закачаме оригиналния
+            for cabinet, result in zip(chunk, chunk_results):
+                result.cabinet = cabinet
+                results.append(result)
+            if progress is not None:
+                progress(len(results), len(cabinets))
+        return results
+
+    def _get_process_pool(self, workers: int) -> ProcessPoolExecutor:
+        if self._process_pool is None or self._process_pool_workers != workers:
+            self.close()
+            self._process_pool = ProcessPoolExecutor(max_workers=workers)
+            self._process_pool_workers = workers
+        return self._process_pool
+
+    def close(self):
+        """Спира процесите на паралелния режим (ако има такива)"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+            self._process_pool_workers = 0
+
+
+# Всеки работен процес пази собствен двигател (и кеш) между парчетата
+_worker_engine: Optional[FurnitureEngine] = None
+
+
+def _calculate_chunk(cabinets: List[Cabinet]) -> List[CalculationResult]:
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = FurnitureEngine()
+    results = [_worker_engine.calculate_cabinet(cabinet) for cabinet in cabinets]
+    for result in results:
+        result.cabinet = None  # родителят има шкафа – не го пращаме обратно
+    return results
@@ -27,9 +27,7 @@ class ApplianceCabinetCalculator(CabinetCalculator):
         result = BaseCabinetCalculator.calculate(cabinet)
         
         # Премахваме стабилизаторите (за fridge/column не трябва)
-        stabilizers = [p for p in result.panels if "Стабилизатор" in p.name]
-        for stabilizer in stabilizers:
-            result.panels.remove(stabilizer)
+        result.remove_panels(lambda name: "Стабилизатор" in name)
         
         # Добавяме капак (идентичен с дъното)
         bottom_panels = [p for p in result.panels if "Дъно" in p.name]
@@ -53,9 +51,7 @@ class ApplianceCabinetCalculator(CabinetCalculator):
         # Голяма врата: 1797мм × (ширина/2 + 50) = 4 панти
         
         # Премахваме старите врати от BaseCabinet
-        old_doors = [p for p in result.panels if "Врата" in p.name]
-        for door in old_doors:
-            result.panels.remove(door)
+        result.remove_panels(lambda name: "Врата" in name)
         
         # Изчисляване на размери за вратите
         gap = 3  # фуга на вратите мм
@@ -5,6 +5,8 @@
 from typing import List, Dict
 from cabinet_types.cabinet_calculator import CabinetCalculator
 from models import *
+from profiling import stage
+from costing import calculate_materials_and_costs, BASE_COSTS
 
 
 class BaseCabinetCalculator(CabinetCalculator):
@@ -13,7 +15,6 @@ class BaseCabinetCalculator(CabinetCalculator):
         """Изчислява долен шкаф"""
         result = CalculationResult(
             cabinet=cabinet,
-            panels=[],
             hardware=[],
             used_boards={},
             used_edges_m={},
@@ -135,120 +136,43 @@ class BaseCabinetCalculator(CabinetCalculator):
             result.add_panel(door)
         
         # === ХАРДУЕР ===
-        # Крака за долни шкафове
-        leg_count = 4
-        if cabinet.width <= 600:
+        with stage("hardware"):
+            # Крака за долни шкафове
             leg_count = 4
-        elif cabinet.width <= 1000:
-            leg_count = 6
-        else:
-            leg_count = 8
+            if cabinet.width <= 600:
+                leg_count = 4
+            elif cabinet.width <= 1000:
+                leg_count = 6
+            else:
+                leg_count = 8
             
-        result.add_hardware(HardwareItem(
-            name="Краче за долен шкаф",
-            quantity=leg_count,
-            notes="100мм"
-        ))
-        
-        result.add_hardware(HardwareItem(
-            name="Щипка за краче",
-            quantity=leg_count // 2
-        ))
+            result.add_hardware(HardwareItem(
+                name="Краче за долен шкаф",
+                quantity=leg_count,
+                notes="100мм"
+            ))
         
-        # Панти за врати
-        hinges_per_door = 3 if cabinet.height > 600 else 2
-        total_hinges = door_count * hinges_per_door
-        result.add_hardware(HardwareItem(
-            name="Панта",
-            quantity=total_hinges
-        ))
+            result.add_hardware(HardwareItem(
+                name="Щипка за краче",
+                quantity=leg_count // 2
+            ))
         
-        # Рафтодържатели
-        if cabinet.shelf_count > 0:
+            # Панти за врати
+            hinges_per_door = 3 if cabinet.height > 600 else 2
+            total_hinges = door_count * hinges_per_door
             result.add_hardware(HardwareItem(
-                name="Рафтодържател",
-                quantity=cabinet.shelf_count * 4  # по 4 на рафт
+                name="Панта",
+                quantity=total_hinges
             ))
         
+            # Рафтодържатели
+            if cabinet.shelf_count > 0:
+                result.add_hardware(HardwareItem(
+                    name="Рафтодържател",
+                    quantity=cabinet.shelf_count * 4  # по 4 на рафт
+                ))
+        
         # === РАЗЧИТАНЕ НА МАТЕРИАЛИ И ЦЕНИ ===
-        BaseCabinetCalculator._calculate_materials_and_costs(result)
+        calculate_materials_and_costs(result, BASE_COSTS)
         
         return result
-    
-    @staticmethod
-    def _calculate_materials_and_costs(result: CalculationResult):
-        """Изчислява използваните материали и разходи"""
-        
-        # Изчисляване на използвани дъски
-        board_usage = {}
-        for panel in result.panels:
-            board_name = f"{panel.material.value}_{18}мм"  # стандартна дебелина
-            board_area = (panel.width_mm * panel.height_mm * panel.quantity) / 1_000_000  # м²
-            
-            if board_name not in board_usage:
-                board_usage[board_name] = 0
-            board_usage[board_name] += board_area
-        
-        # Преобразуване в брой листове (стандартен лист 2800x2070мм = 5.796м²)
-        standard_sheet_area = 2.8 * 2.07
-        for board_name, area in board_usage.items():
-            sheets_needed = (area / standard_sheet_area) + 0.1  # 10% резерв
-            result.used_boards[board_name] = int(sheets_needed) + 1
-        
-        # Изчисляване на кант
-        edge_usage = {}
-        for panel in result.panels:
-            edges = [
-                ("front", panel.width_mm, panel.edge_front),
-                ("back", panel.width_mm, panel.edge_back),
-                ("left", panel.height_mm, panel.edge_left),
-                ("right", panel.height_mm, panel.edge_right)
-            ]
-            
-            for edge_name, length, thickness in edges:
-                if thickness:
-                    edge_key = f"кант_{thickness}мм"
-                    if edge_key not in edge_usage:
-                        edge_usage[edge_key] = 0
-                    edge_usage[edge_key] += (length * panel.quantity) / 1000  # в метри
-        
-        # Добавяне на кант към резултата
-        result.used_edges_m = edge_usage
-        
-        # Цена на труд (базови ставки)
-        labor_rates = {
-            "assembly": 25.0,  # лв/час
-            "hardware": 8.0,   # лв/час
-            "edge": 12.0       # лв/час
-        }
-        
-        # Приблизително време за монтаж
-        assembly_time = 0.5 + (len(result.panels) * 0.1)  # часове
-        hardware_time = len(result.hardware) * 0.05  # часове
-        edge_time = sum(edge_usage.values()) * 0.02  # часове
-        
-        result.labor_cost = (
-            assembly_time * labor_rates["assembly"] +
-            hardware_time * labor_rates["hardware"] +
-            edge_time * labor_rates["edge"]
-        )
-        
-        # Инсталация
-        result.installation_cost = 35.0  # фиксирана цена за стандартен монтаж
-        
-        # Обща цена
-        board_cost = 0
-        for board_name, sheets in result.used_boards.items():
-            # Приблизителни цени
-            if "body" in board_name:
-                board_cost += sheets * 120
-            elif "door" in board_name:
-                board_cost += sheets * 180
-            elif "back" in board_name:
-                board_cost += sheets * 45
-            elif "plinth" in board_name:
-                board_cost += sheets * 100
-        
-        edge_cost = sum(edge_usage.values()) * 15  # 15лв/м за кант
-        
-        result.total_cost_bgn = board_cost + edge_cost + result.labor_cost + result.installation_cost
\ No newline at end of file
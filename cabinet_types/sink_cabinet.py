@@ -13,9 +13,7 @@ class SinkCabinetCalculator(CabinetCalculator):
         result = BaseCabinetCalculator.calculate(cabinet)
 
         # Премахваме старите стабилизатори
-        old_stabs = [p for p in result.panels if "Стабилизатор" in p.name]
-        for p in old_stabs:
-            result.panels.remove(p)
+        result.remove_panels(lambda name: "Стабилизатор" in name)
 
         # Добавяме нови – винаги 3
         t = 18  # дебелина на материала мм (като в base_cabinet)
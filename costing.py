@@ -0,0 +1,158 @@
+"""
+Общ модул за разчитане на материали и цени (costing kernel)
+
+Заменя четирите копия на _calculate_materials_and_costs в cabinet_types/.
+Разликите между типовете шкафове са само в коефициентите (CostCoefficients),
+а сметката за листове, кант и труд се прави с едно обхождане на панелите.
+"""
+import hashlib
+from dataclasses import dataclass, field
+from typing import Dict
+
+from models import *
+from tracing import span
+from profiling import stage
+
+
+# -------------------- КОЕФИЦИЕНТИ --------------------
+
+STANDARD_SHEET_AREA = 2.8 * 2.07   # стандартен лист 2800x2070мм = 5.796м²
+SHEET_RESERVE = 0.1                # 10% резерв
+EDGE_PRICE_PER_M = 15              # 15лв/м за кант
+
+LABOR_RATES = {
+    "assembly": 25.0,  # лв/час
+    "hardware": 8.0,   # лв/час
+    "edge": 12.0       # лв/час
+}
+HARDWARE_TIME_PER_ITEM = 0.05   # часове
+EDGE_TIME_PER_M = 0.02          # часове
+
+
+@dataclass(frozen=True)
+class CostCoefficients:
+    """Коефициенти за цена на един тип шкаф"""
+    assembly_base: float          # часове за монтаж
+    assembly_per_panel: float     # часове за всеки панел
+    installation_fee: float       # фиксирана цена за инсталация
+    board_prices: Dict[MaterialType, int] = field(default_factory=lambda: {
+        MaterialType.BODY: 120,
+        MaterialType.DOOR: 180,
+        MaterialType.BACK: 45,
+    })
+
+
+BASE_COSTS = CostCoefficients(0.5, 0.1, 35.0, {
+    MaterialType.BODY: 120,
+    MaterialType.DOOR: 180,
+    MaterialType.BACK: 45,
+    MaterialType.PLINTH: 100,
+})
+UPPER_COSTS = CostCoefficients(0.4, 0.08, 25.0)     # горен шкаф
+DRAWER_COSTS = CostCoefficients(0.6, 0.12, 30.0)    # чекмеджетата са по-сложни
+OVEN_COSTS = CostCoefficients(0.8, 0.15, 50.0)      # фурните изискват по-прецизен монтаж
+
+# Коефициентите по тип шкаф (за pricing_fingerprint); типовете без собствен
+# калкулатор за цени използват BaseCabinetCalculator
+COST_TABLES: Dict[CabinetType, CostCoefficients] = {
+    CabinetType.BASE: BASE_COSTS,
+    CabinetType.UPPER: UPPER_COSTS,
+    CabinetType.DRAWER: DRAWER_COSTS,
+    CabinetType.OVEN: OVEN_COSTS,
+    CabinetType.SINK: BASE_COSTS,
+    CabinetType.BLIND: BASE_COSTS,
+    CabinetType.APPLIANCE: BASE_COSTS,
+    CabinetType.FRIDGE: BASE_COSTS,
+    CabinetType.COLUMN: BASE_COSTS,
+}
+
+# Увеличава се при промяна в самата сметка (таблиците по-горе влизат в
+# pricing_fingerprint автоматично)
+PRICING_VERSION = 2
+
+
+def pricing_fingerprint() -> str:
+    """Отпечатък на цените и коефициентите – за ключове на кешове с резултати"""
+    tables = (
+        PRICING_VERSION, STANDARD_SHEET_AREA, SHEET_RESERVE, EDGE_PRICE_PER_M,
+        sorted(LABOR_RATES.items()), HARDWARE_TIME_PER_ITEM, EDGE_TIME_PER_M,
+        sorted((cabinet_type.value, coefficients.assembly_base, coefficients.assembly_per_panel,
+                coefficients.installation_fee,
+                sorted((material.value, price) for material, price in coefficients.board_prices.items()))
+               for cabinet_type, coefficients in COST_TABLES.items()),
+    )
+    return hashlib.sha256(repr(tables).encode()).hexdigest()[:16]
+
+
+# Имената на листовете и кантовете се строят веднъж, а не за всеки панел
+BOARD_NAMES: Dict[MaterialType, str] = {m: f"{m.value}_{18}мм" for m in MaterialType}  # стандартна дебелина
+_EDGE_NAMES: Dict[float, str] = {}
+
+
+def edge_name(thickness: float) -> str:
+    """Ключ за кант в used_edges_m, напр. 'кант_1.0мм'"""
+    name = _EDGE_NAMES.get(thickness)
+    if name is None:
+        name = _EDGE_NAMES[thickness] = f"кант_{thickness}мм"
+    return name
+
+
+# -------------------- СМЕТКА --------------------
+
+def calculate_materials_and_costs(result: CalculationResult, coefficients: CostCoefficients):
+    """Изчислява използваните материали и разходи за един шкаф"""
+    with span("cost"), stage("cost"):
+        _materials_and_costs(result, coefficients)
+
+
+def _materials_and_costs(result: CalculationResult, coefficients: CostCoefficients):
+    board_usage: Dict[int, float] = {}   # код на материал -> м²
+    edge_usage: Dict[int, float] = {}    # код на кант -> метри
+
+    # Едно обхождане на колоните на PanelTable: площ по материал и кант по дебелина
+    table = result.panel_table
+    for material, width, height, quantity, edges in zip(
+            table.material, table.width_mm, table.height_mm, table.quantity, table.edges):
+        board_usage[material] = board_usage.get(material, 0) + (width * height * quantity) / 1_000_000  # м²
+
+        if edges:
+            for length, edge in zip((width, width, height, height), unpack_edges(edges)):
+                if edge:
+                    edge_usage[edge] = edge_usage.get(edge, 0) + (length * quantity) / 1000  # в метри
+
+    # Преобразуване в брой листове
+    board_cost = 0
+    for code, area in board_usage.items():
+        material = MATERIAL_TYPES[code]
+        sheets = int((area / STANDARD_SHEET_AREA) + SHEET_RESERVE) + 1
+        result.used_boards[BOARD_NAMES[material]] = sheets
+        board_cost += sheets * coefficients.board_prices.get(material, 0)
+
+    result.board_cost_bgn = float(board_cost)
+    result.used_edges_m = {edge_name(decode_edge(code)): meters for code, meters in edge_usage.items()}
+    edge_total = sum(edge_usage.values())
+
+    # Приблизително време за монтаж
+    assembly_time = coefficients.assembly_base + (len(table) * coefficients.assembly_per_panel)
+    hardware_time = len(result.hardware) * HARDWARE_TIME_PER_ITEM
+    edge_time = edge_total * EDGE_TIME_PER_M
+
+    result.labor_cost = (
+        assembly_time * LABOR_RATES["assembly"] +
+        hardware_time * LABOR_RATES["hardware"] +
+        edge_time * LABOR_RATES["edge"]
+    )
+    result.installation_cost = coefficients.installation_fee
+
+    edge_cost = edge_total * EDGE_PRICE_PER_M
+    result.total_cost_bgn = board_cost + edge_cost + result.labor_cost + result.installation_cost
+
+
+def nested_board_cost(layouts) -> float:
+    """
+    Цена на листовете от разкроя на проект (NestingLayout-и) по ценоразписа
+    на BASE_COSTS – единственият с цена и за цокъл. Заменя сбора от
+    board_cost_bgn на шкафовете в общата цена на проекта.
+    """
+    return float(sum(layout.sheet_count * BASE_COSTS.board_prices.get(layout.spec.material, 0)
+                     for layout in layouts))
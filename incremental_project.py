@@ -0,0 +1,157 @@
+"""
+Инкрементален модел на проект
+
+В редактора дизайнерът променя един шкаф, а не целия проект. IncrementalProject
+пази резултата на всеки шкаф и натрупаните суми (ProjectTotals) и прилага
+промените (добавяне, премахване, обновяване) като изважда стария принос на
+шкафа и добавя новия. Цената на една промяна зависи от броя променени шкафове,
+а не от размера на проекта.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models import *
+from project_totals import ProjectTotals
+
+
+class IncrementalProject:
+    """Проект с резултати по шкаф и адитивни общи стойности"""
+
+    # След толкова промени сумите се преизчисляват наново, за да не се
+    # натрупва грешка от float изваждането
+    REBUILD_EVERY = 10_000
+
+    def __init__(self, engine, cabinets: Iterable[Cabinet] = ()):
+        self.engine = engine
+        self.results: Dict[str, CalculationResult] = {}   # ключ -> резултат, в реда на добавяне
+        self.totals = ProjectTotals()
+        self._changes = 0
+        self._project_totals: Optional[Dict] = None   # nest_totals до следващата промяна
+        for cabinet in cabinets:
+            self.add(cabinet)
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.results
+
+    # -------------------- ПРОМЕНИ --------------------
+
+    def add(self, cabinet: Cabinet, key: Optional[str] = None) -> str:
+        """
+        Добавя шкаф и връща ключа му. По подразбиране ключът е cabinet_id;
+        при повторение се добавя суфикс (_2, _3, ...).
+        """
+        key = self._unique_key(key or cabinet.cabinet_id)
+        cabinet.cabinet_id = key   # cabinet_id не влиза в отпечатъка за кеша
+        result = self.engine.calculate_cabinet(cabinet)
+        self.results[key] = result
+        self.totals.add(result)
+        self._changed()
+        return key
+
+    def remove(self, key: str) -> CalculationResult:
+        """Премахва шкаф и връща стария му резултат"""
+        result = self.results.pop(key, None)
+        if result is None:
+            raise KeyError(f"Шкаф '{key}' не е в проекта")
+        if self.results:
+            self.totals.remove(result)
+            self._changed()
+        else:
+            # Празен проект – нулите са точни, без остатък от изважданията
+            self.totals = ProjectTotals()
+            self._project_totals = None
+        return result
+
+    def update(self, key: str, cabinet: Cabinet) -> CalculationResult:
+        """Заменя шкафа с ключ key (напр. нова ширина) и връща новия резултат"""
+        old = self.results.get(key)
+        if old is None:
+            raise KeyError(f"Шкаф '{key}' не е в проекта")
+        cabinet.cabinet_id = key
+        result = self.engine.calculate_cabinet(cabinet)
+        self.totals.remove(old)
+        self.totals.add(result)
+        self.results[key] = result   # запазва мястото на шкафа в проекта
+        self._changed()
+        return result
+
+    def apply(self, add: Iterable[Cabinet] = (), remove: Iterable[str] = (),
+              update: Iterable[Tuple[str, Cabinet]] = ()) -> Dict[str, Optional[CalculationResult]]:
+        """
+        Прилага пакет от промени в реда remove, update, add.
+        Връща променените ключове -> нов резултат (None за премахнатите).
+        Ключовете се проверяват предварително – при грешка нищо не се променя.
+        """
+        remove, update, add = list(dict.fromkeys(remove)), list(update), list(add)
+        removed = set(remove)
+        for key in [*remove, *(key for key, _ in update)]:
+            if key not in self.results:
+                raise KeyError(f"Шкаф '{key}' не е в проекта")
+        for key, _ in update:
+            if key in removed:
+                raise KeyError(f"Шкаф '{key}' е едновременно премахнат и променен")
+
+        changed: Dict[str, Optional[CalculationResult]] = {}
+        for key in remove:
+            self.remove(key)
+            changed[key] = None
+        for key, cabinet in update:
+            changed[key] = self.update(key, cabinet)
+        for cabinet in add:
+            key = self.add(cabinet)
+            changed[key] = self.results[key]
+        return changed
+
+    # -------------------- РЕЗУЛТАТ --------------------
+
+    def rebuild(self):
+        """Пресмята сумите наново от пазените резултати (O(n))"""
+        self.totals = ProjectTotals()
+        for result in self.results.values():
+            self.totals.add(result)
+        self._changes = 0
+        self._project_totals = None
+
+    def project_totals(self, nested: bool = True) -> Dict:
+        """
+        Общите стойности като в calculate_project – с разкроя на листовете
+        (FurnitureEngine.nest_totals). Разкроят обхожда целия проект, затова
+        се пази до следващата промяна. С nested=False се връщат натрупаните
+        суми (листовете са оценките по шкаф) – O(1), без разкрой.
+        """
+        if not nested:
+            return {key: dict(value) if isinstance(value, dict) else value
+                    for key, value in self.totals.to_dict().items()}
+        if self._project_totals is None:
+            self._project_totals = self.engine.nest_totals(self.totals, list(self.results.values()))
+        return self._project_totals
+
+    def to_project(self) -> Dict:
+        """
+        Същият формат като FurnitureEngine.calculate_project. Общият цокъл се
+        добавя към копие на първия резултат – пазените резултати не се променят.
+        """
+        results: List[CalculationResult] = [result.shared_copy() for result in self.results.values()]
+        plinth_panel = self.totals.plinth_panel()
+        if plinth_panel and results:
+            results[0].add_panel(plinth_panel)
+        return {
+            "cabinets": results,
+            "totals": self.project_totals()
+        }
+
+    def _unique_key(self, key: str) -> str:
+        if key not in self.results:
+            return key
+        n = 2
+        while f"{key}_{n}" in self.results:
+            n += 1
+        return f"{key}_{n}"
+
+    def _changed(self):
+        self._project_totals = None
+        self._changes += 1
+        if self._changes >= self.REBUILD_EVERY:
+            self.rebuild()
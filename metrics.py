@@ -0,0 +1,236 @@
+"""
+Метрики в процеса (Prometheus text exposition format 0.0.4)
+
+Регистърът държи броячи, gauge-ове и хистограми с етикети:
+
+    ENGINE_SECONDS = REGISTRY.histogram("furniture_engine_cabinet_seconds", "...", ("cabinet_type",))
+    ENGINE_SECONDS.labels("base").observe(0.0004)
+
+Записът е евтин, за да остане включен в production: labels() е едно
+търсене в речник (дъщерният обект се създава под заключване само първия
+път), а observe() е bisect + увеличаване под собствена, почти винаги
+свободна ключалка на дъщерния обект (< 1 µs).
+
+Имената на броячите завършват на _total (по конвенцията на Prometheus).
+
+Стойностите, които вече се броят другаде (кешове, опашки на пуловете),
+не се дублират – REGISTRY.callback(...) ги чете при всяко /metrics.
+
+Регистърът е на процес: времената от пула с процеси и от фоновите задачи
+не влизат в него, а при няколко uvicorn worker-а всеки има свой.
+"""
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Времена в секунди – от под милисекунда (един шкаф от кеша) до голям проект
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Samples = Iterable[Tuple[Tuple[str, ...], float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: очакват се етикети {self.labelnames}, получени {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name}{_labels_text(self.labelnames, values)} {_number(child.value)}"
+                                for values, child in sorted(self._children.items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name}{_labels_text(self.labelnames, values)} {_number(child.value)}"
+                                for values, child in sorted(self._children.items())]
+
+
+class _HistogramChild:
+    __slots__ = ("upper", "counts", "sum", "lock")
+
+    def __init__(self, upper: Tuple[float, ...]):
+        self.upper = upper
+        self.counts = [0] * (len(upper) + 1)   # последната кошница е +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.upper, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        names = self.labelnames + ("le",)
+        for values, child in sorted(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels_text(names, values + (_number(bound),))} {cumulative}")
+            labels = _labels_text(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """Стойности, прочетени при /metrics от fn() -> [(етикети, стойност), ...]"""
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str], fn: Callable[[], Samples]):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in self.fn():
+            lines.append(f"{self.name}{_labels_text(self.labelnames, values)} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Повторен import (напр. app.* и тестове) връща същата метрика
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Метриката {metric.name} вече е регистрирана с друг тип или етикети")
+                if isinstance(metric, CallbackMetric):
+                    existing.fn = metric.fn
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def callback(self, name: str, help: str, fn: Callable[[], Samples], labelnames: Sequence[str] = (),
+                 kind: str = "gauge") -> CallbackMetric:
+        return self._register(CallbackMetric(name, help, kind, labelnames, fn))
+
+    def get(self, name: str) -> Optional[object]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # Счупен callback не бива да сваля целия /metrics
+                lines.append(f"# {metric.name}: {type(e).__name__}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
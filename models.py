@@ -1,6 +1,9 @@
+import sys
+from array import array
+from collections.abc import MutableSequence
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 
 
 # -------------------- ВАЛУТА --------------------
@@ -179,6 +182,283 @@ class Panel:
     area_sqm: float = 0.0
 
 
+# -------------------- ТАБЛИЦА С ПАНЕЛИ --------------------
+# Колонно (struct-of-arrays) представяне на панелите на един шкаф.
+# Вместо списък от Panel обекти (по един heap обект с девет атрибута за всеки
+# панел) PanelTable държи типизирани масиви (array.array) за размери, брой,
+# код на материал и кодове на кантове, а имената са индекси в общата
+# таблица с интернирани низове PANEL_NAMES.
+
+MATERIAL_TYPES: Tuple[MaterialType, ...] = tuple(MaterialType)
+MATERIAL_CODES: Dict[MaterialType, int] = {m: i for i, m in enumerate(MATERIAL_TYPES)}
+
+# Общ интерниран речник с имена на панели (имената се повтарят във всички шкафове)
+PANEL_NAMES: List[str] = []
+_PANEL_NAME_CODES: Dict[str, int] = {}
+
+
+def panel_name_code(name: str) -> int:
+    code = _PANEL_NAME_CODES.get(name)
+    if code is None:
+        code = _PANEL_NAME_CODES[name] = len(PANEL_NAMES)
+        PANEL_NAMES.append(sys.intern(name))
+    return code
+
+
+# Дебелините на кант се интернират като имената: кодът е индекс в общия
+# списък EDGE_THICKNESSES (0 = без кант), така стойността се пази точно.
+# Четирите канта на панела се пакетират в едно число по EDGE_BITS бита:
+# front | back << 16 | left << 32 | right << 48
+EDGE_BITS = 16
+EDGE_MASK = (1 << EDGE_BITS) - 1
+EDGE_THICKNESSES: List[Optional[float]] = [None]
+_EDGE_CODES: Dict[float, int] = {}
+
+
+def encode_edge(thickness: Optional[float]) -> int:
+    if not thickness:
+        return 0
+    code = _EDGE_CODES.get(thickness)
+    if code is None:
+        code = len(EDGE_THICKNESSES)
+        if code > EDGE_MASK:
+            raise ValueError(f"Твърде много различни дебелини на кант (до {EDGE_MASK})")
+        _EDGE_CODES[thickness] = code
+        EDGE_THICKNESSES.append(thickness)
+    return code
+
+
+def decode_edge(code: int) -> Optional[float]:
+    return EDGE_THICKNESSES[code]
+
+
+def pack_edges(front: Optional[float], back: Optional[float],
+               left: Optional[float], right: Optional[float]) -> int:
+    return (encode_edge(front) | encode_edge(back) << EDGE_BITS |
+            encode_edge(left) << 2 * EDGE_BITS | encode_edge(right) << 3 * EDGE_BITS)
+
+
+def unpack_edges(packed: int) -> Tuple[int, int, int, int]:
+    """Кодовете на кантовете (front, back, left, right)"""
+    return (packed & EDGE_MASK, packed >> EDGE_BITS & EDGE_MASK,
+            packed >> 2 * EDGE_BITS & EDGE_MASK, packed >> 3 * EDGE_BITS & EDGE_MASK)
+
+
+class PanelTable:
+    """Таблица с панели – по един типизиран масив за всяка колона"""
+
+    __slots__ = ("name", "width_mm", "height_mm", "material", "edges", "quantity", "area_sqm")
+
+    COLUMNS = __slots__
+
+    def __init__(self):
+        self.name = array("H")           # индекс в PANEL_NAMES
+        self.width_mm = array("q")
+        self.height_mm = array("q")
+        self.material = array("B")       # индекс в MATERIAL_TYPES
+        self.edges = array("Q")          # pack_edges
+        self.quantity = array("q")
+        self.area_sqm = array("d")
+
+    # -------------------- ДОБАВЯНЕ --------------------
+
+    def append(self, name: str, width_mm: int, height_mm: int, material: MaterialType,
+               edge_front: Optional[float] = None, edge_back: Optional[float] = None,
+               edge_left: Optional[float] = None, edge_right: Optional[float] = None,
+               quantity: int = 1, area_sqm: float = 0.0):
+        """Добавя ред без да създава Panel обект"""
+        self.name.append(panel_name_code(name))
+        self.width_mm.append(width_mm)
+        self.height_mm.append(height_mm)
+        self.material.append(MATERIAL_CODES[material])
+        self.edges.append(pack_edges(edge_front, edge_back, edge_left, edge_right))
+        self.quantity.append(quantity)
+        self.area_sqm.append(area_sqm)
+
+    def append_panel(self, panel: Panel):
+        self.append(panel.name, panel.width_mm, panel.height_mm, panel.material,
+                    panel.edge_front, panel.edge_back, panel.edge_left, panel.edge_right,
+                    panel.quantity, panel.area_sqm)
+
+    @classmethod
+    def from_panels(cls, panels: Iterable[Panel]) -> "PanelTable":
+        table = cls()
+        for panel in panels:
+            table.append_panel(panel)
+        return table
+
+    # -------------------- ДОСТЪП --------------------
+
+    def __len__(self) -> int:
+        return len(self.name)
+
+    def panel(self, index: int) -> Panel:
+        """Материализира ред index като Panel (копие, не изглед)"""
+        front, back, left, right = unpack_edges(self.edges[index])
+        return Panel(
+            name=PANEL_NAMES[self.name[index]],
+            width_mm=self.width_mm[index],
+            height_mm=self.height_mm[index],
+            material=MATERIAL_TYPES[self.material[index]],
+            edge_front=decode_edge(front),
+            edge_back=decode_edge(back),
+            edge_left=decode_edge(left),
+            edge_right=decode_edge(right),
+            quantity=self.quantity[index],
+            area_sqm=self.area_sqm[index],
+        )
+
+    def _row_values(self, panel: Panel) -> Tuple:
+        return (panel_name_code(panel.name), panel.width_mm, panel.height_mm, MATERIAL_CODES[panel.material],
+                pack_edges(panel.edge_front, panel.edge_back, panel.edge_left, panel.edge_right),
+                panel.quantity, panel.area_sqm)
+
+    def set_panel(self, index: int, panel: Panel):
+        for column, value in zip(self.COLUMNS, self._row_values(panel)):
+            getattr(self, column)[index] = value
+
+    def insert_panel(self, index: int, panel: Panel):
+        for column, value in zip(self.COLUMNS, self._row_values(panel)):
+            getattr(self, column).insert(index, value)
+
+    def delete(self, index):
+        for column in self.COLUMNS:
+            del getattr(self, column)[index]
+
+    def remove_where(self, predicate) -> int:
+        """Премахва редовете, чието име отговаря на predicate(name). Връща броя премахнати"""
+        keep = [i for i, code in enumerate(self.name) if not predicate(PANEL_NAMES[code])]
+        removed = len(self) - len(keep)
+        if removed:
+            for column in self.COLUMNS:
+                values = getattr(self, column)
+                setattr(self, column, array(values.typecode, [values[i] for i in keep]))
+        return removed
+
+    def names(self) -> Iterator[str]:
+        for code in self.name:
+            yield PANEL_NAMES[code]
+
+    def rows(self) -> Iterator[Tuple]:
+        """Редовете като tuple-и в реда на COLUMNS (името вече е декодирано)"""
+        for row in zip(*(getattr(self, column) for column in self.COLUMNS)):
+            yield (PANEL_NAMES[row[0]],) + row[1:]
+
+    # -------------------- СРАВНЕНИЕ / КОПИЕ --------------------
+
+    def copy(self) -> "PanelTable":
+        table = PanelTable.__new__(PanelTable)
+        for column in self.COLUMNS:
+            values = getattr(self, column)
+            setattr(table, column, array(values.typecode, values))
+        return table
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PanelTable):
+            return NotImplemented
+        return list(self.rows()) == list(other.rows())
+
+    def __repr__(self) -> str:
+        return f"PanelTable({len(self)} panels)"
+
+    # Кодовете на имената и кантовете са валидни само в текущия процес,
+    # затова при pickle се пренасят самите имена и дебелини
+    def __getstate__(self):
+        local = sorted(set(self.name))
+        remap = {code: i for i, code in enumerate(local)}
+        state = {column: getattr(self, column) for column in self.COLUMNS}
+        state["name"] = array("H", [remap[code] for code in self.name])
+        state["names"] = [PANEL_NAMES[code] for code in local]
+        state["edges"] = array("Q", [0]) * len(self.edges)
+        edge_codes = {0: 0}
+        for i, packed in enumerate(self.edges):
+            if packed:
+                state["edges"][i] = _repack_edges(packed, edge_codes)
+        state["edge_thicknesses"] = [EDGE_THICKNESSES[code] for code in edge_codes]
+        return state
+
+    def __setstate__(self, state):
+        codes = [panel_name_code(name) for name in state.pop("names")]
+        state["name"] = array("H", [codes[i] for i in state["name"]])
+        edge_codes = {i: encode_edge(thickness) for i, thickness in enumerate(state.pop("edge_thicknesses"))}
+        edges = state["edges"]
+        for i, packed in enumerate(edges):
+            if packed:
+                edges[i] = _repack_edges(packed, edge_codes)
+        for column, values in state.items():
+            setattr(self, column, values)
+
+
+def _repack_edges(packed: int, codes: Dict[int, int]) -> int:
+    """Прекодира пакетираните кантове; codes расте с новите кодове (стар -> нов)"""
+    repacked = 0
+    for shift, code in zip(range(0, 4 * EDGE_BITS, EDGE_BITS), unpack_edges(packed)):
+        new = codes.get(code)
+        if new is None:
+            new = codes[code] = len(codes)
+        repacked |= new << shift
+    return repacked
+
+
+class PanelListView(MutableSequence):
+    """
+    Списъчен изглед над PanelTable на CalculationResult – така
+    CalculationResult.panels работи както досега. Елементите се създават при
+    достъп; промяна на върнат Panel не се записва обратно (използвайте
+    view[i] = panel). Промените минават през writable_panel_table(), за да
+    работи copy-on-write при кеширани резултати.
+    """
+
+    __slots__ = ("result",)
+
+    def __init__(self, result: "CalculationResult"):
+        self.result = result
+
+    @property
+    def table(self) -> PanelTable:
+        return self.result.panel_table
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def __getitem__(self, index):
+        table = self.table
+        if isinstance(index, slice):
+            return [table.panel(i) for i in range(*index.indices(len(table)))]
+        if index < 0:
+            index += len(table)
+        if not 0 <= index < len(table):
+            raise IndexError("panel index out of range")
+        return table.panel(index)
+
+    def __setitem__(self, index, panel: Panel):
+        self.result.writable_panel_table().set_panel(index, panel)
+
+    def __delitem__(self, index):
+        self.result.writable_panel_table().delete(index)
+
+    def insert(self, index: int, panel: Panel):
+        self.result.writable_panel_table().insert_panel(index, panel)
+
+    def append(self, panel: Panel):
+        self.result.writable_panel_table().append_panel(panel)
+
+    def __iter__(self) -> Iterator[Panel]:
+        table = self.table
+        for i in range(len(table)):
+            yield table.panel(i)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PanelListView):
+            return self.table == other.table
+        if isinstance(other, (list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
 @dataclass
 class HardwareItem:
     name: str
@@ -189,7 +469,7 @@ class HardwareItem:
 @dataclass
 class CalculationResult:
     cabinet: Cabinet
-    panels: List[Panel] = field(default_factory=list)
+    panel_table: PanelTable = field(default_factory=PanelTable)
     hardware: List[HardwareItem] = field(default_factory=list)
 
     # Ценообразуване
@@ -199,8 +479,12 @@ class CalculationResult:
     labor_cost: float = 0.0
     installation_cost: float = 0.0
     total_cost_bgn: float = 0.0
+    board_cost_bgn: float = 0.0   # листовете по оценката на шкафа (част от total_cost_bgn)
     plinth_length: float = 0.0
 
+    # panel_table е споделена с кеширан резултат (copy-on-write)
+    _table_shared: bool = field(default=False, init=False, repr=False, compare=False)
+
     def add_panel(self, panel: Panel):
         # Изчисляваме area_sqm ако не е зададено
         if panel.area_sqm == 0.0:
@@ -210,7 +494,49 @@ class CalculationResult:
         panel.width_mm = round(panel.width_mm)
         panel.height_mm = round(panel.height_mm)
         
-        self.panels.append(panel)
+        self.writable_panel_table().append_panel(panel)
+
+    def remove_panels(self, predicate) -> int:
+        """Премахва панелите, чието име отговаря на predicate(name). Връща броя премахнати"""
+        return self.writable_panel_table().remove_where(predicate)
+
+    @property
+    def panels(self) -> PanelListView:
+        """Изглед над panel_table като списък от Panel (създава се при достъп)"""
+        return PanelListView(self)
+
+    @panels.setter
+    def panels(self, panels: Iterable[Panel]):
+        self.panel_table = PanelTable.from_panels(panels)
+        self._table_shared = False
+
+    def writable_panel_table(self) -> PanelTable:
+        """panel_table за промяна – копира я първо, ако е споделена"""
+        if self._table_shared:
+            self.panel_table = self.panel_table.copy()
+            self._table_shared = False
+        return self.panel_table
+
+    def shared_copy(self, cabinet: Optional[Cabinet] = None) -> "CalculationResult":
+        """
+        Евтино копие за връщане от кеш: панелите се споделят до първата
+        промяна (copy-on-write), речниците и хардуерът (списъкът и самите
+        HardwareItem) се копират.
+        """
+        copy = CalculationResult(
+            cabinet=cabinet if cabinet is not None else self.cabinet,
+            panel_table=self.panel_table,
+            hardware=[HardwareItem(item.name, item.quantity, item.notes) for item in self.hardware],
+            used_boards=dict(self.used_boards),
+            used_edges_m=dict(self.used_edges_m),
+            labor_cost=self.labor_cost,
+            installation_cost=self.installation_cost,
+            total_cost_bgn=self.total_cost_bgn,
+            board_cost_bgn=self.board_cost_bgn,
+            plinth_length=self.plinth_length,
+        )
+        copy._table_shared = True
+        return copy
 
     def add_hardware(self, item: HardwareItem):
         self.hardware.append(item)
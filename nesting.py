@@ -0,0 +1,414 @@
+"""
+Разкрой на панелите на проект върху реални листове (nesting)
+
+Калкулаторите оценяват листовете за всеки шкаф поотделно с
+int(площ / 5.796 + 0.1) + 1, а проектът сумира тези закръглени нагоре
+стойности. Тук всички панели на проекта се групират по материал, дебелина и
+формат на листа (BoardProduct.width_mm x height_mm) и се нареждат с guillotine
+алгоритъм – същия като CutListEngine във фронтенда (frontend/js/cutlist/engine.js):
+свободни правоъгълници, евристика BAF/BSSF/BLSF и същото правило за разрязване.
+
+Дебелината на диска (kerf) се добавя към всеки детайл, а от всеки край на
+листа се отрязва trim_mm за почистване на ръба.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models import *
+from costing import BOARD_NAMES
+
+
+# -------------------- НАСТРОЙКИ --------------------
+
+@dataclass(frozen=True)
+class NestingSettings:
+    kerf_mm: int = 4                 # дебелина на диска (cuttingBladeWidth)
+    trim_mm: int = 10                # почистване на всеки ръб на листа
+    allow_rotation: bool = True
+    heuristic: str = "BAF"           # 'BAF', 'BSSF', 'BLSF'
+    sorting: str = "area"            # 'area', 'maxside', 'width', 'height', 'grain'
+    min_waste_area: int = 10_000     # mm² – по-малките остатъци се изхвърлят
+    # Колко последни листа остават „отворени“ за нови детайли. Детайлите са
+    # сортирани низходящо, затова по-старите листове рядко поемат нещо;
+    # ограничението държи времето линейно при много големи проекти.
+    max_open_sheets: int = 32
+
+
+DEFAULT_SETTINGS = NestingSettings()
+
+# Версия на алгоритъма – увеличава се при всяка промяна, която променя
+# разкроя; така кешираните разкрои от стари версии се изхвърлят (nesting_cache.py)
+NESTING_VERSION = 2
+
+
+# Посока на шарката по материал (както grainPreferences в CutListEngine)
+GRAIN_PREFERENCES = {
+    'ПДЧ': 'any',
+    'МДФ': 'any',
+    'ХДЛ': 'horizontal',
+    'Масив': 'horizontal',
+    'Фурнир': 'horizontal',
+    'Шперплат': 'any',
+}
+
+
+def detect_grain(material_name: str, width: int, height: int) -> str:
+    """
+    'any' или посоката на шарката спрямо ширината на детайла. За материали
+    с шарка тя следва дългата страна (като detectGrainDirection във фронтенда).
+    """
+    for material, grain in GRAIN_PREFERENCES.items():
+        if material in material_name:
+            if grain == 'any':
+                return 'any'
+            return 'horizontal' if width >= height else 'vertical'
+    return 'any'
+
+
+# -------------------- ЛИСТОВЕ И ДЕТАЙЛИ --------------------
+
+@dataclass(frozen=True)
+class SheetSpec:
+    """Формат на лист – ключ за групиране на детайлите"""
+    material: MaterialType
+    thickness_mm: float
+    width_mm: int
+    height_mm: int
+    name: str = ""
+
+    @property
+    def board_name(self) -> str:
+        """Име на формата с реалната дебелина, напр. 'back_3мм'"""
+        return f"{self.material.value}_{self.thickness_mm:g}мм"
+
+    @classmethod
+    def from_board(cls, board: BoardProduct, material: Optional[MaterialType] = None) -> "SheetSpec":
+        return cls(material or board.material_type, board.thickness_mm, board.width_mm, board.height_mm, board.name)
+
+
+# Листове за шкафове без зададени BoardProduct (напр. от API-то)
+DEFAULT_SHEETS: Dict[MaterialType, SheetSpec] = {
+    MaterialType.BODY: SheetSpec(MaterialType.BODY, 18, 2800, 2070, "ПДЧ 18мм"),
+    MaterialType.DOOR: SheetSpec(MaterialType.DOOR, 18, 2800, 2070, "МДФ 18мм"),
+    MaterialType.BACK: SheetSpec(MaterialType.BACK, 3, 2800, 2070, "ХДЛ 3мм"),
+    MaterialType.PLINTH: SheetSpec(MaterialType.PLINTH, 18, 2800, 2070, "ПДЧ 18мм"),
+}
+
+
+@dataclass
+class NestingPart:
+    """Един детайл (quantity е разгънато – всеки брой е отделен детайл)"""
+    name: str
+    width: int
+    height: int
+    grain: str = 'any'          # 'any', 'horizontal', 'vertical'
+    cabinet_id: str = ""
+    source: Optional[int] = None   # за парче от разделен детайл – индексът на оригинала
+
+    @property
+    def area(self) -> int:
+        return self.width * self.height
+
+
+@dataclass
+class Placement:
+    part: int          # индекс в NestingLayout.parts
+    x: int
+    y: int
+    width: int         # размери върху листа (след завъртане)
+    height: int
+    rotated: bool
+
+
+@dataclass
+class SheetLayout:
+    placements: List[Placement] = field(default_factory=list)
+    used_area: int = 0
+
+
+@dataclass
+class NestingLayout:
+    """Разкрой на една група детайли върху листове от един формат"""
+    spec: SheetSpec
+    parts: List[NestingPart]
+    sheets: List[SheetLayout] = field(default_factory=list)
+    unplaced: List[int] = field(default_factory=list)   # детайли, по-големи от листа
+
+    @property
+    def sheet_count(self) -> int:
+        return len(self.sheets)
+
+    @property
+    def used_area(self) -> int:
+        return sum(sheet.used_area for sheet in self.sheets)
+
+    @property
+    def utilization(self) -> float:
+        """Дял от площта на листовете, заета от детайли (0..1)"""
+        total = self.sheet_count * self.spec.width_mm * self.spec.height_mm
+        return self.used_area / total if total else 0.0
+
+    def summary(self) -> Dict:
+        return {
+            "board": self.spec.board_name,
+            "name": self.spec.name,
+            "material": self.spec.material.value,
+            "thickness_mm": self.spec.thickness_mm,
+            "sheet_width_mm": self.spec.width_mm,
+            "sheet_height_mm": self.spec.height_mm,
+            "parts": len(self.parts),
+            "sheets": self.sheet_count,
+            "utilization": round(self.utilization, 4),
+            "unplaced": len(self.unplaced),
+        }
+
+
+@dataclass
+class ProjectNesting:
+    """Разкроят на цял проект – по един NestingLayout за всеки формат лист"""
+    layouts: List[NestingLayout] = field(default_factory=list)
+
+    def used_boards(self) -> Dict[str, int]:
+        """Листове по материал – със същите ключове като оценката по шкаф (BOARD_NAMES)"""
+        boards: Dict[str, int] = {}
+        for layout in self.layouts:
+            name = BOARD_NAMES[layout.spec.material]
+            boards[name] = boards.get(name, 0) + layout.sheet_count
+        return boards
+
+    def summary(self) -> List[Dict]:
+        return [layout.summary() for layout in self.layouts]
+
+
+# -------------------- СЪБИРАНЕ НА ДЕТАЙЛИТЕ --------------------
+
+def _sheet_for(cabinet: Optional[Cabinet], material: MaterialType) -> SheetSpec:
+    board = None
+    if cabinet is not None:
+        if material == MaterialType.BODY:
+            board = cabinet.body_board
+        elif material == MaterialType.DOOR:
+            board = cabinet.door_board or cabinet.body_board
+        elif material == MaterialType.BACK:
+            board = cabinet.back_board
+    if board is None:
+        return DEFAULT_SHEETS[material]
+    return SheetSpec.from_board(board, material)
+
+
+def collect_parts(results: Iterable[CalculationResult]) -> Dict[SheetSpec, List[NestingPart]]:
+    """Групира панелите на всички резултати по формат на листа"""
+    groups: Dict[SheetSpec, List[NestingPart]] = {}
+    specs: Dict[Tuple[int, int], SheetSpec] = {}   # (id(cabinet), код на материал) -> лист
+    for result in results:
+        cabinet = result.cabinet
+        cabinet_id = cabinet.cabinet_id if cabinet is not None else ""
+        table = result.panel_table
+        for name, width, height, code, quantity in zip(
+                table.name, table.width_mm, table.height_mm, table.material, table.quantity):
+            if width <= 0 or height <= 0 or quantity <= 0:
+                continue
+            spec_key = (id(cabinet), code)
+            spec = specs.get(spec_key)
+            if spec is None:
+                spec = specs[spec_key] = _sheet_for(cabinet, MATERIAL_TYPES[code])
+            grain = detect_grain(spec.name, width, height)
+            part = NestingPart(PANEL_NAMES[name], width, height, grain, cabinet_id)
+            parts = groups.setdefault(spec, [])
+            parts.append(part)
+            for _ in range(quantity - 1):
+                parts.append(NestingPart(part.name, width, height, grain, cabinet_id))
+    return groups
+
+
+# -------------------- АЛГОРИТЪМ --------------------
+
+def _sort_key(sorting: str):
+    if sorting == "maxside":
+        return lambda p: -max(p.width, p.height)
+    if sorting == "width":
+        return lambda p: -p.width
+    if sorting == "height":
+        return lambda p: -p.height
+    if sorting == "grain":
+        # Детайлите с шарка първи, после по площ (както 'grain' във фронтенда)
+        return lambda p: (p.grain != 'horizontal', -p.area)
+    return lambda p: -p.area
+
+
+def sort_order(parts: Sequence[NestingPart], sorting: str = "area") -> List[int]:
+    """Индексите на детайлите в реда, в който се нареждат"""
+    key = _sort_key(sorting)
+    return sorted(range(len(parts)), key=lambda i: key(parts[i]))
+
+
+def _orientations(part: NestingPart, allow_rotation: bool) -> Tuple[Tuple[int, int, bool], ...]:
+    """Размерите на детайла върху листа (ширина, височина, завъртян), които шарката позволява"""
+    if part.grain == 'any':
+        if allow_rotation:
+            return (part.width, part.height, False), (part.height, part.width, True)
+        return (part.width, part.height, False),
+    if part.grain == 'vertical':
+        # Листът е с шарка по ширината – детайлът се завърта
+        return (part.height, part.width, True),
+    return (part.width, part.height, False),
+
+
+def _split_oversize(part: NestingPart, source: int, usable_w: int, usable_h: int, kerf: int,
+                    orientations: Sequence[Tuple[int, int, bool]]) -> List[NestingPart]:
+    """
+    Детайл, по-дълъг от листа (напр. общ цокъл), се разделя по дългата си
+    страна на парчета с дължина до тази на листа. Ако и късата страна не се
+    побира, връща празен списък.
+    """
+    for w, h, rotated in orientations:
+        if h + kerf > usable_h:
+            continue
+        piece = usable_w - kerf
+        if piece <= 0:
+            continue
+        pieces = []
+        remaining = w
+        while remaining > 0:
+            length = min(piece, remaining)
+            pw, ph = (h, length) if rotated else (length, h)
+            pieces.append(NestingPart(f"{part.name} ({len(pieces) + 1})", pw, ph, part.grain, part.cabinet_id, source))
+            remaining -= length
+        return pieces
+    return []
+
+
+def nest_parts(parts: Sequence[NestingPart], spec: SheetSpec,
+               settings: NestingSettings = DEFAULT_SETTINGS,
+               order: Optional[Sequence[int]] = None) -> NestingLayout:
+    """
+    Нарежда детайлите върху листове с формат spec. order задава реда на
+    нареждане (индекси в parts); по подразбиране – според settings.sorting.
+    """
+    parts = list(parts)
+    kerf = settings.kerf_mm
+    trim = settings.trim_mm
+    # Всеки детайл заема (w + kerf) x (h + kerf); последният рез до ръба не е
+    # нужен, затова полезната площ също се увеличава с kerf
+    usable_w = spec.width_mm - 2 * trim + kerf
+    usable_h = spec.height_mm - 2 * trim + kerf
+    min_waste = settings.min_waste_area
+    heuristic = settings.heuristic
+
+    if order is None:
+        order = sort_order(parts, settings.sorting)
+    else:
+        order = list(order)
+
+    layout = NestingLayout(spec=spec, parts=parts)
+
+    # Твърде големите детайли се разделят; парчетата се добавят в края на parts
+    queue: List[int] = []
+    for index in order:
+        part = parts[index]
+        orientations = _orientations(part, settings.allow_rotation)
+        if any(w + kerf <= usable_w and h + kerf <= usable_h for w, h, _ in orientations):
+            queue.append(index)
+            continue
+        pieces = _split_oversize(part, index, usable_w, usable_h, kerf, orientations)
+        if not pieces:
+            layout.unplaced.append(index)
+            continue
+        for piece in pieces:
+            queue.append(len(parts))
+            parts.append(piece)
+
+    open_sheets: List[Tuple[SheetLayout, List[List[int]]]] = []   # (лист, свободни правоъгълници [x, y, w, h])
+
+    for index in queue:
+        part = parts[index]
+        orientations = [(w + kerf, h + kerf, rotated)
+                        for w, h, rotated in _orientations(part, settings.allow_rotation)]
+
+        best = None
+        best_score = None
+        for sheet_index, (_, free_rects) in enumerate(open_sheets):
+            for rect in free_rects:
+                rw, rh = rect[2], rect[3]
+                for w, h, rotated in orientations:
+                    if w > rw or h > rh:
+                        continue
+                    remaining_w = rw - w
+                    remaining_h = rh - h
+                    if heuristic == "BSSF":
+                        score = min(remaining_w, remaining_h)
+                    elif heuristic == "BLSF":
+                        score = max(remaining_w, remaining_h)
+                    else:
+                        score = remaining_w * remaining_h
+                    # Наказание за тесни остатъци до 50мм
+                    edge_waste = min(remaining_w, remaining_h)
+                    if 0 < edge_waste < 50:
+                        score += edge_waste * 10
+                    if best_score is None or score < best_score:
+                        best_score = score
+                        best = (sheet_index, rect, w, h, rotated)
+            if best_score == 0:
+                break
+
+        if best is None:
+            sheet = SheetLayout()
+            layout.sheets.append(sheet)
+            free_rects = [[0, 0, usable_w, usable_h]]
+            open_sheets.append((sheet, free_rects))
+            if len(open_sheets) > settings.max_open_sheets:
+                open_sheets.pop(0)
+            w, h, rotated = orientations[0]
+            if w > usable_w or h > usable_h:
+                w, h, rotated = orientations[-1]
+            best = (len(open_sheets) - 1, free_rects[0], w, h, rotated)
+
+        sheet_index, rect, w, h, rotated = best
+        sheet, free_rects = open_sheets[sheet_index]
+        x, y, rw, rh = rect
+        placed_w, placed_h = w - kerf, h - kerf
+        sheet.placements.append(Placement(index, x + trim, y + trim, placed_w, placed_h, rotated))
+        sheet.used_area += placed_w * placed_h
+
+        # Guillotine разрязване (както placePartInSheet във фронтенда)
+        free_rects.remove(rect)
+        remaining_w = rw - w
+        remaining_h = rh - h
+        if remaining_w > 0 and remaining_h > 0:
+            if remaining_w >= remaining_h:
+                new_rects = ([x + w, y, remaining_w, rh], [x, y + h, w, remaining_h])
+            else:
+                new_rects = ([x + w, y, remaining_w, h], [x, y + h, rw, remaining_h])
+        elif remaining_w > 0:
+            new_rects = ([x + w, y, remaining_w, rh],)
+        elif remaining_h > 0:
+            new_rects = ([x, y + h, rw, remaining_h],)
+        else:
+            new_rects = ()
+        for new_rect in new_rects:
+            if new_rect[2] * new_rect[3] >= min_waste:
+                free_rects.append(new_rect)
+
+        if not free_rects:
+            del open_sheets[sheet_index]
+
+    return layout
+
+
+def nest_project(results: Iterable[CalculationResult],
+                 settings: NestingSettings = DEFAULT_SETTINGS, cache=None) -> ProjectNesting:
+    """
+    Разкрой на всички панели на проект, групирани по формат на листа.
+    cache (NestingCache) връща запазен разкрой за вече виждани групи.
+    """
+    nesting = ProjectNesting()
+    for spec, parts in collect_parts(results).items():
+        cached = cache.get(parts, spec, settings) if cache is not None else None
+        if cached is not None:
+            layout = cached[0]
+        else:
+            layout = nest_parts(parts, spec, settings)
+            if cache is not None:
+                cache.put(parts, spec, settings, layout)
+        nesting.layouts.append(layout)
+    return nesting
@@ -0,0 +1,229 @@
+"""
+Постоянен кеш за разкрои (SQLite файл)
+
+Дизайнерите отварят и преизчисляват едни и същи проекти многократно, а
+разкроят (особено multi-start търсенето) е най-скъпата част от офертата.
+Ключът е SHA-256 на каноничното описание на задачата:
+
+    версия на алгоритъма, режим ('greedy' / 'multistart'),
+    лист (материал, дебелина, ширина, височина), NestingSettings (kerf, trim, ...)
+    и сортираното мултимножество {(ширина, височина, шарка): брой}
+
+Имената и редът на детайлите не влизат в ключа. Разкроят се пази по
+сигнатури (ширина, височина, шарка) и при зареждане се свързва наново с
+подадените детайли. Записите от друга версия (NESTING_VERSION) се изтриват
+при отваряне, а при надхвърляне на max_bytes се изхвърлят най-отдавна
+използваните.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from nesting import (
+    NESTING_VERSION, NestingLayout, NestingPart, NestingSettings, Placement, SheetLayout, SheetSpec,
+)
+
+
+def _signature(part: NestingPart) -> Tuple[int, int, str]:
+    return (part.width, part.height, part.grain)
+
+
+def nesting_key(parts: Sequence[NestingPart], spec: SheetSpec, settings: NestingSettings,
+                mode: str = "greedy") -> str:
+    """Каноничен ключ на задача за разкрой"""
+    multiset = sorted(Counter(_signature(part) for part in parts).items())
+    canonical = {
+        "version": NESTING_VERSION,
+        "mode": mode,
+        "sheet": [spec.material.value, spec.thickness_mm, spec.width_mm, spec.height_mm],
+        "settings": asdict(settings),
+        "parts": [[w, h, grain, quantity] for (w, h, grain), quantity in multiset],
+    }
+    return hashlib.sha256(json.dumps(canonical, separators=(",", ":")).encode()).hexdigest()
+
+
+# -------------------- СЕРИАЛИЗАЦИЯ --------------------
+
+def dump_layout(layout: NestingLayout, extra: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Разкрой -> компресиран JSON. Всяко поставяне е
+    [w, h, шарка, x, y, ширина, височина, завъртян, група, парче], където
+    (w, h, шарка) е сигнатурата на оригиналния детайл, а група/парче
+    описват парчетата на разделени детайли (0, 0 за цели детайли).
+    """
+    parts = layout.parts
+    groups: Dict[int, int] = {}
+    piece_numbers: Dict[int, int] = {}
+    counts: Counter = Counter()
+    for index, part in enumerate(parts):
+        if part.source is not None:
+            counts[part.source] += 1
+            piece_numbers[index] = counts[part.source]
+    sheets = []
+    for sheet in layout.sheets:
+        rows = []
+        for p in sheet.placements:
+            part = parts[p.part]
+            group = piece = 0
+            if part.source is not None:
+                group = groups.setdefault(part.source, len(groups) + 1)
+                piece = piece_numbers[p.part]
+                part = parts[part.source]
+            rows.append([part.width, part.height, part.grain, p.x, p.y, p.width, p.height,
+                         int(p.rotated), group, piece])
+        sheets.append(rows)
+    payload = {
+        "sheets": sheets,
+        "unplaced": [list(_signature(parts[i])) for i in layout.unplaced],
+        "extra": extra or {},
+    }
+    return zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode(), 6)
+
+
+def load_layout(data: bytes, parts: Sequence[NestingPart],
+                spec: SheetSpec) -> Tuple[NestingLayout, Dict[str, Any]]:
+    """Обратното на dump_layout – свързва поставянията с подадените детайли"""
+    payload = json.loads(zlib.decompress(data))
+    parts = list(parts)
+    free: Dict[Tuple, deque] = {}
+    for index, part in enumerate(parts):
+        free.setdefault(_signature(part), deque()).append(index)
+
+    layout = NestingLayout(spec=spec, parts=parts)
+    originals: Dict[int, int] = {}
+    for rows in payload["sheets"]:
+        sheet = SheetLayout()
+        for w, h, grain, x, y, width, height, rotated, group, piece in rows:
+            signature = (w, h, grain)
+            if group:
+                source = originals.get(group)
+                if source is None:
+                    source = originals[group] = free[signature].popleft()
+                original = parts[source]
+                piece_w, piece_h = (height, width) if rotated else (width, height)
+                index = len(parts)
+                parts.append(NestingPart(f"{original.name} ({piece})", piece_w, piece_h,
+                                         original.grain, original.cabinet_id, source))
+            else:
+                index = free[signature].popleft()
+            sheet.placements.append(Placement(index, x, y, width, height, bool(rotated)))
+            sheet.used_area += width * height
+        layout.sheets.append(sheet)
+    for w, h, grain in payload["unplaced"]:
+        layout.unplaced.append(free[(w, h, grain)].popleft())
+    return layout, payload["extra"]
+
+
+# -------------------- КЕШ --------------------
+
+class NestingCache:
+    """SQLite кеш за разкрои с изхвърляне по размер и версия на алгоритъма"""
+
+    def __init__(self, path: str = "nesting_cache.db", max_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS nesting_layouts (
+                key TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_nesting_layouts_last_used ON nesting_layouts(last_used)")
+        # Разкрои от друга версия на алгоритъма вече не са валидни
+        self._conn.execute("DELETE FROM nesting_layouts WHERE version != ?", (NESTING_VERSION,))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, parts: Sequence[NestingPart], spec: SheetSpec, settings: NestingSettings,
+            mode: str = "greedy") -> Optional[Tuple[NestingLayout, Dict[str, Any]]]:
+        """Връща (разкрой, допълнителни данни) или None"""
+        key = nesting_key(parts, spec, settings, mode)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM nesting_layouts WHERE key = ? AND version = ?",
+                (key, NESTING_VERSION)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE nesting_layouts SET last_used = ? WHERE key = ?", (time.time(), key))
+        try:
+            cached = load_layout(row[0], parts, spec)
+        except (KeyError, IndexError, ValueError, zlib.error):
+            # Повреден или несъвместим запис – третира се като липсващ
+            with self._lock:
+                self.misses += 1
+                self._conn.execute("DELETE FROM nesting_layouts WHERE key = ?", (key,))
+            return None
+        with self._lock:
+            self.hits += 1
+        return cached
+
+    def put(self, parts: Sequence[NestingPart], spec: SheetSpec, settings: NestingSettings,
+            layout: NestingLayout, mode: str = "greedy", extra: Optional[Dict[str, Any]] = None):
+        key = nesting_key(parts, spec, settings, mode)
+        payload = dump_layout(layout, extra)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO nesting_layouts (key, version, payload, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, NESTING_VERSION, payload, len(payload), now, now))
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM nesting_layouts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Изхвърляме до 90% от лимита, за да не се чисти при всеки запис
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims: List[str] = []
+        for key, size in self._conn.execute("SELECT key, size FROM nesting_layouts ORDER BY last_used"):
+            if freed >= target:
+                break
+            victims.append(key)
+            freed += size
+        self._conn.executemany("DELETE FROM nesting_layouts WHERE key = ?", [(key,) for key in victims])
+        self.evictions += len(victims)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM nesting_layouts")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM nesting_layouts").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM nesting_layouts").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "version": NESTING_VERSION,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,194 @@
+"""
+Многократен разкрой (multi-start) с ограничение по време
+
+Един greedy проход на nest_parts зависи силно от реда на детайлите. Тук се
+пробват много подредби – детерминистичните от CutListEngine във фронтенда
+(по площ, по дълга страна, по ширина/височина, по шарка) с всяка евристика,
+след това случайно разбъркани варианти на подредбата по площ – в
+ProcessPoolExecutor, докато изтече зададеното време. Връща се най-добрият
+разкрой и кривата на подобрението във времето.
+
+Сравнението е по брой листове, а при равенство – по по-малко заета площ на
+най-празния лист (по-голям остатък за следващ проект).
+"""
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from models import CalculationResult
+from nesting import (
+    DEFAULT_SETTINGS, NestingLayout, NestingPart, NestingSettings, ProjectNesting, SheetSpec,
+    collect_parts, nest_parts, sort_order,
+)
+
+
+SORTINGS = ("area", "maxside", "width", "height", "grain")
+HEURISTICS = ("BAF", "BSSF", "BLSF")
+
+# Режим в ключа на NestingCache – отделно от greedy разкроя
+MODE = "multistart"
+
+
+@dataclass
+class OptimizationResult:
+    """Най-добрият разкрой на една група + как е намерен"""
+    layout: NestingLayout
+    strategy: str                       # напр. 'maxside/BSSF' или 'random#17/BAF'
+    attempts: int
+    # (секунди от началото, листове, запълване) – при всяко подобрение
+    curve: List[Tuple[float, int, float]] = field(default_factory=list)
+    cached: bool = False                # взет от NestingCache, без търсене
+
+    def summary(self) -> Dict:
+        return {
+            **self.layout.summary(),
+            "strategy": self.strategy,
+            "attempts": self.attempts,
+            "curve": [[round(t, 4), sheets, round(fill, 4)] for t, sheets, fill in self.curve],
+            "cached": self.cached,
+        }
+
+
+def _score(layout: NestingLayout) -> Tuple[int, int, int]:
+    emptiest = min((sheet.used_area for sheet in layout.sheets), default=0)
+    return (len(layout.unplaced), layout.sheet_count, emptiest)
+
+
+def _strategies(worker: int, workers: int) -> Iterable[Tuple[str, NestingSettings, Optional[int]]]:
+    """
+    Стратегиите на един работник: неговият дял от детерминистичните
+    комбинации (подредба x евристика), после безкрайно случайни подредби.
+    Третият елемент е seed за разбъркване (None = без разбъркване).
+    """
+    fixed = [(sorting, heuristic) for sorting in SORTINGS for heuristic in HEURISTICS]
+    for sorting, heuristic in fixed[worker::workers]:
+        yield f"{sorting}/{heuristic}", (sorting, heuristic), None
+    attempt = worker
+    while True:
+        heuristic = HEURISTICS[attempt % len(HEURISTICS)]
+        yield f"random#{attempt}/{heuristic}", ("area", heuristic), attempt
+        attempt += workers
+
+
+def _shuffled_order(parts: Sequence[NestingPart], base: List[int], seed: int) -> List[int]:
+    """Подредбата по площ с шум ±30% – големите детайли остават предимно отпред"""
+    rnd = random.Random(seed)
+    position = {index: rank for rank, index in enumerate(base)}
+    noise = {index: rnd.uniform(0.7, 1.3) for index in base}
+    return sorted(base, key=lambda i: (-parts[i].area * noise[i], position[i]))
+
+
+def _search(parts: List[NestingPart], spec: SheetSpec, settings: NestingSettings,
+            worker: int, workers: int, started: float, deadline: float):
+    """
+    Работникът пробва стратегии до deadline (time.time(), общ за процесите).
+    Връща най-добрия score, стратегията и реда на детайлите, броя опити и
+    локалната крива на подобрението.
+    """
+    best = None
+    attempts = 0
+    curve = []
+    area_order = sort_order(parts, "area")
+    for name, (sorting, heuristic), seed in _strategies(worker, workers):
+        # Поне един опит, дори при изтекло време
+        if attempts and time.time() >= deadline:
+            break
+        order = sort_order(parts, sorting) if seed is None else _shuffled_order(parts, area_order, seed)
+        layout = nest_parts(parts, spec, replace(settings, heuristic=heuristic), order)
+        attempts += 1
+        score = _score(layout)
+        if best is None or score < best[0]:
+            best = (score, name, heuristic, order)
+            curve.append((time.time() - started, layout.sheet_count, layout.utilization))
+    return best, attempts, curve
+
+
+def optimize_nesting(parts: Sequence[NestingPart], spec: SheetSpec, time_budget_s: float = 2.0,
+                     settings: NestingSettings = DEFAULT_SETTINGS, workers: int = 1,
+                     pool: Optional[ProcessPoolExecutor] = None) -> OptimizationResult:
+    """
+    Multi-start разкрой на една група детайли. workers > 1 разпределя
+    търсенето в ProcessPoolExecutor (подаден pool или временен).
+    """
+    parts = list(parts)
+    started = time.time()
+    deadline = started + time_budget_s
+
+    if workers <= 1:
+        outcomes = [_search(parts, spec, settings, 0, 1, started, deadline)]
+    else:
+        own_pool = pool is None
+        if own_pool:
+            pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [pool.submit(_search, parts, spec, settings, worker, workers, started, deadline)
+                       for worker in range(workers)]
+            outcomes = [future.result() for future in futures]
+        finally:
+            if own_pool:
+                pool.shutdown()
+
+    # Обединяване: най-добрият резултат и глобалната крива (само подобренията)
+    best = min((outcome[0] for outcome in outcomes), key=lambda item: item[0])
+    attempts = sum(outcome[1] for outcome in outcomes)
+    points = sorted(point for outcome in outcomes for point in outcome[2])
+    curve = []
+    for point in points:
+        if not curve or (point[1], -point[2]) < (curve[-1][1], -curve[-1][2]):
+            curve.append(point)
+
+    _, strategy, heuristic, order = best
+    # Разкроят се възстановява в родителя – работниците връщат само реда
+    layout = nest_parts(parts, spec, replace(settings, heuristic=heuristic), order)
+    return OptimizationResult(layout=layout, strategy=strategy, attempts=attempts, curve=curve)
+
+
+def optimize_project(results: Iterable[CalculationResult], time_budget_s: float = 5.0,
+                     settings: NestingSettings = DEFAULT_SETTINGS, workers: int = 1,
+                     cache=None) -> Tuple[ProjectNesting, List[OptimizationResult]]:
+    """
+    Multi-start разкрой на цял проект. Времето се разпределя между групите
+    пропорционално на броя детайли; процесите се споделят между групите.
+    Групите, намерени в cache (NestingCache), не се търсят наново.
+    """
+    groups = collect_parts(results)
+    nesting = ProjectNesting()
+    optimized: List[OptimizationResult] = []
+
+    pending = []
+    for spec, parts in groups.items():
+        cached = cache.get(parts, spec, settings, MODE) if cache is not None else None
+        if cached is None:
+            pending.append((spec, parts))
+            optimized.append(None)
+            continue
+        layout, extra = cached
+        optimized.append(OptimizationResult(layout=layout, strategy=extra.get("strategy", ""),
+                                            attempts=extra.get("attempts", 0),
+                                            curve=[tuple(point) for point in extra.get("curve", [])],
+                                            cached=True))
+
+    # Цялото време отива за групите, които не са в кеша
+    total_parts = sum(len(parts) for _, parts in pending) or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and pending else None
+    try:
+        searched = iter(pending)
+        for position, result in enumerate(optimized):
+            if result is not None:
+                continue
+            spec, parts = next(searched)
+            budget = time_budget_s * len(parts) / total_parts
+            result = optimized[position] = optimize_nesting(parts, spec, budget, settings, workers, pool)
+            if cache is not None:
+                cache.put(parts, spec, settings, result.layout, MODE, {
+                    "strategy": result.strategy,
+                    "attempts": result.attempts,
+                    "curve": result.curve,
+                })
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    nesting.layouts.extend(result.layout for result in optimized)
+    return nesting, optimized
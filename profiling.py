@@ -0,0 +1,204 @@
+"""
+Профилиране на калкулацията по етапи (по избор, на заявка)
+
+Когато една оферта е бавна, Profiler показва къде е отишло времето:
+
+    with engine.profile() as profiler:
+        engine.calculate_project(cabinets)
+    profiler.report()
+
+Етапите се маркират в кода с stage():
+
+    cache     търсене в CalculationCache (отпечатък + копие)
+    panels    калкулаторът на типа шкаф – панелите (и всичко, което не е по-долу)
+    hardware  правилата за хардуер в калкулатора
+    cost      calculate_materials_and_costs
+    totals    сумирането на проекта (ProjectTotals) и цокълът
+    nesting   разкроят на проекта
+    parallel  паралелният режим на calculate_project (чакане на процесите)
+
+За всеки етап се пазят брой извиквания, собствено време (без вложените
+етапи – сборът им е цялото профилирано време) и нетно заделени блокове
+памет (sys.getallocatedblocks); с memory=True и нетни байтове от
+tracemalloc (много по-бавно). Всичко се разбива и по клас на калкулатора.
+
+tracemalloc е общ за процеса, затова в даден момент може да има само един
+Profiler с memory=True – втори вдига MemoryProfileBusy, вместо двата да
+си изкривят байтовете (и първият да спре проследяването на втория).
+
+Без активен Profiler stage() връща общ празен context manager – цената е
+едно четене на ContextVar. Калкулациите в дъщерни процеси (паралелен
+режим, пулът с процеси) не се профилират.
+"""
+import sys
+import threading
+import time
+import tracemalloc
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+_current: ContextVar[Optional["Profiler"]] = ContextVar("profiler", default=None)
+
+ENGINE = "engine"   # етапи извън калкулатор на шкаф
+
+# Държи се от активния Profiler с memory=True
+_memory_lock = threading.Lock()
+
+
+class MemoryProfileBusy(RuntimeError):
+    """Вече има активен Profiler с memory=True"""
+
+
+class _Frame:
+    __slots__ = ("stage", "calculator", "started", "blocks", "memory", "child_time", "child_blocks",
+                 "child_memory")
+
+    def __init__(self, stage: str, calculator: str, started: float, blocks: int, memory: int):
+        self.stage = stage
+        self.calculator = calculator
+        self.started = started
+        self.blocks = blocks
+        self.memory = memory
+        self.child_time = 0.0
+        self.child_blocks = 0
+        self.child_memory = 0
+
+
+class Profiler:
+    """Context manager; докато е активен, stage() записва в него"""
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.stats: Dict[tuple, List] = {}   # (калкулатор, етап) -> [извиквания, секунди, блокове, байтове]
+        self.elapsed = 0.0
+        self._stack: List[_Frame] = []
+        self._token = None
+        self._started = 0.0
+        self._own_tracemalloc = False
+        self._memory_locked = False
+
+    def _memory_now(self) -> int:
+        return tracemalloc.get_traced_memory()[0] if self.memory else 0
+
+    def __enter__(self) -> "Profiler":
+        if self.memory:
+            if not _memory_lock.acquire(blocking=False):
+                raise MemoryProfileBusy("Вече тече профилиране на паметта")
+            self._memory_locked = True
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._own_tracemalloc = True
+        self._token = _current.set(self)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self._started
+        _current.reset(self._token)
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+            self._own_tracemalloc = False
+        if self._memory_locked:
+            _memory_lock.release()
+            self._memory_locked = False
+        return False
+
+    def push(self, stage: str, calculator: Optional[str]):
+        if calculator is None:
+            calculator = self._stack[-1].calculator if self._stack else ENGINE
+        self._stack.append(_Frame(stage, calculator, time.perf_counter(), sys.getallocatedblocks(),
+                                  self._memory_now()))
+
+    def pop(self):
+        now = time.perf_counter()
+        blocks = sys.getallocatedblocks()
+        memory = self._memory_now()
+        frame = self._stack.pop()
+        elapsed = now - frame.started
+        allocated = blocks - frame.blocks
+        allocated_bytes = memory - frame.memory
+        key = (frame.calculator, frame.stage)
+        entry = self.stats.get(key)
+        if entry is None:
+            entry = self.stats[key] = [0, 0.0, 0, 0]
+        entry[0] += 1
+        entry[1] += elapsed - frame.child_time
+        entry[2] += allocated - frame.child_blocks
+        entry[3] += allocated_bytes - frame.child_memory
+        if self._stack:
+            parent = self._stack[-1]
+            parent.child_time += elapsed
+            parent.child_blocks += allocated
+            parent.child_memory += allocated_bytes
+
+    def report(self) -> Dict[str, Any]:
+        """
+        {"total_ms", "profiled_ms", "stages": {етап: {...}}, "calculators": {клас: {етап: {...}}}}
+        Времената са собствени (без вложените етапи).
+        """
+        stages: Dict[str, List] = {}
+        calculators: Dict[str, Dict[str, Dict]] = {}
+        for (calculator, stage), (calls, seconds, blocks, memory) in self.stats.items():
+            total = stages.setdefault(stage, [0, 0.0, 0, 0])
+            total[0] += calls
+            total[1] += seconds
+            total[2] += blocks
+            total[3] += memory
+            calculators.setdefault(calculator, {})[stage] = self._entry(calls, seconds, blocks, memory)
+        return {
+            "total_ms": round(self.elapsed * 1000, 3),
+            "profiled_ms": round(sum(entry[1] for entry in stages.values()) * 1000, 3),
+            "stages": {stage: self._entry(*entry) for stage, entry in stages.items()},
+            "calculators": calculators,
+        }
+
+    def _entry(self, calls: int, seconds: float, blocks: int, memory: int) -> Dict[str, Any]:
+        entry = {"calls": calls, "ms": round(seconds * 1000, 3), "alloc_blocks": blocks}
+        if self.memory:
+            entry["alloc_bytes"] = memory
+        return entry
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "calculator")
+
+    def __init__(self, profiler: Profiler, name: str, calculator: Optional[str]):
+        self.profiler = profiler
+        self.name = name
+        self.calculator = calculator
+
+    def __enter__(self):
+        self.profiler.push(self.name, self.calculator)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.pop()
+        return False
+
+
+class _NoopStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopStage()
+
+
+def stage(name: str, calculator: Optional[str] = None):
+    """
+    Етап на калкулацията. calculator задава класа на калкулатора; без него
+    се наследява от обхващащия етап.
+    """
+    profiler = _current.get()
+    if profiler is None:
+        return _NOOP
+    return _Stage(profiler, name, calculator)
+
+
+def current_profiler() -> Optional[Profiler]:
+    return _current.get()
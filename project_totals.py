@@ -0,0 +1,163 @@
+"""
+Сумиране на резултатите от проект (totals)
+
+ProjectTotals натрупва приноса на всеки шкаф в реда, в който се подават
+резултатите. Така серийният и паралелният път дават побитово еднакви
+суми – float събирането не е асоциативно и редът има значение.
+"""
+from collections import Counter, defaultdict
+from typing import Dict, Optional
+
+from models import *
+
+
+# Шкафове, които стъпват на цокъл (долните)
+PLINTH_CABINET_TYPES = frozenset((
+    CabinetType.BASE, CabinetType.SINK, CabinetType.OVEN, CabinetType.DRAWER,
+    CabinetType.BLIND, CabinetType.APPLIANCE, CabinetType.FRIDGE,
+))
+
+PLINTH_HEIGHT_MM = 150
+
+
+class ProjectTotals:
+    """Натрупани общи стойности за проект"""
+
+    def __init__(self):
+        self.cabinet_count = 0
+        self.hardware = defaultdict(int)
+        self.used_boards = defaultdict(int)
+        self.used_edges_m = defaultdict(float)
+        self.total_labor_cost = 0.0
+        self.material_area = defaultdict(float)
+        self.plinth_length = 0.0  # Обща дължина на цокъла в mm
+        self.total_cost_bgn = 0.0
+        self.board_cost_bgn = 0.0   # сбор от оценките за листове по шкаф (част от total_cost_bgn)
+        # Брой шкафове, допринасящи за всеки float ключ – за да може remove()
+        # да махне ключа, когато последният шкаф с този материал/кант изчезне
+        self._refs = Counter()
+
+    def add(self, result: CalculationResult):
+        """Добавя приноса на един шкаф"""
+        self.cabinet_count += 1
+        self._refs.update(_float_keys(result))
+
+        # Сумираме хардуер
+        for item in result.hardware:
+            self.hardware[item.name] += item.quantity
+
+        # Сумираме дъски
+        for board_name, count in result.used_boards.items():
+            self.used_boards[board_name] += count
+
+        # Сумираме кант
+        for edge_name, meters in result.used_edges_m.items():
+            self.used_edges_m[edge_name] += meters
+
+        # Сумираме труд и обща цена
+        self.total_labor_cost += result.labor_cost
+        self.total_cost_bgn += result.total_cost_bgn
+        self.board_cost_bgn += result.board_cost_bgn
+
+        # Сумираме материални площи
+        table = result.panel_table
+        for code, area_sqm, quantity in zip(table.material, table.area_sqm, table.quantity):
+            self.material_area[MATERIAL_TYPES[code]] += area_sqm * quantity
+
+        # Сумираме цокъл (само от долни шкафове)
+        if result.cabinet.type in PLINTH_CABINET_TYPES:
+            self.plinth_length += result.cabinet.width
+
+    def remove(self, result: CalculationResult):
+        """
+        Изважда приноса на шкаф, добавен по-рано с add(). Ключове без
+        принос изчезват, както при пълно преизчисление. Сумите може да се
+        различават от пълното преизчисление с няколко ulp (float изваждане).
+        """
+        self.cabinet_count -= 1
+
+        for item in result.hardware:
+            _subtract(self.hardware, item.name, item.quantity)
+
+        for board_name, count in result.used_boards.items():
+            _subtract(self.used_boards, board_name, count)
+
+        for edge_name, meters in result.used_edges_m.items():
+            self.used_edges_m[edge_name] -= meters
+
+        self.total_labor_cost -= result.labor_cost
+        self.total_cost_bgn -= result.total_cost_bgn
+        self.board_cost_bgn -= result.board_cost_bgn
+
+        table = result.panel_table
+        for code, area_sqm, quantity in zip(table.material, table.area_sqm, table.quantity):
+            self.material_area[MATERIAL_TYPES[code]] -= area_sqm * quantity
+
+        if result.cabinet.type in PLINTH_CABINET_TYPES:
+            self.plinth_length -= result.cabinet.width
+
+        self._refs.subtract(_float_keys(result))
+        for key, refs in list(self._refs.items()):
+            if refs <= 0:
+                section, name = key
+                getattr(self, section).pop(name, None)
+                del self._refs[key]
+
+    def plinth_panel(self) -> Optional[Panel]:
+        """Общ цокъл като Panel (или None, ако няма долни шкафове)"""
+        if self.plinth_length <= 0:
+            return None
+        return Panel(
+            name="Общ цокъл",
+            width_mm=int(self.plinth_length),
+            height_mm=PLINTH_HEIGHT_MM,
+            material=MaterialType.PLINTH,
+            edge_front=1.0,
+            quantity=1,
+            area_sqm=(self.plinth_length * PLINTH_HEIGHT_MM) / 1_000_000
+        )
+
+    def snapshot(self) -> Dict:
+        """
+        Моментно копие на общите стойности (обикновени dict-ове).
+        Размерът му зависи от броя различни материали/обков, не от броя шкафове.
+        """
+        return {
+            "cabinet_count": self.cabinet_count,
+            "hardware": dict(self.hardware),
+            "used_boards": dict(self.used_boards),
+            "used_edges_m": dict(self.used_edges_m),
+            "total_labor_cost": self.total_labor_cost,
+            "material_area": dict(self.material_area),
+            "plinth_length": self.plinth_length,
+            "board_cost_bgn": self.board_cost_bgn,
+            "total_cost_bgn": self.total_cost_bgn
+        }
+
+    def to_dict(self) -> Dict:
+        """Речникът "totals" от calculate_project"""
+        return {
+            "hardware": self.hardware,
+            "used_boards": self.used_boards,
+            "used_edges_m": self.used_edges_m,
+            "total_labor_cost": self.total_labor_cost,
+            "material_area": self.material_area,
+            "plinth_length": self.plinth_length,
+            "board_cost_bgn": self.board_cost_bgn,
+            "total_cost_bgn": self.total_cost_bgn
+        }
+
+
+def _subtract(counter: Dict, key, amount: int):
+    remaining = counter[key] - amount
+    if remaining:
+        counter[key] = remaining
+    else:
+        del counter[key]
+
+
+def _float_keys(result: CalculationResult):
+    """Float ключовете в totals, за които шкафът допринася (без повторения)"""
+    keys = [("used_edges_m", name) for name in result.used_edges_m]
+    keys.extend(("material_area", MATERIAL_TYPES[code]) for code in set(result.panel_table.material))
+    return keys
@@ -0,0 +1,102 @@
+"""
+Кеш за резултати от калкулация на шкафове
+
+Реалните проекти повтарят едни и същи шкафове (десет горни по 600мм, шест
+чекмеджета по 400мм). Ключът е каноничен отпечатък на полетата на Cabinet
+(без cabinet_id), неговия ConstructionProfile и материалите. Кешът е
+ограничен по брой записи с LRU изхвърляне.
+
+Кешираните резултати никога не се дават навън директно – връща се
+CalculationResult.shared_copy(), който копира панелите при първа промяна.
+"""
+import threading
+from collections import OrderedDict
+from dataclasses import is_dataclass
+from enum import Enum
+from typing import Any, Dict, Hashable, Optional
+
+from models import Cabinet, CalculationResult
+
+
+# Полета, които не влияят на калкулацията
+_IGNORED_CABINET_FIELDS = ("cabinet_id",)
+
+
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+
+
+def _canonical(value: Any) -> Hashable:
+    """Превръща стойност (вкл. вложени dataclass-и) в hashable tuple"""
+    if type(value) in _SCALARS or isinstance(value, Enum):
+        return value
+    if is_dataclass(value):
+        # Редът на полетата е фиксиран за класа, затова имената не са нужни
+        return (type(value),) + tuple(map(_canonical, vars(value).values()))
+    if isinstance(value, (list, tuple)):
+        return tuple(map(_canonical, value))
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _canonical(v)) for k, v in value.items()))
+    return repr(value)
+
+
+def cabinet_fingerprint(cabinet: Cabinet) -> Hashable:
+    """
+    Каноничен отпечатък на шкаф. Включва и динамично добавени атрибути
+    (напр. has_closing_panel), защото калкулаторите ги проверяват с hasattr.
+    """
+    return tuple(
+        (name, _canonical(value))
+        for name, value in vars(cabinet).items()
+        if name not in _IGNORED_CABINET_FIELDS
+    )
+
+
+class CalculationCache:
+    """LRU кеш за CalculationResult с броячи за hit/miss/eviction"""
+
+    def __init__(self, max_size: int = 1024):
+        if max_size <= 0:
+            raise ValueError("max_size трябва да е положително число")
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, CalculationResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[CalculationResult]:
+        """Връща кеширания (замразен) резултат или None"""
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: Hashable, result: CalculationResult):
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,117 @@
+"""
+Проследяване на времето по етапи на една заявка (spans)
+
+Заявката отваря Trace (start_trace), а кодът по пътя маркира етапите си:
+
+    with span("calculate"):
+        result = engine.calculate_cabinet(cabinet)
+
+Етапите с едно име се сумират (500 шкафа = един ред "convert" с брой 500),
+така че и горещите цикли могат да се маркират. Етапите може да се влагат
+(cost и nesting са част от calculate). Без активен Trace span()
+връща общ празен context manager – цената е едно четене на ContextVar.
+
+Trace-ът се пази в ContextVar: минава през await и asyncio.to_thread, а
+CalculationExecutor го предава изрично на пула с нишки. Процесите (пулът с
+процеси, фоновите задачи) не го виждат – там се мери само общото време.
+"""
+import time
+from contextvars import ContextVar, Token
+from typing import Dict, List, Optional, Tuple
+from uuid import uuid4
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+
+
+class Trace:
+    """Сумарно време и брой по име на етап за една заявка"""
+
+    __slots__ = ("trace_id", "started", "spans")
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid4().hex
+        self.started = time.perf_counter()
+        self.spans: Dict[str, List] = {}   # име -> [брой, секунди]
+
+    def add(self, name: str, elapsed: float):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> Dict[str, Dict]:
+        """{име: {"count": n, "ms": ...}} в реда на първото появяване"""
+        return {name: {"count": count, "ms": round(seconds * 1000, 3)}
+                for name, (count, seconds) in self.spans.items()}
+
+    def server_timing(self) -> str:
+        """Стойност за хедъра Server-Timing (вижда се в DevTools на браузъра)"""
+        parts = []
+        for name, (count, seconds) in self.spans.items():
+            part = f"{name};dur={seconds * 1000:.2f}"
+            if count > 1:
+                part += f';desc="{count}x"'
+            parts.append(part)
+        parts.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(parts)
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str):
+    """Context manager, който добавя времето на блока към текущия Trace"""
+    trace = _current.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current.get()
+    return trace.trace_id if trace is not None else None
+
+
+def start_trace(trace_id: Optional[str] = None) -> Tuple[Trace, Token]:
+    """Отваря Trace в текущия контекст; end_trace(token) го затваря"""
+    trace = Trace(trace_id)
+    return trace, _current.set(trace)
+
+
+def end_trace(token: Token):
+    _current.reset(token)